@@ -1,50 +1,122 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import List
-from ..models import answer, question
+from typing import Optional
+from ..models import answer, question, vote
 from ..schemas import answer as answer_schema
-from ..database import get_db
+from ..schemas import vote as vote_schema
+from ..schemas.page import Page
+from ..database import get_db, run
+from ..serialization import FastJSONRoute
+from ..pagination import DEFAULT_LIMIT, MAX_LIMIT, page
+from ..conditional import Validators, conditional_page
+from ..cache import cache, answer_list_key, answer_list_group
+from ..schemas.user import TokenUser
+from ..security import get_current_user
 
-router = APIRouter(prefix="/answers", tags=["answers"])
+router = APIRouter(prefix="/answers", tags=["answers"], route_class=FastJSONRoute)
 
-@router.get("/", response_model=List[answer_schema.Answer])
-def get_answers(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all answers with pagination"""
-    answers = answer.get_answers(db, skip=skip, limit=limit)
-    return answers
+async def _missing_or_forbidden(db, answer_id: int):
+    # The write is conditioned on the owner, so when it matched nothing one more read tells 404 from 403
+    if await run(db, answer.get_answer_owner, answer_id=answer_id) is None:
+        raise HTTPException(status_code=404, detail="Answer not found")
+    raise HTTPException(status_code=403, detail="Not the author of this answer")
+
+@router.get("/", response_model=Page[answer_schema.Answer])
+async def get_answers(
+    request: Request,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get all answers, newest first, paginated by cursor (or legacy skip/limit)"""
+    answers = await run(db, answer.get_answers, skip=skip, limit=limit, cursor=cursor)
+    return conditional_page(request, response, answers, limit, answer.version)
 
 @router.post("/", response_model=answer_schema.Answer)
-def create_answer(answer_data: answer_schema.AnswerCreate, db: Session = Depends(get_db)):
-    """Create a new answer"""
-    return answer.create_answer(db=db, answer=answer_data)
+async def create_answer(
+    answer_data: answer_schema.AnswerCreate,
+    current_user: TokenUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Create a new answer as the authenticated user"""
+    answer_data = answer_data.model_copy(update={"author_id": current_user.id})
+    db_answer = await run(db, answer.create_answer, answer=answer_data)
+    if db_answer is None:
+        raise HTTPException(status_code=404, detail="Question not found")
+    return db_answer
 
 @router.get("/{answer_id}", response_model=answer_schema.Answer)
-def get_answer(answer_id: int, db: Session = Depends(get_db)):
+async def get_answer(answer_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get a specific answer by ID"""
-    db_answer = answer.get_answer(db, answer_id=answer_id)
+    version = await run(db, answer.get_answer_version, answer_id=answer_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Answer not found")
+    validators = Validators(version)
+    if validators.is_fresh(request):
+        return validators.not_modified()
+    db_answer = await run(db, answer.get_answer, answer_id=answer_id)
     if db_answer is None:
         raise HTTPException(status_code=404, detail="Answer not found")
+    validators.apply(response)
     return db_answer
 
 @router.put("/{answer_id}", response_model=answer_schema.Answer)
-def update_answer(answer_id: int, answer_data: answer_schema.AnswerUpdate, db: Session = Depends(get_db)):
-    """Update an answer"""
-    db_answer = answer.get_answer(db, answer_id=answer_id)
+async def update_answer(
+    answer_id: int,
+    answer_data: answer_schema.AnswerUpdate,
+    current_user: TokenUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Update an answer owned by the authenticated user"""
+    db_answer = await run(db, answer.update_answer, answer_id=answer_id, answer=answer_data, author_id=current_user.id)
     if db_answer is None:
-        raise HTTPException(status_code=404, detail="Answer not found")
-    return answer.update_answer(db=db, answer_id=answer_id, answer=answer_data)
+        await _missing_or_forbidden(db, answer_id)
+    return db_answer
 
 @router.delete("/{answer_id}")
-def delete_answer(answer_id: int, db: Session = Depends(get_db)):
-    """Delete an answer"""
-    db_answer = answer.get_answer(db, answer_id=answer_id)
-    if db_answer is None:
-        raise HTTPException(status_code=404, detail="Answer not found")
-    answer.delete_answer(db=db, answer_id=answer_id)
+async def delete_answer(answer_id: int, current_user: TokenUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Delete an answer owned by the authenticated user"""
+    if await run(db, answer.delete_answer, answer_id=answer_id, author_id=current_user.id) is None:
+        await _missing_or_forbidden(db, answer_id)
     return {"message": "Answer deleted successfully"}
 
-@router.get("/question/{question_id}", response_model=List[answer_schema.Answer])
-def get_answers_by_question(question_id: int, db: Session = Depends(get_db)):
-    """Get all answers for a specific question"""
-    answers = answer.get_answers_by_question(db, question_id=question_id)
-    return answers 
\ No newline at end of file
+@router.get("/question/{question_id}", response_model=Page[answer_schema.Answer])
+async def get_answers_by_question(
+    question_id: int,
+    request: Request,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get answers for a specific question, newest first; honors If-None-Match / If-Modified-Since"""
+    version = await run(db, answer.get_answers_by_question_version, question_id=question_id)
+    validators = Validators(version)
+    if validators.is_fresh(request):
+        return validators.not_modified()
+
+    async def load():
+        answers = await run(db, answer.get_answers_by_question, question_id=question_id, limit=limit, cursor=cursor)
+        return page(answers, limit)
+
+    response = await cache.read_through(
+        answer_list_key(question_id, limit, cursor),
+        Page[answer_schema.Answer],
+        load,
+        group=answer_list_group(question_id)
+    )
+    return validators.apply(response)
+
+@router.put("/{answer_id}/vote", response_model=vote_schema.VoteResult)
+async def vote_on_answer(
+    answer_id: int,
+    vote_data: vote_schema.VoteCast,
+    current_user: TokenUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Cast or change the authenticated user's vote; repeating it is a no-op"""
+    result = await run(db, vote.cast_vote, user_id=current_user.id, is_upvote=vote_data.is_upvote, answer_id=answer_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Answer not found")
+    return result
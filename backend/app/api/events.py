@@ -0,0 +1,79 @@
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from ..config import settings
+from ..events import hub, question_topic, user_topic
+from ..schemas.user import TokenUser
+from ..security import get_stream_user
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+def _topics(question_ids: List[int], user: Optional[TokenUser]):
+    if len(question_ids) > settings.EVENTS_MAX_TOPICS:
+        raise HTTPException(status_code=400, detail=f"Follow at most {settings.EVENTS_MAX_TOPICS} questions per connection")
+    topics = [question_topic(question_id) for question_id in question_ids]
+    if user is not None:
+        topics.append(user_topic(user.id))
+    if not topics:
+        raise HTTPException(status_code=400, detail="Pass question_id, or sign in to follow your own activity")
+    return topics
+
+async def _batches(subscription):
+    # [] is a heartbeat; stops when the drop policy closed the subscription
+    while not subscription.closed:
+        yield await subscription.next_batch(settings.EVENTS_HEARTBEAT_SECONDS, settings.EVENTS_COALESCE_MS / 1000)
+
+def _dumps(event: dict) -> str:
+    return json.dumps(event, separators=(",", ":"))
+
+@router.get("/")
+async def stream_events(question_id: List[int] = Query([]), current_user: Optional[TokenUser] = Depends(get_stream_user)):
+    """Server-sent events for the given questions, plus the signed-in user's own activity"""
+    topics = _topics(question_id, current_user)
+
+    async def stream():
+        subscription = hub.subscribe(topics)
+        try:
+            # A comment first, so clients see the response headers without waiting for an event
+            yield ": connected\n\n"
+            async for batch in _batches(subscription):
+                if not batch:
+                    yield ": ping\n\n"
+                for event in batch:
+                    yield f"event: {event['type']}\ndata: {_dumps(event)}\n\n"
+        finally:
+            hub.unsubscribe(subscription)
+
+    # X-Accel-Buffering stops nginx from holding events back
+    return StreamingResponse(
+        stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/ws")
+async def event_socket(websocket: WebSocket, question_id: List[int] = Query([]), access_token: Optional[str] = None):
+    """The same events as /events/ over a WebSocket, one JSON message each"""
+    try:
+        topics = _topics(question_id, await get_stream_user(websocket, access_token))
+    except HTTPException as exc:
+        await websocket.close(code=1008, reason=exc.detail)
+        return
+    await websocket.accept()
+    subscription = hub.subscribe(topics)
+
+    async def forward():
+        async for batch in _batches(subscription):
+            for event in batch:
+                await websocket.send_text(_dumps(event))
+        # Dropped by the disconnect policy; the client should reconnect and refetch
+        await websocket.close(code=1013)
+
+    sender = asyncio.create_task(forward())
+    try:
+        # Messages from the client are ignored; receiving notices the disconnect
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        sender.cancel()
+        hub.unsubscribe(subscription)
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from .. import dump
+from ..config import settings
+from ..schemas.user import TokenUser
+from ..security import get_current_user
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+def get_exporter(current_user: TokenUser = Depends(get_current_user)):
+    """Dumps hold every vote's voter and every user's name, so only the accounts in EXPORT_USER_IDS may stream them"""
+    if current_user.id not in settings.EXPORT_USER_IDS:
+        raise HTTPException(status_code=403, detail="Not allowed to export")
+    return current_user
+
+@router.get("/")
+async def export_all(current_user: TokenUser = Depends(get_exporter)):
+    """Stream every table as NDJSON lines of {"table": ..., "row": ...}, loadable with `python -m app.cli import`"""
+    return StreamingResponse(
+        dump.stream(dump.TABLES),
+        media_type=dump.NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": 'attachment; filename="stackit.ndjson"'}
+    )
+
+@router.get("/{table}")
+async def export_table(table: str, format: str = "ndjson", current_user: TokenUser = Depends(get_exporter)):
+    """Stream one table as NDJSON rows or CSV"""
+    if table not in dump.TABLES:
+        raise HTTPException(status_code=404, detail="Table not found")
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    return StreamingResponse(
+        dump.stream([table], format, wrap=False),
+        media_type="text/csv" if format == "csv" else dump.NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'}
+    )
@@ -1,44 +1,140 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import List
-from ..models import question, user
+from typing import Optional
+from ..models import question, user, vote
 from ..schemas import question as question_schema
-from ..database import get_db
+from ..schemas import vote as vote_schema
+from ..schemas.page import Page
+from ..config import settings
+from ..database import get_db, run
+from ..serialization import FastJSONRoute
+from ..conditional import Validators, conditional_page
+from ..cache import cache, question_key
+from ..counter_buffer import counter_buffer
+from ..schemas.user import TokenUser
+from ..security import get_current_user, get_optional_user
+from ..pagination import DEFAULT_LIMIT, MAX_LIMIT
 
-router = APIRouter(prefix="/questions", tags=["questions"])
+router = APIRouter(prefix="/questions", tags=["questions"], route_class=FastJSONRoute)
 
-@router.get("/", response_model=List[question_schema.Question])
-def get_questions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all questions with pagination"""
-    questions = question.get_questions(db, skip=skip, limit=limit)
-    return questions
+async def _missing_or_forbidden(db, question_id: int):
+    # The write is conditioned on the owner, so when it matched nothing one more read tells 404 from 403
+    if await run(db, question.get_question_owner, question_id=question_id) is None:
+        raise HTTPException(status_code=404, detail="Question not found")
+    raise HTTPException(status_code=403, detail="Not the author of this question")
+
+@router.get("/", response_model=Page[question_schema.Question])
+async def get_questions(
+    request: Request,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    ids: Optional[str] = None,
+    sort: str = "newest",
+    db: Session = Depends(get_db)
+):
+    """Get a question feed (?sort=newest, active, hot or unanswered), paginated by cursor (or legacy skip/limit), or specific ones with ?ids=1,2,3"""
+    if ids is not None:
+        try:
+            question_ids = [int(i) for i in ids.split(",") if i.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+        if len(question_ids) > settings.BATCH_MAX_SIZE:
+            raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_MAX_SIZE} ids per request")
+        questions = await run(db, question.get_questions_by_ids, ids=question_ids)
+        # A multi-get is a single page with no cursor
+        return conditional_page(request, response, questions, len(question_ids) + 1, question.version)
+    if sort not in question.FEEDS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(question.FEEDS)}")
+    questions = await run(db, question.get_questions, skip=skip, limit=limit, cursor=cursor, sort=sort)
+    return conditional_page(request, response, questions, limit, question.version, question.feed_keys(sort))
 
 @router.post("/", response_model=question_schema.Question)
-def create_question(question_data: question_schema.QuestionCreate, db: Session = Depends(get_db)):
-    """Create a new question"""
-    return question.create_question(db=db, question=question_data)
+async def create_question(
+    question_data: question_schema.QuestionCreate,
+    current_user: TokenUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Create a new question as the authenticated user"""
+    question_data = question_data.model_copy(update={"author_id": current_user.id})
+    return await run(db, question.create_question, question=question_data)
 
 @router.get("/{question_id}", response_model=question_schema.Question)
-def get_question(question_id: int, db: Session = Depends(get_db)):
-    """Get a specific question by ID"""
-    db_question = question.get_question(db, question_id=question_id)
-    if db_question is None:
+async def get_question(question_id: int, request: Request, db: Session = Depends(get_db)):
+    """Get a specific question by ID; honors If-None-Match / If-Modified-Since"""
+    version = await run(db, question.get_question_version, question_id=question_id)
+    if version is None:
         raise HTTPException(status_code=404, detail="Question not found")
-    return db_question
+    # Views are only counted through the write-behind buffer; an UPDATE per read would serialize the hottest route
+    if counter_buffer.enabled:
+        counter_buffer.add_view(question_id)
+    validators = Validators(version)
+    if validators.is_fresh(request):
+        return validators.not_modified()
+    response = await cache.read_through(
+        question_key(question_id),
+        question_schema.Question,
+        lambda: run(db, question.get_question, question_id=question_id)
+    )
+    if response is None:
+        raise HTTPException(status_code=404, detail="Question not found")
+    return validators.apply(response)
+
+@router.get("/{question_id}/full", response_model=question_schema.QuestionDetail)
+async def get_question_detail(
+    question_id: int,
+    request: Request,
+    response: Response,
+    current_user: Optional[TokenUser] = Depends(get_optional_user),
+    db: Session = Depends(get_db)
+):
+    """Question, author, tags and all answers (accepted first, then by score) in one response, plus the caller's own votes when authenticated"""
+    detail = await run(db, question.get_question_detail, question_id=question_id,
+        viewer_id=current_user.id if current_user else None)
+    if detail is None:
+        raise HTTPException(status_code=404, detail="Question not found")
+    if counter_buffer.enabled:
+        counter_buffer.add_view(question_id)
+    validators = Validators(question.detail_version(detail))
+    if validators.is_fresh(request):
+        return validators.not_modified()
+    validators.apply(response)
+    # The body depends on who is asking
+    response.headers["Vary"] = "Authorization"
+    return detail
 
 @router.put("/{question_id}", response_model=question_schema.Question)
-def update_question(question_id: int, question_data: question_schema.QuestionUpdate, db: Session = Depends(get_db)):
-    """Update a question"""
-    db_question = question.get_question(db, question_id=question_id)
+async def update_question(
+    question_id: int,
+    question_data: question_schema.QuestionUpdate,
+    current_user: TokenUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Update a question owned by the authenticated user"""
+    db_question = await run(
+        db, question.update_question, question_id=question_id, question=question_data, author_id=current_user.id
+    )
     if db_question is None:
-        raise HTTPException(status_code=404, detail="Question not found")
-    return question.update_question(db=db, question_id=question_id, question=question_data)
+        await _missing_or_forbidden(db, question_id)
+    return db_question
 
 @router.delete("/{question_id}")
-def delete_question(question_id: int, db: Session = Depends(get_db)):
-    """Delete a question"""
-    db_question = question.get_question(db, question_id=question_id)
-    if db_question is None:
+async def delete_question(question_id: int, current_user: TokenUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Delete a question owned by the authenticated user"""
+    if await run(db, question.delete_question, question_id=question_id, author_id=current_user.id) is None:
+        await _missing_or_forbidden(db, question_id)
+    return {"message": "Question deleted successfully"}
+
+@router.put("/{question_id}/vote", response_model=vote_schema.VoteResult)
+async def vote_on_question(
+    question_id: int,
+    vote_data: vote_schema.VoteCast,
+    current_user: TokenUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Cast or change the authenticated user's vote; repeating it is a no-op"""
+    result = await run(db, vote.cast_vote, user_id=current_user.id, is_upvote=vote_data.is_upvote, question_id=question_id)
+    if result is None:
         raise HTTPException(status_code=404, detail="Question not found")
-    question.delete_question(db=db, question_id=question_id)
-    return {"message": "Question deleted successfully"} 
\ No newline at end of file
+    return result
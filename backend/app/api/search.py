@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List, Literal
+from ..models import search
+from ..schemas import search as search_schema
+from ..database import get_db, run
+from ..serialization import FastJSONRoute
+from ..pagination import DEFAULT_LIMIT, MAX_LIMIT
+
+router = APIRouter(prefix="/search", tags=["search"], route_class=FastJSONRoute)
+
+@router.get("/", response_model=List[search_schema.SearchResult])
+async def search_content(
+    q: str,
+    scope: Literal["all", "questions", "answers"] = "all",
+    skip: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    db: Session = Depends(get_db)
+):
+    """Full-text search over questions and answers, best matches first"""
+    return await run(db, search.search, q, scope=scope, skip=skip, limit=limit)
@@ -1,52 +1,126 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import List
-from ..models import tag
+from typing import List, Optional
+from ..models import tag, question
 from ..schemas import tag as tag_schema
-from ..database import get_db
+from ..schemas import question as question_schema
+from ..schemas.page import Page
+from ..config import settings
+from ..database import get_db, run
+from ..serialization import FastJSONRoute
+from ..pagination import DEFAULT_LIMIT, MAX_LIMIT, page
+from ..conditional import Validators, conditional_page
+from ..cache import cache, tag_list_key, tag_name_key, TAG_LIST_GROUP
+from ..schemas.user import TokenUser
+from ..security import get_current_user
+from ..tag_index import tag_index
 
-router = APIRouter(prefix="/tags", tags=["tags"])
+router = APIRouter(prefix="/tags", tags=["tags"], route_class=FastJSONRoute)
 
-@router.get("/", response_model=List[tag_schema.Tag])
-def get_tags(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all tags with pagination"""
-    tags = tag.get_tags(db, skip=skip, limit=limit)
-    return tags
+@router.get("/", response_model=Page[tag_schema.Tag])
+async def get_tags(request: Request, skip: int = Query(0, ge=0), limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT), cursor: Optional[str] = None, db: Session = Depends(get_db)):
+    """Get all tags, newest first, paginated by cursor (or legacy skip/limit)"""
+    validators = Validators(await run(db, tag.get_tags_version))
+    if validators.is_fresh(request):
+        return validators.not_modified()
+
+    async def load():
+        tags = await run(db, tag.get_tags, skip=skip, limit=limit, cursor=cursor)
+        return page(tags, limit)
+
+    response = await cache.read_through(tag_list_key(skip, limit, cursor), Page[tag_schema.Tag], load, group=TAG_LIST_GROUP)
+    return validators.apply(response)
 
 @router.post("/", response_model=tag_schema.Tag)
-def create_tag(tag_data: tag_schema.TagCreate, db: Session = Depends(get_db)):
+async def create_tag(tag_data: tag_schema.TagCreate, current_user: TokenUser = Depends(get_current_user), db: Session = Depends(get_db)):
     """Create a new tag"""
-    return tag.create_tag(db=db, tag=tag_data)
+    return await run(db, tag.create_tag, tag=tag_data)
+
+@router.post("/bulk", response_model=List[tag_schema.Tag])
+async def create_tags(
+    tags_data: List[tag_schema.TagCreate],
+    current_user: TokenUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Create several tags at once; tags that already exist are returned unchanged"""
+    if len(tags_data) > settings.BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_MAX_SIZE} tags per request")
+    return await run(db, tag.create_tags, tags=tags_data)
+
+@router.get("/suggest", response_model=List[tag_schema.TagSuggestion])
+async def suggest_tags(prefix: str = "", limit: int = 10, db: Session = Depends(get_db)):
+    """Suggest the most used tags starting with a prefix, from memory"""
+    if not 1 <= limit <= settings.TAG_SUGGEST_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {settings.TAG_SUGGEST_MAX_LIMIT}")
+    if tag_index.is_stale():
+        await run(db, tag.load_tag_index)
+    return tag.suggest_tags(prefix, limit)
 
 @router.get("/{tag_id}", response_model=tag_schema.Tag)
-def get_tag(tag_id: int, db: Session = Depends(get_db)):
+async def get_tag(tag_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get a specific tag by ID"""
-    db_tag = tag.get_tag(db, tag_id=tag_id)
+    version = await run(db, tag.get_tag_version, tag_id=tag_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Tag not found")
+    validators = Validators(version)
+    if validators.is_fresh(request):
+        return validators.not_modified()
+    db_tag = await run(db, tag.get_tag, tag_id=tag_id)
     if db_tag is None:
         raise HTTPException(status_code=404, detail="Tag not found")
+    validators.apply(response)
     return db_tag
 
 @router.put("/{tag_id}", response_model=tag_schema.Tag)
-def update_tag(tag_id: int, tag_data: tag_schema.TagUpdate, db: Session = Depends(get_db)):
+async def update_tag(
+    tag_id: int,
+    tag_data: tag_schema.TagUpdate,
+    current_user: TokenUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
     """Update a tag"""
-    db_tag = tag.get_tag(db, tag_id=tag_id)
+    db_tag = await run(db, tag.update_tag, tag_id=tag_id, tag=tag_data)
     if db_tag is None:
         raise HTTPException(status_code=404, detail="Tag not found")
-    return tag.update_tag(db=db, tag_id=tag_id, tag=tag_data)
+    return db_tag
 
 @router.delete("/{tag_id}")
-def delete_tag(tag_id: int, db: Session = Depends(get_db)):
+async def delete_tag(tag_id: int, current_user: TokenUser = Depends(get_current_user), db: Session = Depends(get_db)):
     """Delete a tag"""
-    db_tag = tag.get_tag(db, tag_id=tag_id)
-    if db_tag is None:
+    if await run(db, tag.delete_tag, tag_id=tag_id) is None:
         raise HTTPException(status_code=404, detail="Tag not found")
-    tag.delete_tag(db=db, tag_id=tag_id)
     return {"message": "Tag deleted successfully"}
 
+@router.get("/{tag_id}/questions", response_model=Page[question_schema.Question])
+async def get_questions_by_tag(
+    tag_id: int,
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    sort: str = "newest",
+    db: Session = Depends(get_db)
+):
+    """Get questions with a specific tag, in the order of ?sort= (newest, active, hot or unanswered)"""
+    if sort not in question.FEEDS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(question.FEEDS)}")
+    questions = await run(db, tag.get_questions_by_tag, tag_id=tag_id, limit=limit, cursor=cursor, sort=sort)
+    return conditional_page(request, response, questions, limit, question.version, question.feed_keys(sort))
+
 @router.get("/name/{tag_name}", response_model=tag_schema.Tag)
-def get_tag_by_name(tag_name: str, db: Session = Depends(get_db)):
+async def get_tag_by_name(tag_name: str, request: Request, db: Session = Depends(get_db)):
     """Get a tag by name"""
-    db_tag = tag.get_tag_by_name(db, name=tag_name)
-    if db_tag is None:
+    version = await run(db, tag.get_tag_version, name=tag_name)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Tag not found")
+    validators = Validators(version)
+    if validators.is_fresh(request):
+        return validators.not_modified()
+    response = await cache.read_through(
+        tag_name_key(tag_name),
+        tag_schema.Tag,
+        lambda: run(db, tag.get_tag_by_name, name=tag_name)
+    )
+    if response is None:
         raise HTTPException(status_code=404, detail="Tag not found")
-    return db_tag 
\ No newline at end of file
+    return validators.apply(response) 
\ No newline at end of file
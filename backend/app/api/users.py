@@ -1,55 +1,142 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import List
-from ..models import user
+from typing import Optional
+from ..models import user, notification
 from ..schemas import user as user_schema
-from ..database import get_db
+from ..schemas import notification as notification_schema
+from ..schemas.page import Page
+from ..database import get_db, run
+from ..serialization import FastJSONRoute
+from ..conditional import Validators, conditional_page
+from ..pagination import DEFAULT_LIMIT, MAX_LIMIT, page
+from .. import security
+from ..security import get_current_user, get_token_claims
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=FastJSONRoute)
 
-@router.get("/", response_model=List[user_schema.User])
-def get_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all users with pagination"""
-    users = user.get_users(db, skip=skip, limit=limit)
-    return users
+@router.get("/", response_model=Page[user_schema.User])
+async def get_users(
+    request: Request,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get all users, newest first, paginated by cursor (or legacy skip/limit)"""
+    users = await run(db, user.get_users, skip=skip, limit=limit, cursor=cursor)
+    return conditional_page(request, response, users, limit, user.version)
 
 @router.post("/", response_model=user_schema.User)
-def create_user(user_data: user_schema.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user_data: user_schema.UserCreate, db: Session = Depends(get_db)):
     """Create a new user"""
-    db_user = user.get_user_by_email(db, email=user_data.email)
+    db_user = await run(db, user.get_user_by_email, email=user_data.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return user.create_user(db=db, user=user_data)
+    hashed_password = await security.hash_password(user_data.password)
+    return await run(db, user.create_user, user=user_data, hashed_password=hashed_password)
+
+@router.get("/me", response_model=user_schema.TokenUser)
+async def read_current_user(current_user: user_schema.TokenUser = Depends(get_current_user)):
+    """Identity of the authenticated user, straight from the token"""
+    return current_user
 
 @router.get("/{user_id}", response_model=user_schema.User)
-def get_user(user_id: int, db: Session = Depends(get_db)):
+async def get_user(user_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get a specific user by ID"""
-    db_user = user.get_user(db, user_id=user_id)
+    version = await run(db, user.get_user_version, user_id=user_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    validators = Validators(version)
+    if validators.is_fresh(request):
+        return validators.not_modified()
+    db_user = await run(db, user.get_user, user_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
+    validators.apply(response)
     return db_user
 
 @router.put("/{user_id}", response_model=user_schema.User)
-def update_user(user_id: int, user_data: user_schema.UserUpdate, db: Session = Depends(get_db)):
-    """Update a user"""
-    db_user = user.get_user(db, user_id=user_id)
+async def update_user(
+    user_id: int,
+    user_data: user_schema.UserUpdate,
+    current_user: user_schema.TokenUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Update the authenticated user's account"""
+    if user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Cannot modify another user")
+    hashed_password = None
+    if user_data.password is not None:
+        hashed_password = await security.hash_password(user_data.password)
+        security.verification_cache.discard(user_id)
+    db_user = await run(db, user.update_user, user_id=user_id, user=user_data, hashed_password=hashed_password)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return user.update_user(db=db, user_id=user_id, user=user_data)
+    return db_user
 
 @router.delete("/{user_id}")
-def delete_user(user_id: int, db: Session = Depends(get_db)):
-    """Delete a user"""
-    db_user = user.get_user(db, user_id=user_id)
-    if db_user is None:
+async def delete_user(user_id: int, current_user: user_schema.TokenUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Delete the authenticated user's account"""
+    if user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Cannot delete another user")
+    if await run(db, user.delete_user, user_id=user_id) is None:
         raise HTTPException(status_code=404, detail="User not found")
-    user.delete_user(db=db, user_id=user_id)
+    security.verification_cache.discard(user_id)
     return {"message": "User deleted successfully"}
 
-@router.post("/login")
-def login(user_credentials: user_schema.UserLogin, db: Session = Depends(get_db)):
-    """User login"""
-    user_obj = user.authenticate_user(db, email=user_credentials.email, password=user_credentials.password)
-    if not user_obj:
+def _own_notifications(user_id: int, current_user: user_schema.TokenUser):
+    if user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Cannot read another user's notifications")
+
+@router.get("/{user_id}/notifications", response_model=Page[notification_schema.Notification])
+async def get_notifications(
+    user_id: int,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    unread: bool = False,
+    current_user: user_schema.TokenUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the authenticated user's notifications, newest first, paginated by cursor (or legacy skip/limit)"""
+    _own_notifications(user_id, current_user)
+    notifications = await run(db, notification.get_notifications, user_id=user_id, skip=skip, limit=limit, cursor=cursor, unread=unread)
+    return page(notifications, limit)
+
+@router.get("/{user_id}/notifications/unread_count", response_model=notification_schema.UnreadCount)
+async def get_unread_count(user_id: int, current_user: user_schema.TokenUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Number of unread notifications, read from the user's counter row"""
+    _own_notifications(user_id, current_user)
+    return {"unread_count": await run(db, notification.get_unread_count, user_id=user_id)}
+
+@router.post("/{user_id}/notifications/read", response_model=notification_schema.UnreadCount)
+async def mark_notifications_read(
+    user_id: int,
+    read: notification_schema.NotificationsRead = notification_schema.NotificationsRead(),
+    current_user: user_schema.TokenUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Mark the authenticated user's notifications read, all or up to an id"""
+    _own_notifications(user_id, current_user)
+    return {"unread_count": await run(db, notification.mark_notifications_read, user_id=user_id, up_to_id=read.up_to_id)}
+
+@router.post("/login", response_model=user_schema.Token)
+async def login(user_credentials: user_schema.UserLogin, db: Session = Depends(get_db)):
+    """User login, returning a bearer access token"""
+    user_obj = await run(db, user.get_user_by_email, email=user_credentials.email)
+    if not user_obj or not await security.verify_password(
+        user_credentials.password, user_obj.hashed_password, account=user_obj.id
+    ):
         raise HTTPException(status_code=401, detail="Incorrect email or password")
-    return {"message": "Login successful", "user_id": user_obj.id} 
\ No newline at end of file
+    if security.needs_rehash(user_obj.hashed_password):
+        # Upgrade hashes made with an old cost factor while we have the plain password
+        hashed_password = await security.hash_password(user_credentials.password)
+        await run(db, user.set_password_hash, user_id=user_obj.id, hashed_password=hashed_password)
+    return {"access_token": security.create_access_token(user_obj), "user_id": user_obj.id}
+
+@router.post("/logout")
+async def logout(claims: dict = Depends(get_token_claims)):
+    """Revoke the current access token"""
+    security.revoke_token(claims)
+    return {"message": "Logout successful"} 
\ No newline at end of file
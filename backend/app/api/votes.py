@@ -1,56 +1,118 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from ..models import vote
 from ..schemas import vote as vote_schema
-from ..database import get_db
+from ..schemas.page import Page
+from ..config import settings
+from ..database import get_db, run
+from ..serialization import FastJSONRoute
+from ..conditional import Validators, conditional_page
+from ..schemas.user import TokenUser
+from ..security import get_current_user
+from ..pagination import DEFAULT_LIMIT, MAX_LIMIT
 
-router = APIRouter(prefix="/votes", tags=["votes"])
+router = APIRouter(prefix="/votes", tags=["votes"], route_class=FastJSONRoute)
 
-@router.get("/", response_model=List[vote_schema.Vote])
-def get_votes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all votes with pagination"""
-    votes = vote.get_votes(db, skip=skip, limit=limit)
-    return votes
+async def _missing_or_forbidden(db, vote_id: int):
+    # The write is conditioned on the voter, so when it matched nothing one more read tells 404 from 403
+    if await run(db, vote.get_vote_owner, vote_id=vote_id) is None:
+        raise HTTPException(status_code=404, detail="Vote not found")
+    raise HTTPException(status_code=403, detail="Not your vote")
+
+@router.get("/", response_model=Page[vote_schema.Vote])
+async def get_votes(
+    request: Request,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get all votes, newest first, paginated by cursor (or legacy skip/limit)"""
+    votes = await run(db, vote.get_votes, skip=skip, limit=limit, cursor=cursor)
+    return conditional_page(request, response, votes, limit, vote.version)
 
 @router.post("/", response_model=vote_schema.Vote)
-def create_vote(vote_data: vote_schema.VoteCreate, db: Session = Depends(get_db)):
-    """Create a new vote"""
-    return vote.create_vote(db=db, vote=vote_data)
+async def create_vote(vote_data: vote_schema.VoteCreate, current_user: TokenUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Cast a vote as the authenticated user"""
+    vote_data = vote_data.model_copy(update={"user_id": current_user.id})
+    if vote_data.question_id is not None:
+        existing = await run(db, vote.get_vote_by_user_and_question, user_id=current_user.id, question_id=vote_data.question_id)
+    else:
+        existing = await run(db, vote.get_vote_by_user_and_answer, user_id=current_user.id, answer_id=vote_data.answer_id)
+    if existing:
+        raise HTTPException(status_code=400, detail="Already voted; update or delete the existing vote")
+    db_vote = await run(db, vote.create_vote, vote=vote_data)
+    if db_vote is None:
+        raise HTTPException(status_code=404, detail="Question or answer not found")
+    return db_vote
+
+@router.post("/bulk", response_model=vote_schema.VoteImportResult)
+async def import_votes(
+    votes_data: List[vote_schema.VoteCreate],
+    current_user: TokenUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Cast or change many of the authenticated user's votes in one request"""
+    if len(votes_data) > settings.BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_MAX_SIZE} votes per request")
+    return await run(db, vote.import_votes, user_id=current_user.id, votes=votes_data)
 
 @router.get("/{vote_id}", response_model=vote_schema.Vote)
-def get_vote(vote_id: int, db: Session = Depends(get_db)):
+async def get_vote(vote_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get a specific vote by ID"""
-    db_vote = vote.get_vote(db, vote_id=vote_id)
+    db_vote = await run(db, vote.get_vote, vote_id=vote_id)
     if db_vote is None:
         raise HTTPException(status_code=404, detail="Vote not found")
+    validators = Validators(vote.version(db_vote))
+    if validators.is_fresh(request):
+        return validators.not_modified()
+    validators.apply(response)
     return db_vote
 
 @router.put("/{vote_id}", response_model=vote_schema.Vote)
-def update_vote(vote_id: int, vote_data: vote_schema.VoteUpdate, db: Session = Depends(get_db)):
-    """Update a vote"""
-    db_vote = vote.get_vote(db, vote_id=vote_id)
+async def update_vote(
+    vote_id: int,
+    vote_data: vote_schema.VoteUpdate,
+    current_user: TokenUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Update a vote cast by the authenticated user"""
+    db_vote = await run(db, vote.update_vote, vote_id=vote_id, vote=vote_data, user_id=current_user.id)
     if db_vote is None:
-        raise HTTPException(status_code=404, detail="Vote not found")
-    return vote.update_vote(db=db, vote_id=vote_id, vote=vote_data)
+        await _missing_or_forbidden(db, vote_id)
+    return db_vote
 
 @router.delete("/{vote_id}")
-def delete_vote(vote_id: int, db: Session = Depends(get_db)):
-    """Delete a vote"""
-    db_vote = vote.get_vote(db, vote_id=vote_id)
-    if db_vote is None:
-        raise HTTPException(status_code=404, detail="Vote not found")
-    vote.delete_vote(db=db, vote_id=vote_id)
+async def delete_vote(vote_id: int, current_user: TokenUser = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Delete a vote cast by the authenticated user"""
+    if await run(db, vote.delete_vote, vote_id=vote_id, user_id=current_user.id) is None:
+        await _missing_or_forbidden(db, vote_id)
     return {"message": "Vote deleted successfully"}
 
-@router.get("/question/{question_id}", response_model=List[vote_schema.Vote])
-def get_votes_by_question(question_id: int, db: Session = Depends(get_db)):
-    """Get all votes for a specific question"""
-    votes = vote.get_votes_by_question(db, question_id=question_id)
-    return votes
-
-@router.get("/answer/{answer_id}", response_model=List[vote_schema.Vote])
-def get_votes_by_answer(answer_id: int, db: Session = Depends(get_db)):
-    """Get all votes for a specific answer"""
-    votes = vote.get_votes_by_answer(db, answer_id=answer_id)
-    return votes 
\ No newline at end of file
+@router.get("/question/{question_id}", response_model=Page[vote_schema.Vote])
+async def get_votes_by_question(
+    question_id: int,
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get votes for a specific question, newest first"""
+    votes = await run(db, vote.get_votes_by_question, question_id=question_id, limit=limit, cursor=cursor)
+    return conditional_page(request, response, votes, limit, vote.version)
+
+@router.get("/answer/{answer_id}", response_model=Page[vote_schema.Vote])
+async def get_votes_by_answer(
+    answer_id: int,
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get votes for a specific answer, newest first"""
+    votes = await run(db, vote.get_votes_by_answer, answer_id=answer_id, limit=limit, cursor=cursor)
+    return conditional_page(request, response, votes, limit, vote.version) 
\ No newline at end of file
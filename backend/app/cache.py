@@ -0,0 +1,272 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from fastapi import Response
+from starlette.concurrency import run_in_threadpool
+from .config import settings
+from .replicas import primary_reads
+from .serialization import dumps
+
+class MemoryBackend:
+    """Per-process LRU with a TTL and a bound on the number of entries"""
+
+    blocking = False
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at, group)
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def _remove(self, key):
+        _, _, group = self._entries.pop(key)
+        if group is not None:
+            members = self._groups.get(group)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del self._groups[group]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl: int, group=None):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl, group)
+            if group is not None:
+                self._groups.setdefault(group, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, keys=(), groups=()):
+        with self._lock:
+            keys = set(keys)
+            for group in groups:
+                keys.update(self._groups.get(group, ()))
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+
+class RedisBackend:
+    """Shared cache for multi-process deployments; any client speaking the redis-py API works"""
+
+    blocking = True
+
+    def __init__(self, url: str = None, client=None, prefix: str = "stackit:"):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("CACHE_BACKEND=redis requires the redis package")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def _group_key(self, group):
+        # Members of a group are tracked in a set so invalidation never needs a keyspace scan
+        return f"{self.prefix}group:{group}"
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl: int, group=None):
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, value, ex=ttl)
+        if group is not None:
+            pipe.sadd(self._group_key(group), self.prefix + key)
+            pipe.expire(self._group_key(group), ttl)
+        pipe.execute()
+
+    def delete(self, keys=(), groups=()):
+        names = [self.prefix + key for key in keys]
+        for group in groups:
+            names.extend(self.client.smembers(self._group_key(group)))
+            names.append(self._group_key(group))
+        if names:
+            self.client.delete(*names)
+
+    def clear(self):
+        names = list(self.client.scan_iter(match=self.prefix + "*"))
+        if names:
+            self.client.delete(*names)
+
+class NullBackend:
+    blocking = False
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl: int, group=None):
+        pass
+
+    def delete(self, keys=(), groups=()):
+        pass
+
+    def clear(self):
+        pass
+
+# Invalidations queued while a model function runs on the event loop (see ResponseCache.deferred_invalidations)
+_deferred = ContextVar("stackit_cache_invalidations", default=None)
+
+class ResponseCache:
+    """Read-through cache of serialized JSON responses, invalidated explicitly by the write paths in models/.
+
+    A backend failure is counted and treated as a miss, so an unavailable cache
+    never fails a request. TTLs bound how long a value can outlive a write that
+    raced with the read that cached it.
+    """
+
+    def __init__(self, backend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, key, event):
+        with self._lock:
+            self.counters[(key.split(":", 1)[0], event)] += 1
+
+    def _get(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception:
+            self._count(key, "errors")
+            return None
+
+    def _set(self, key, value, group):
+        try:
+            self.backend.set(key, value, self.ttl, group)
+        except Exception:
+            self._count(key, "errors")
+
+    async def read_through(self, key: str, schema, load, group: str = None):
+        """Return the cached response for key, or await load(), serialize it with schema and cache it.
+
+        Returns None without caching when load() returns None, so callers can 404.
+        load() reads from the primary, so a lagging replica never fills the cache.
+        """
+        if self.backend.blocking:
+            body = await run_in_threadpool(self._get, key)
+        else:
+            body = self._get(key)
+        if body is not None:
+            self._count(key, "hits")
+            return Response(content=body, media_type="application/json")
+
+        self._count(key, "misses")
+        with primary_reads():
+            value = await load()
+        if value is None:
+            return None
+        body = dumps(schema, value)
+        if self.backend.blocking:
+            await run_in_threadpool(self._set, key, body, group)
+        else:
+            self._set(key, body, group)
+        return Response(content=body, media_type="application/json")
+
+    def invalidate(self, keys=(), groups=()):
+        for name in [*keys, *groups]:
+            self._count(name, "invalidations")
+        pending = _deferred.get()
+        if pending is not None and self.backend.blocking:
+            pending.append((keys, groups))
+            return
+        self._delete(keys, groups)
+
+    def _delete(self, keys, groups):
+        try:
+            self.backend.delete(keys, groups)
+        except Exception:
+            self._count("invalidate", "errors")
+
+    @asynccontextmanager
+    async def deferred_invalidations(self):
+        """Hold back a blocking backend's deletes in the enclosed block and run them in the threadpool as it exits.
+
+        For model functions running on the event loop through run_sync, like
+        read_through's lookups. The deletes finish before the block does, so the
+        route's response still follows its invalidations.
+        """
+        pending = []
+        token = _deferred.set(pending)
+        try:
+            yield
+        finally:
+            _deferred.reset(token)
+            if pending:
+                keys = [key for keys, _ in pending for key in keys]
+                groups = [group for _, groups in pending for group in groups]
+                await run_in_threadpool(self._delete, keys, groups)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        namespaces = {}
+        for (namespace, event), count in counters.items():
+            namespaces.setdefault(namespace, {"hits": 0, "misses": 0, "invalidations": 0, "errors": 0})[event] = count
+        for values in namespaces.values():
+            lookups = values["hits"] + values["misses"]
+            values["hit_ratio"] = values["hits"] / lookups if lookups else None
+        return {"backend": type(self.backend).__name__, "ttl": self.ttl, "namespaces": namespaces}
+
+def build_backend(name: str):
+    if name == "memory":
+        return MemoryBackend(settings.CACHE_MAX_ENTRIES)
+    if name == "redis":
+        return RedisBackend(settings.CACHE_REDIS_URL, prefix=settings.CACHE_KEY_PREFIX)
+    if name == "none":
+        return NullBackend()
+    raise ValueError(f"Unknown CACHE_BACKEND {name!r}")
+
+cache = ResponseCache(build_backend(settings.CACHE_BACKEND), settings.CACHE_TTL_SECONDS)
+
+# Keys and groups
+
+def question_key(question_id: int):
+    return f"question:{question_id}"
+
+def answer_list_group(question_id: int):
+    return f"answers:question:{question_id}"
+
+def answer_list_key(question_id: int, limit: int, cursor: str = None):
+    return f"{answer_list_group(question_id)}:{limit}:{cursor or ''}"
+
+TAG_LIST_GROUP = "tags"
+
+def tag_list_key(skip: int, limit: int, cursor: str = None):
+    return f"{TAG_LIST_GROUP}:{skip}:{limit}:{cursor or ''}"
+
+def tag_name_key(name: str):
+    return f"tag:name:{name}"
+
+# Invalidation, called by models/ after their writes commit
+
+def invalidate_questions(*question_ids):
+    cache.invalidate(keys=[question_key(i) for i in question_ids if i is not None])
+
+def invalidate_answer_lists(*question_ids):
+    cache.invalidate(groups=[answer_list_group(i) for i in question_ids if i is not None])
+
+def invalidate_tags(*names):
+    cache.invalidate(keys=[tag_name_key(name) for name in names if name is not None], groups=[TAG_LIST_GROUP])
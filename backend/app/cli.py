@@ -0,0 +1,146 @@
+import argparse
+import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from . import dump, outbox
+from .config import settings
+from .database import SessionLocal, engine
+from .instrumentation import assert_no_full_scans
+from .migrations import upgrade_database
+from .models import question, answer, user, tag, vote, search, notification
+from .pagination import encode_cursor
+
+def reconcile_counters(args):
+    """Recompute denormalized scores and answer counts from the votes and answers tables"""
+    db = SessionLocal()
+    try:
+        vote.reconcile_counters(db)
+    finally:
+        db.close()
+    print("Counters reconciled")
+
+def deliver_notifications(args):
+    """Deliver the notification outbox, once or every NOTIFICATIONS_INTERVAL_SECONDS with --follow"""
+    while True:
+        delivered = outbox.drain()
+        if delivered or not args.follow:
+            print(f"{delivered} notification events delivered", file=sys.stderr)
+        if not args.follow:
+            return
+        time.sleep(settings.NOTIFICATIONS_INTERVAL_SECONDS)
+
+def query_plan_checks():
+    # Every read path the API serves, with representative arguments
+    cursor = encode_cursor((datetime.now(timezone.utc), 1))
+    return {
+        "question.get_questions": lambda db: question.get_questions(db, limit=20),
+        "question.get_questions (cursor)": lambda db: question.get_questions(db, limit=20, cursor=cursor),
+        **{
+            f"question.get_questions (sort={sort})": lambda db, sort=sort: question.get_questions(db, limit=20, sort=sort)
+            for sort in question.FEEDS
+        },
+        "tag.get_questions_by_tag (sort=hot)": lambda db: tag.get_questions_by_tag(db, 1, limit=20, sort="hot"),
+        "question.get_question": lambda db: question.get_question(db, 1),
+        "question.get_question_version": lambda db: question.get_question_version(db, 1),
+        "question.get_question_detail": lambda db: question.get_question_detail(db, 1, viewer_id=1),
+        "question.get_questions_by_author": lambda db: question.get_questions_by_author(db, 1, limit=20, cursor=cursor),
+        "question.search_questions": lambda db: question.search_questions(db, "python"),
+        "answer.get_answers": lambda db: answer.get_answers(db, limit=20, cursor=cursor),
+        "answer.get_answer": lambda db: answer.get_answer(db, 1),
+        "answer.get_answer_version": lambda db: answer.get_answer_version(db, 1),
+        "answer.get_answers_by_question": lambda db: answer.get_answers_by_question(db, 1, limit=20, cursor=cursor),
+        "answer.get_answers_by_question_version": lambda db: answer.get_answers_by_question_version(db, 1),
+        "answer.get_answers_by_author": lambda db: answer.get_answers_by_author(db, 1, limit=20, cursor=cursor),
+        "vote.get_votes": lambda db: vote.get_votes(db, limit=20, cursor=cursor),
+        "vote.get_vote": lambda db: vote.get_vote(db, 1),
+        "vote.get_votes_by_question": lambda db: vote.get_votes_by_question(db, 1, limit=20, cursor=cursor),
+        "vote.get_votes_by_answer": lambda db: vote.get_votes_by_answer(db, 1, limit=20, cursor=cursor),
+        "vote.get_votes_by_user": lambda db: vote.get_votes_by_user(db, 1, limit=20, cursor=cursor),
+        "vote.get_vote_by_user_and_question": lambda db: vote.get_vote_by_user_and_question(db, 1, 1),
+        "vote.get_vote_by_user_and_answer": lambda db: vote.get_vote_by_user_and_answer(db, 1, 1),
+        "tag.get_tags": lambda db: tag.get_tags(db, limit=20, cursor=cursor),
+        "tag.get_tag": lambda db: tag.get_tag(db, 1),
+        "tag.get_tag_by_name": lambda db: tag.get_tag_by_name(db, "python"),
+        "tag.get_tag_version": lambda db: tag.get_tag_version(db, name="python"),
+        "tag.get_tags_version": lambda db: tag.get_tags_version(db),
+        "tag.get_tags_by_question": lambda db: tag.get_tags_by_question(db, 1),
+        "tag.get_questions_by_tag": lambda db: tag.get_questions_by_tag(db, 1, limit=20, cursor=cursor),
+        "user.get_users": lambda db: user.get_users(db, limit=20, cursor=cursor),
+        "user.get_user": lambda db: user.get_user(db, 1),
+        "user.get_user_by_email": lambda db: user.get_user_by_email(db, "user@example.com"),
+        "user.get_user_by_username": lambda db: user.get_user_by_username(db, "user"),
+        "user.get_user_version": lambda db: user.get_user_version(db, 1),
+        "search.search": lambda db: search.search(db, "python"),
+        "notification.get_notifications": lambda db: notification.get_notifications(db, 1, limit=20, cursor=cursor),
+        "notification.get_notifications (unread)": lambda db: notification.get_notifications(db, 1, limit=20, unread=True),
+        "notification.get_unread_count": lambda db: notification.get_unread_count(db, 1),
+    }
+
+def check_query_plans(args):
+    """EXPLAIN every model read query and fail if any plans a full table scan"""
+    failed = 0
+    for name, check in query_plan_checks().items():
+        db = SessionLocal()
+        try:
+            with assert_no_full_scans(engine):
+                check(db)
+        except AssertionError as exc:
+            failed += 1
+            print(f"FAIL {name}\n{exc}")
+        else:
+            print(f"ok   {name}")
+        finally:
+            db.close()
+    if failed:
+        sys.exit(f"{failed} quer{'y' if failed == 1 else 'ies'} with full table scans")
+
+def export_dump(args):
+    """Write tables as NDJSON (a full dump by default) or one table as CSV"""
+    tables = args.tables.split(",") if args.tables else list(dump.TABLES)
+    unknown = [name for name in tables if name not in dump.TABLES]
+    if unknown:
+        sys.exit(f"Unknown tables: {', '.join(unknown)}")
+    if args.format == "csv" and len(tables) != 1:
+        sys.exit("CSV exports one table at a time; pass --tables NAME")
+    with (open(args.output, "wb") if args.output != "-" else nullcontext(sys.stdout.buffer)) as out:
+        for chunk in dump.stream(tables, args.format, private=not args.public):
+            out.write(chunk)
+
+def import_dump(args):
+    """Load an NDJSON dump written by export, skipping rows that already exist"""
+    with (open(args.input, encoding="utf-8") if args.input != "-" else nullcontext(sys.stdin)) as lines:
+        counts = dump.load_ndjson(lines, table=args.table)
+    for name, (inserted, skipped) in counts.items():
+        print(f"{name}: {inserted} inserted, {skipped} skipped", file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="StackIt maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("reconcile-counters", help=reconcile_counters.__doc__).set_defaults(func=reconcile_counters)
+    subparsers.add_parser("check-query-plans", help=check_query_plans.__doc__).set_defaults(func=check_query_plans)
+
+    deliver_parser = subparsers.add_parser("deliver-notifications", help=deliver_notifications.__doc__)
+    deliver_parser.add_argument("--follow", action="store_true", help="Keep delivering until interrupted")
+    deliver_parser.set_defaults(func=deliver_notifications)
+
+    export_parser = subparsers.add_parser("export", help=export_dump.__doc__)
+    export_parser.add_argument("--tables", help="Comma-separated tables (default: all)")
+    export_parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    export_parser.add_argument("--output", "-o", default="-", help="File to write (default: stdout)")
+    export_parser.add_argument("--public", action="store_true", help="Leave out emails and password hashes")
+    export_parser.set_defaults(func=export_dump)
+
+    import_parser = subparsers.add_parser("import", help=import_dump.__doc__)
+    import_parser.add_argument("input", help="NDJSON file, or - for stdin")
+    import_parser.add_argument("--table", help="The file holds bare rows of this table, as served by GET /export/{table}")
+    import_parser.set_defaults(func=import_dump)
+
+    args = parser.parse_args(argv)
+    upgrade_database(engine)
+    search.init_search_index(engine)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+from .pagination import page
+
+class Validators:
+    """Weak ETag and Last-Modified derived from a version fingerprint of a resource.
+
+    The fingerprint is any tuple that changes whenever the serialized
+    representation would, e.g. timestamps plus denormalized counters, so it
+    can be checked without loading or serializing the full resource.
+    """
+
+    def __init__(self, version):
+        self.etag = 'W/"%s"' % hashlib.sha1(repr(version).encode()).hexdigest()
+        timestamps = [_as_utc(value) for value in _flatten(version) if isinstance(value, datetime)]
+        self.last_modified = max(timestamps) if timestamps else None
+
+    @classmethod
+    def for_items(cls, items, item_version, *extra):
+        return cls((tuple(item_version(item) for item in items), *extra))
+
+    def is_fresh(self, request: Request) -> bool:
+        """True when the client's cached copy is current, per RFC 9110 precedence"""
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            if if_none_match.strip() == "*":
+                return True
+            # Weak comparison: ignore the W/ prefix on both sides
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return self.etag.removeprefix("W/") in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since is not None and self.last_modified is not None:
+            try:
+                since = _as_utc(parsedate_to_datetime(if_modified_since))
+            except (TypeError, ValueError):
+                return False
+            return self.last_modified.replace(microsecond=0) <= since
+        return False
+
+    @property
+    def headers(self):
+        headers = {"ETag": self.etag}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+    def apply(self, response: Response):
+        response.headers.update(self.headers)
+        return response
+
+    def not_modified(self):
+        return Response(status_code=304, headers=self.headers)
+
+def conditional_page(request: Request, response: Response, items, limit: int, item_version, keys=("created_at", "id")):
+    """page(items, limit, keys), or a 304 before serialization when the client already has this page"""
+    validators = Validators.for_items(items, item_version)
+    if validators.is_fresh(request):
+        return validators.not_modified()
+    validators.apply(response)
+    return page(items, limit, keys)
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; CURRENT_TIMESTAMP is UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def _flatten(value):
+    if isinstance(value, (tuple, list)):
+        for item in value:
+            yield from _flatten(item)
+    else:
+        yield value
@@ -1,18 +1,106 @@
 import os
+from typing import Optional
 from pydantic_settings import BaseSettings
 
+# Placeholder that ships in this file and the readme; tokens signed with it can be forged by anyone
+DEFAULT_SECRET_KEY = "your-secret-key-here"
+
 class Settings(BaseSettings):
     # Database settings
     DATABASE_URL: str = "sqlite:///./stackit.db"
+    # Serve requests on an async engine (aiosqlite / asyncpg) instead of the threadpool
+    DATABASE_ASYNC: bool = False
+    # Defaults to DATABASE_URL with the matching async driver
+    ASYNC_DATABASE_URL: Optional[str] = None
+    # Read replicas for the read-only model functions, e.g. ["postgresql://replica1/stackit"]; async URLs are derived
+    DATABASE_REPLICA_URLS: list = []
+    DB_REPLICA_CHECK_SECONDS: float = 5.0  # Health check interval; a replica that fails one takes no reads until it passes
+    DB_READ_YOUR_WRITES_SECONDS: float = 5.0  # How long a caller's reads stay on the primary after they write
+
+    # Connection pool settings
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800  # Seconds; -1 never recycles
+    DB_POOL_PRE_PING: bool = True
+
+    # SQLite tuning, applied to every new connection
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 268435456  # Bytes
+    SQLITE_CACHE_SIZE: int = -64000  # Negative values are KiB
+    SQLITE_BUSY_TIMEOUT: int = 5000  # Milliseconds
     
     # Security settings
-    SECRET_KEY: str = "your-secret-key-here"
+    SECRET_KEY: str = DEFAULT_SECRET_KEY  # Startup fails while this is the default, unless DEBUG is set
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+
+    # Password hashing settings
+    BCRYPT_ROUNDS: int = 12  # Existing hashes are upgraded on the next login when this changes
+    PASSWORD_HASH_WORKERS: int = 2  # Processes dedicated to bcrypt; 0 uses the thread executor
+    PASSWORD_CACHE_TTL_SECONDS: int = 300  # 0 disables the verification cache
+    PASSWORD_CACHE_SIZE: int = 10000
+    TOKEN_CACHE_SIZE: int = 4096  # Decoded access tokens kept in memory
+
+    # Response cache for hot GET endpoints
+    CACHE_BACKEND: str = "memory"  # memory, redis or none
+    CACHE_TTL_SECONDS: int = 60
+    CACHE_MAX_ENTRIES: int = 10000  # Memory backend only
+    CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    CACHE_KEY_PREFIX: str = "stackit:"
     
+    # Hot feed ranking; changing either needs a reconcile-counters run to rescore existing questions
+    HOT_SCORE_DECAY_SECONDS: int = 45000  # A question this much newer ranks like one with 10x the votes
+    HOT_SCORE_ANSWER_WEIGHT: int = 2  # Each answer counts as this many upvotes
+
+    # Request instrumentation
+    SERVER_TIMING: bool = True  # Add a Server-Timing header with app and database time
+    SLOW_QUERY_MS: float = 200  # Log statements slower than this with their parameters; 0 disables
+    PROFILE_SAMPLE_RATE: float = 0.0  # Fraction of requests run under cProfile, one at a time
+    PROFILE_DIR: str = "profiles"  # Where sampled profiles are written as .prof files
+
+    # Serialize responses from ORM rows with orjson, skipping response_model validation (pip install orjson)
+    FAST_JSON: bool = False
+
+    # Tag suggestions are served from an in-process index, reloaded this often to pick up other workers' writes; 0 never reloads
+    TAG_INDEX_REFRESH_SECONDS: int = 300
+    TAG_SUGGEST_MAX_LIMIT: int = 50
+
+    # Live question and user activity streams (/events)
+    EVENTS_BROKER: str = "memory"  # memory, or redis to share events between workers
+    EVENTS_REDIS_URL: str = "redis://localhost:6379/0"
+    EVENTS_QUEUE_SIZE: int = 100  # Pending events per connection before EVENTS_DROP_POLICY applies
+    EVENTS_DROP_POLICY: str = "oldest"  # oldest drops the oldest pending event, disconnect closes the stream
+    EVENTS_COALESCE_MS: int = 250  # Score changes to one post within this window reach clients as one event
+    EVENTS_HEARTBEAT_SECONDS: int = 15
+    EVENTS_MAX_TOPICS: int = 20  # Questions one connection may follow
+
+    # Notifications are queued in an outbox by the writes that cause them and delivered in batches
+    NOTIFICATIONS_WORKER: bool = True  # Deliver from each API process; false when `python -m app.cli deliver-notifications --follow` runs instead
+    NOTIFICATIONS_INTERVAL_SECONDS: float = 1.0
+    NOTIFICATIONS_BATCH_SIZE: int = 500
+
+    # Write-behind vote and view counters: buffered per process and flushed in batches instead of one UPDATE per request
+    COUNTER_WRITE_BEHIND: bool = False
+    COUNTER_FLUSH_SECONDS: float = 1.0  # Longest a buffered delta waits for the database
+    COUNTER_MAX_PENDING: int = 10000  # Posts with buffered deltas that trigger an early flush
+    COUNTER_LOG_DIR: str = "counter-log"  # Crash log, replayed at startup; shared by the workers of one host
+    COUNTER_LOG_FSYNC: bool = False  # fsync every record, surviving power loss as well as process crashes
+
+    # Largest list accepted by the batch endpoints
+    BATCH_MAX_SIZE: int = 1000
+    # Rows per fetch when exporting and per executemany when importing
+    DUMP_BATCH_SIZE: int = 1000
+    # User ids allowed to stream dumps from /export; empty leaves exports to `python -m app.cli export`
+    EXPORT_USER_IDS: list = []
+
     # CORS settings
     ALLOWED_ORIGINS: list = ["http://localhost:3000"]
     
+    # Local development: allows the default SECRET_KEY, with a warning at startup
+    DEBUG: bool = False
+
     # API settings
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "StackIt"
@@ -0,0 +1,344 @@
+import asyncio
+import contextlib
+import glob
+import json
+import logging
+import os
+import threading
+import uuid
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from starlette.concurrency import run_in_threadpool
+from .config import settings
+
+logger = logging.getLogger("stackit.counters")
+
+# Order of the deltas kept per (table, id)
+FIELDS = ("score", "upvote_count", "downvote_count", "view_count")
+
+class CounterLog:
+    """Append-only record of the deltas a process has buffered, replayed after a crash.
+
+    Every record carries a sequence number, and each flush stores the last one it
+    wrote in counter_log_state within the same transaction, so a replay skips
+    whatever already reached the database. A flush starts a new segment file and
+    deletes the old ones once committed. The owning process holds an flock on
+    each of its segments, so a segment nobody holds belongs to a dead process.
+    Creating a segment and recovering orphans both hold the directory's lock
+    file. Otherwise a recovering worker could claim a segment in the moment
+    between its creation and its flock, or replay one another worker already
+    replayed.
+    """
+
+    def __init__(self, directory: str):
+        try:
+            import fcntl
+        except ImportError:
+            raise RuntimeError("COUNTER_WRITE_BEHIND needs fcntl (a POSIX system) for its crash log")
+        self._fcntl = fcntl
+        self.directory = directory
+        self.log_id = uuid.uuid4().hex
+        self._segment = 0
+        self._files = []  # open (path, fd) segments, oldest first; the last one is written
+        os.makedirs(directory, exist_ok=True)
+        self.rotate()
+
+    def rotate(self):
+        self._segment += 1
+        path = os.path.join(self.directory, f"{self.log_id}-{self._segment}.log")
+        with CounterLog.locked(self.directory):
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            self._fcntl.flock(fd, self._fcntl.LOCK_EX | self._fcntl.LOCK_NB)
+        self._files.append((path, fd))
+
+    def append(self, seq: int, key, deltas):
+        os.write(self._files[-1][1], (json.dumps([seq, *key, deltas], separators=(",", ":")) + "\n").encode())
+        if settings.COUNTER_LOG_FSYNC:
+            os.fsync(self._files[-1][1])
+
+    def remove_flushed(self, keep: int = 1):
+        """Delete every segment but the newest `keep`; their records are in the database"""
+        while len(self._files) > keep:
+            path, fd = self._files.pop(0)
+            os.remove(path)
+            os.close(fd)
+
+    def close(self):
+        self.remove_flushed(keep=0)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def locked(directory: str):
+        """Hold the directory's lock file, shared by every process logging there"""
+        import fcntl
+        os.makedirs(directory, exist_ok=True)
+        fd = os.open(os.path.join(directory, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def orphans(directory: str):
+        """{log_id: [(path, fd), ...]} of segments whose process is gone, locked for the caller; call within locked()"""
+        import fcntl
+        found = {}
+        for path in sorted(glob.glob(os.path.join(directory, "*.log")), key=_segment_order):
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue  # Flushed and removed by its live process
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)  # Held by a live process
+                continue
+            if os.fstat(fd).st_nlink == 0:
+                os.close(fd)  # Removed by its process between the open and the flock
+                continue
+            found.setdefault(os.path.basename(path).rsplit("-", 1)[0], []).append((path, fd))
+        return found
+
+    @staticmethod
+    def read(files, after_seq: int):
+        """Sum of the records with a sequence number above after_seq, and the highest one"""
+        deltas, last = {}, after_seq
+        for path, _ in files:
+            with open(path, encoding="utf-8") as lines:
+                for line in lines:
+                    try:
+                        seq, table, target_id, values = json.loads(line)
+                    except ValueError:
+                        continue  # A record cut short by the crash
+                    if seq > after_seq:
+                        _add(deltas, (table, target_id), values)
+                        last = max(last, seq)
+        return deltas, last
+
+def _segment_order(path):
+    name, _, segment = os.path.basename(path)[:-len(".log")].rpartition("-")
+    return name, int(segment) if segment.isdigit() else 0
+
+def _add(deltas: dict, key, values):
+    pending = deltas.get(key)
+    if pending is None:
+        deltas[key] = list(values)
+    else:
+        for index, value in enumerate(values):
+            pending[index] += value
+
+class CounterBuffer:
+    """Per-process write-behind buffer for vote counters and question views.
+
+    Vote transactions hand their counter deltas over when they commit, instead of
+    updating the hot question or answer row themselves; views are added straight
+    from the request. A background task writes everything buffered in one
+    transaction every COUNTER_FLUSH_SECONDS, or sooner once COUNTER_MAX_PENDING
+    posts have pending deltas. Until then, ORM loads and version queries add
+    this process's pending deltas to what they read.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._pending = {}  # (table, id) -> deltas in FIELDS order
+        self._flushing = {}  # the batch being written, still visible to reads
+        self._seq = 0
+        self.flushes = 0
+        self.failures = 0
+        self.answer_generation = 0  # Bumped by every buffered answer delta, for answer list versions
+        self._log = None
+        self._task = None
+        self._wake = None
+        self._loop = None
+
+    def add(self, key, values):
+        """Buffer deltas (in FIELDS order) for ("questions" or "answers", id)"""
+        with self._lock:
+            self._seq += 1
+            if self._log is not None:
+                self._log.append(self._seq, key, values)
+            _add(self._pending, key, values)
+            if key[0] == "answers":
+                self.answer_generation += 1
+            full = len(self._pending) >= settings.COUNTER_MAX_PENDING
+        if full and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def add_view(self, question_id: int):
+        self.add(("questions", question_id), [0, 0, 0, 1])
+
+    def pending(self, table: str, target_id: int):
+        """This process's deltas for a post not yet in the database, in FIELDS order"""
+        with self._lock:
+            values = [0] * len(FIELDS)
+            for batch in (self._flushing, self._pending):
+                for index, value in enumerate(batch.get((table, target_id), ())):
+                    values[index] += value
+            return values
+
+    def votes_version(self, table: str, target_id: int):
+        """Pending vote deltas for ETag versions; views do not change the version"""
+        return tuple(self.pending(table, target_id)[:3]) if self.enabled else ()
+
+    def merge(self, table: str, target_id: int, counters: dict) -> dict:
+        """A copy of counters, holding any of FIELDS, with the pending deltas added"""
+        merged = dict(counters)
+        for field, delta in zip(FIELDS, self.pending(table, target_id)):
+            if delta and field in merged:
+                merged[field] += delta
+        return merged
+
+    def merge_loaded(self, instance, context, attrs=None):
+        """ORM load/refresh hook adding pending deltas to a Question or Answer without marking it dirty"""
+        if not self.enabled:
+            return
+        state = instance.__dict__
+        deltas = self.pending(instance.__tablename__, state.get("id"))
+        for field, delta in zip(FIELDS, deltas):
+            # A refresh of other attributes keeps the counters already merged
+            if delta and state.get(field) is not None and (attrs is None or field in attrs):
+                set_committed_value(instance, field, state[field] + delta)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "pending": len(self._pending) + len(self._flushing),
+                "flushes": self.flushes,
+                "failures": self.failures,
+            }
+
+    # Flushing
+
+    def flush(self, db) -> int:
+        """Write the buffered deltas in one transaction; returns how many posts they touched"""
+        from .models import vote
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            self._flushing = batch
+            seq = self._seq
+            if self._log is not None:
+                self._log.rotate()
+        try:
+            vote.flush_counters(db, batch, self._log.log_id if self._log else None, seq)
+        except Exception:
+            with self._lock:
+                for key, values in batch.items():
+                    _add(self._pending, key, values)
+                self._flushing = {}
+                self.failures += 1
+            raise
+        with self._lock:
+            self._flushing = {}
+            self.flushes += 1
+            if any(table == "answers" for table, _ in batch):
+                self.answer_generation += 1
+        if self._log is not None:
+            self._log.remove_flushed()
+        vote.publish_flushed(db, batch)
+        return len(batch)
+
+    def recover(self, db):
+        """Replay the crash logs of processes that died with deltas buffered"""
+        from .models import vote
+        with CounterLog.locked(settings.COUNTER_LOG_DIR):
+            for log_id, files in CounterLog.orphans(settings.COUNTER_LOG_DIR).items():
+                try:
+                    deltas, seq = CounterLog.read(files, vote.get_counter_log_seq(db, log_id))
+                    if deltas:
+                        vote.flush_counters(db, deltas, log_id, seq)
+                        logger.warning("Replayed %d buffered counter deltas from crash log %s", len(deltas), log_id)
+                    for path, _ in files:
+                        os.remove(path)
+                    vote.forget_counter_log(db, log_id)
+                finally:
+                    for _, fd in files:
+                        os.close(fd)
+
+    def _flush_now(self):
+        from .database import SessionLocal
+        db = SessionLocal()
+        try:
+            return self.flush(db)
+        finally:
+            db.close()
+
+    def _forget_log(self, log_id: str):
+        from .models import vote
+        from .database import SessionLocal
+        db = SessionLocal()
+        try:
+            vote.forget_counter_log(db, log_id)
+        finally:
+            db.close()
+
+    def _recover_now(self):
+        from .database import SessionLocal
+        db = SessionLocal()
+        try:
+            self.recover(db)
+        finally:
+            db.close()
+
+    async def start(self):
+        """Recover crash logs, then buffer and flush in the background; a no-op unless COUNTER_WRITE_BEHIND"""
+        if not settings.COUNTER_WRITE_BEHIND:
+            return
+        await run_in_threadpool(self._recover_now)
+        self._log = CounterLog(settings.COUNTER_LOG_DIR)
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+        self.enabled = True
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), settings.COUNTER_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await run_in_threadpool(self._flush_now)
+            except Exception:
+                logger.exception("Counter flush failed; retrying in %s s", settings.COUNTER_FLUSH_SECONDS)
+
+    async def stop(self):
+        """Stop the flusher and write what is left"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.enabled = False
+        try:
+            await run_in_threadpool(self._flush_now)
+        except Exception:
+            # The log stays behind and the next start replays it
+            logger.exception("Final counter flush failed")
+            return
+        self._log.close()
+        await run_in_threadpool(self._forget_log, self._log.log_id)
+        self._log = None
+
+counter_buffer = CounterBuffer()
+
+# Vote transactions stage their deltas in session.info (see vote.adjust_counters); they only count once committed
+
+def _buffer_committed(session):
+    for key, values in session.info.pop("counter_deltas", ()):
+        counter_buffer.add(key, values)
+
+def _drop_rolled_back(session):
+    session.info.pop("counter_deltas", None)
+
+event.listen(Session, "after_commit", _buffer_committed)
+event.listen(Session, "after_rollback", _drop_rolled_back)
@@ -1,24 +1,169 @@
-from sqlalchemy import create_engine
+import math
+import sqlite3
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
+from .cache import cache
 from .config import settings
+from .replicas import Replica, ReplicaSet, mark_flush, mark_writes
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+# Dialect-specific INSERT constructs, which add ON CONFLICT
+UPSERT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+def upsert_insert(db, table):
+    return UPSERT_INSERTS[db.get_bind().dialect.name](table)
+
+def get_async_database_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+def engine_options(url: str, poolclass=QueuePool) -> dict:
+    url = make_url(url)
+    options = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if url.database in (None, "", ":memory:"):
+            # In-memory databases use a single shared connection, not a sized pool
+            return options
+    options.update(
+        poolclass=poolclass,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+    return options
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers proceed while a writer holds the lock; busy_timeout makes
+    # writers wait for the lock instead of failing with "database is locked"
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.execute(f"PRAGMA cache_size={int(settings.SQLITE_CACHE_SIZE)}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT)}")
+    # Off by default in SQLite; the ON DELETE actions of the foreign keys depend on it
+    cursor.execute("PRAGMA foreign_keys=ON")
+    try:
+        cursor.execute("SELECT log10(10)")
+    except sqlite3.OperationalError:
+        # SQLite builds without the math functions; the hot score needs log10
+        dbapi_connection.create_function("log10", 1, math.log10, deterministic=True)
+    cursor.close()
+
+class RoutingSession(Session):
+    """Session on the primary, except while run() has pointed a read-only model function at a replica"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+        if replica is not None and not self._flushing:
+            return replica.bind
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+event.listen(RoutingSession, "do_orm_execute", mark_writes)
+event.listen(RoutingSession, "after_flush", mark_flush)
+
+def create_sync_engine(url: str):
+    created = create_engine(url, **engine_options(url))
+    if created.dialect.name == "sqlite":
+        event.listen(created, "connect", set_sqlite_pragmas)
+    return created
+
+def create_async_database_engine(url: str):
+    try:
+        created = create_async_engine(url, **engine_options(url, AsyncAdaptedQueuePool))
+    except ImportError as exc:
+        raise RuntimeError(f"DATABASE_ASYNC=true requires the async driver for {make_url(url).drivername} ({exc}); see requirements-optional.txt")
+    if created.dialect.name == "sqlite":
+        event.listen(created.sync_engine, "connect", set_sqlite_pragmas)
+    return created
 
 # Create SQLAlchemy engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+engine = create_sync_engine(settings.DATABASE_URL)
 
 # Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
+
+# Create async engine and session class when running in async mode
+async_engine = None
+AsyncSessionLocal = None
+if settings.DATABASE_ASYNC:
+    async_database_url = settings.ASYNC_DATABASE_URL or get_async_database_url(settings.DATABASE_URL)
+    async_engine = create_async_database_engine(async_database_url)
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False
+    )
+
+# Read replicas, on the same kind of engine the requests use
+replicas = ReplicaSet(
+    Replica(str(index), create_async_database_engine(get_async_database_url(url)) if settings.DATABASE_ASYNC else create_sync_engine(url))
+    for index, url in enumerate(settings.DATABASE_REPLICA_URLS)
+)
+event.listen(RoutingSession, "after_commit", replicas.remember_writer)
 
 # Create Base class
 Base = declarative_base()
 
-# Dependency to get database session
-def get_db():
+# Dependencies to get a database session
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+get_db = get_async_db if settings.DATABASE_ASYNC else get_sync_db
+
+async def _call(db, fn, *args, **kwargs):
+    if isinstance(db, AsyncSession):
+        # On the event loop, so Redis cache deletes wait for the threadpool
+        async with cache.deferred_invalidations():
+            return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+async def run(db, fn, *args, **kwargs):
+    """Await a model function with either session type.
+
+    Model functions are written against the sync Session API. On an AsyncSession
+    they run through run_sync, so database I/O awaits on the event loop; on a sync
+    Session they run in the threadpool as plain `def` routes would. Read-only
+    ones go to a read replica when replicas.choose() picks one.
+    """
+    replica = replicas.choose(db, fn)
+    if replica is None:
+        return await _call(db, fn, *args, **kwargs)
+    db.info["replica"] = replica
+    try:
+        return await _call(db, fn, *args, **kwargs)
+    except OperationalError:
+        replicas.failed(replica)
+    finally:
+        db.info.pop("replica", None)
+    # The replica is unreachable (or missing tables, for a stale copy); read from the primary instead
+    if isinstance(db, AsyncSession):
+        await db.rollback()
+    else:
+        await run_in_threadpool(db.rollback)
+    return await _call(db, fn, *args, **kwargs)
@@ -0,0 +1,146 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from sqlalchemy import DateTime, column, select, table as table_clause, text
+from .cache import cache
+from .config import settings
+from .database import Base, SessionLocal, engine, UPSERT_INSERTS
+from .pagination import TIMESTAMP
+from .tag_index import tag_index
+from .models import user, tag, question, answer, vote  # noqa: F401  registers every table on Base.metadata
+
+# Dump order; every table comes after the tables its foreign keys point at
+TABLES = ("users", "tags", "questions", "question_tags", "answers", "votes")
+
+# Left out of dumps served over HTTP
+PRIVATE_COLUMNS = {"users": ("email", "hashed_password")}
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def columns(name: str, private: bool = False):
+    hidden = () if private else PRIVATE_COLUMNS.get(name, ())
+    return [column for column in Base.metadata.tables[name].columns if column.name not in hidden]
+
+def iter_batches(db, name: str, private: bool = False):
+    """Rows of a table in primary key order, DUMP_BATCH_SIZE at a time from a server-side cursor"""
+    table = Base.metadata.tables[name]
+    result = db.execute(
+        select(*columns(name, private))
+        .order_by(*table.primary_key.columns)
+        .execution_options(yield_per=settings.DUMP_BATCH_SIZE)
+    )
+    yield from result.mappings().partitions()
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def _dumps(value):
+    return json.dumps(value, default=_json_default, separators=(",", ":"))
+
+def ndjson(db, names, private: bool = False, wrap: bool = True):
+    """NDJSON chunks, one per fetched batch. With wrap, each line is {"table": ..., "row": ...}, as load_ndjson expects"""
+    for name in names:
+        for batch in iter_batches(db, name, private):
+            if wrap:
+                lines = [_dumps({"table": name, "row": dict(row)}) for row in batch]
+            else:
+                lines = [_dumps(dict(row)) for row in batch]
+            yield ("\n".join(lines) + "\n").encode()
+
+def csv_rows(db, name: str, private: bool = False):
+    """CSV chunks of one table, header first; datetimes in ISO 8601 and NULL as an empty field"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in columns(name, private)])
+    for batch in iter_batches(db, name, private):
+        writer.writerows(
+            [value.isoformat() if isinstance(value, (datetime, date)) else value for value in row.values()]
+            for row in batch
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def stream(names, format: str = "ndjson", private: bool = False, wrap: bool = True):
+    """Dump chunks on a session of their own, so the dump can outlive the request's session"""
+    db = SessionLocal()
+    try:
+        if format == "csv":
+            yield from csv_rows(db, names[0], private)
+        else:
+            yield from ndjson(db, names, private, wrap)
+    finally:
+        db.close()
+
+def _parse_row(name: str, row: dict):
+    table = Base.metadata.tables[name]
+    parsed = {}
+    for key, value in row.items():
+        column = table.columns.get(key)
+        if column is None:
+            continue
+        if value is not None and isinstance(column.type, DateTime):
+            value = datetime.fromisoformat(value)
+        parsed[key] = value
+    return parsed
+
+def storage_table(name: str):
+    """The table with datetimes bound the way CURRENT_TIMESTAMP stores them, which keyset cursors compare against"""
+    return table_clause(name, *(
+        column(c.name, TIMESTAMP if isinstance(c.type, DateTime) else c.type)
+        for c in Base.metadata.tables[name].columns
+    ))
+
+def _insert(connection, name: str, rows):
+    # Rows whose key already exists are skipped, so loading the same dump twice is harmless
+    statement = UPSERT_INSERTS[connection.dialect.name](storage_table(name)).on_conflict_do_nothing()
+    return max(connection.execute(statement, rows).rowcount, 0)
+
+def _reset_sequences(connection, names):
+    # Explicit ids do not advance PostgreSQL's serial sequences
+    if connection.dialect.name != "postgresql":
+        return
+    for name in names:
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), COALESCE((SELECT MAX(id) FROM {name}), 0) + 1, false)"
+        ))
+
+def load_ndjson(lines, table: str = None):
+    """Insert the rows of an NDJSON dump in executemany batches of DUMP_BATCH_SIZE, in one transaction.
+
+    Lines are {"table": ..., "row": ...} as written by ndjson(), or bare rows of
+    `table` when it is given. Returns {table: (inserted, skipped)}.
+    """
+    counts = {}
+    pending_name, pending = None, []
+
+    def flush(connection):
+        if pending:
+            inserted = _insert(connection, pending_name, pending)
+            done, skipped = counts.get(pending_name, (0, 0))
+            counts[pending_name] = (done + inserted, skipped + len(pending) - inserted)
+            pending.clear()
+
+    with engine.begin() as connection:
+        for line in lines:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            name, row = (table, record) if table else (record["table"], record["row"])
+            if name not in TABLES:
+                raise ValueError(f"Unknown table {name!r}")
+            # Dumps are written table by table in foreign key order, so flushing on a change keeps that order
+            if name != pending_name or len(pending) >= settings.DUMP_BATCH_SIZE:
+                flush(connection)
+                pending_name = name
+            pending.append(_parse_row(name, row))
+        flush(connection)
+        _reset_sequences(connection, counts)
+    cache.clear()
+    tag_index.expire()
+    return counts
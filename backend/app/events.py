@@ -0,0 +1,305 @@
+import asyncio
+import itertools
+import json
+import logging
+import queue
+import threading
+from collections import Counter, OrderedDict
+from .config import settings
+
+logger = logging.getLogger("stackit.events")
+
+class MemoryBroker:
+    """Delivers events within this process only"""
+
+    def __init__(self):
+        self.deliver = lambda message: None  # Until the first subscriber starts the hub
+
+    def start(self, deliver):
+        self.deliver = deliver
+
+    def publish(self, message: dict):
+        self.deliver(message)
+
+    def close(self):
+        pass
+
+class RedisBroker:
+    """Shares events between worker processes over Redis pub/sub; any client speaking the redis-py API works.
+
+    Every worker listens on one channel from a daemon thread and fans messages
+    out to its own subscribers, including the ones it published. A dropped
+    connection is logged and resubscribed with backoff. Publishes are queued
+    and sent from a second thread, so the write paths never wait on Redis.
+    """
+
+    RECONNECT_INITIAL_SECONDS = 0.5
+    RECONNECT_MAX_SECONDS = 30.0
+    PUBLISH_QUEUE_SIZE = 10000
+
+    def __init__(self, url: str = None, client=None, channel: str = "stackit:events"):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("EVENTS_BROKER=redis requires the redis package")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.channel = channel
+        self._pubsub = None
+        self._closed = threading.Event()
+        self._outgoing = queue.Queue(self.PUBLISH_QUEUE_SIZE)
+        self._publisher = None
+        self._publisher_lock = threading.Lock()
+
+    def start(self, deliver):
+        self._closed.clear()
+        self._thread = threading.Thread(target=self._listen, args=(deliver,), name="events-broker", daemon=True)
+        self._thread.start()
+
+    def _listen(self, deliver):
+        delay = self.RECONNECT_INITIAL_SECONDS
+        while not self._closed.is_set():
+            try:
+                self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                self._pubsub.subscribe(self.channel)
+                delay = self.RECONNECT_INITIAL_SECONDS
+                for message in self._pubsub.listen():
+                    if message["type"] == "message":
+                        deliver(json.loads(message["data"]))
+            except Exception:
+                if self._closed.is_set():
+                    return
+                logger.warning("Events broker lost its Redis subscription; resubscribing in %.1fs", delay, exc_info=True)
+            else:
+                if self._closed.is_set():
+                    return
+                logger.warning("Events broker's Redis subscription ended; resubscribing in %.1fs", delay)
+            try:
+                self._pubsub.close()
+            except Exception:
+                pass
+            # Local heartbeats keep streams open meanwhile; they miss other workers' events until this succeeds
+            self._closed.wait(delay)
+            delay = min(delay * 2, self.RECONNECT_MAX_SECONDS)
+
+    def publish(self, message: dict):
+        """Queue message for the publisher thread; raises queue.Full while Redis is too far behind"""
+        if self._publisher is None:
+            with self._publisher_lock:
+                if self._publisher is None:
+                    self._publisher = threading.Thread(target=self._send, name="events-publisher", daemon=True)
+                    self._publisher.start()
+        self._outgoing.put_nowait(json.dumps(message, separators=(",", ":")))
+
+    def _send(self):
+        while True:
+            data = self._outgoing.get()
+            if data is None:
+                return
+            try:
+                self.client.publish(self.channel, data)
+            except Exception:
+                logger.warning("Events broker could not publish to Redis; event dropped", exc_info=True)
+
+    def close(self):
+        self._closed.set()
+        if self._pubsub is not None:
+            self._pubsub.close()
+        if self._publisher is not None:
+            # Send what is queued before the process exits
+            self._outgoing.put(None)
+            self._publisher.join(timeout=5)
+            self._publisher = None
+
+class Subscription:
+    """One client's bounded queue of pending events, drained by its stream on its own event loop.
+
+    Events published with the same coalesce key replace each other while still
+    pending, so a burst of score changes reaches the client as its latest value.
+    When the queue is full a new event either drops the oldest pending one
+    (policy "oldest"; the client is told how many it missed) or closes the
+    subscription (policy "disconnect"; the client reconnects and refetches).
+    """
+
+    def __init__(self, hub, topics, max_size: int, policy: str, loop):
+        self.hub = hub
+        self.topics = frozenset(topics)
+        self.max_size = max_size
+        self.policy = policy
+        self.loop = loop
+        self.dropped = 0
+        self.closed = False
+        self._pending = OrderedDict()  # coalesce key (or a unique number) -> event
+        self._coalescing = 0
+        self._ready = asyncio.Event()
+        self._sequence = itertools.count()
+
+    def put(self, event: dict, coalesce=None):
+        # Runs on the subscription's loop, scheduled there by the hub
+        if self.closed:
+            return
+        key = ("coalesce", coalesce) if coalesce is not None else next(self._sequence)
+        if key in self._pending:
+            self._pending[key] = event
+            return
+        if len(self._pending) >= self.max_size:
+            if self.policy == "disconnect":
+                self.closed = True
+                self.hub.count("dropped", len(self._pending) + 1)
+                self._pending.clear()
+                self._ready.set()
+                return
+            old_key, _ = self._pending.popitem(last=False)
+            self._coalescing -= isinstance(old_key, tuple)
+            self.dropped += 1
+            self.hub.count("dropped")
+        self._pending[key] = event
+        self._coalescing += coalesce is not None
+        self._ready.set()
+
+    async def next_batch(self, timeout: float, coalesce_seconds: float):
+        """Pending events, oldest first; [] after timeout without any. Waits coalesce_seconds more when some could still merge"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        if self._coalescing and coalesce_seconds > 0 and not self.closed:
+            await asyncio.sleep(coalesce_seconds)
+        batch = list(self._pending.values())
+        if self.dropped:
+            batch.insert(0, {"type": "events.dropped", "count": self.dropped})
+            self.dropped = 0
+        self._pending.clear()
+        self._coalescing = 0
+        self._ready.clear()
+        self.hub.count("delivered", len(batch))
+        return batch
+
+class EventHub:
+    """Per-process publish/subscribe hub; the broker carries events between processes.
+
+    The write paths in models/ publish after they commit, from a threadpool
+    thread or the event loop; each subscriber's queue is only touched on its own
+    loop, through call_soon_threadsafe.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+        self._topics = {}  # topic -> set of subscriptions
+        self._lock = threading.Lock()
+        self._started = False
+        self.counters = Counter()
+
+    def count(self, event: str, n: int = 1):
+        with self._lock:
+            self.counters[event] += n
+
+    def publish(self, topic: str, event: dict, coalesce=None):
+        """Send event to everyone subscribed to topic, in every process; a broker failure is counted, never raised"""
+        self.count("published")
+        try:
+            self.broker.publish({"topic": topic, "event": event, "coalesce": coalesce})
+        except Exception:
+            self.count("errors")
+
+    def _deliver(self, message: dict):
+        with self._lock:
+            subscriptions = list(self._topics.get(message["topic"], ()))
+        coalesce = message.get("coalesce")
+        if isinstance(coalesce, list):
+            coalesce = tuple(coalesce)  # JSON brokers turn tuples into lists
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, message["event"], coalesce)
+            except RuntimeError:
+                # The subscriber's loop is gone
+                self.unsubscribe(subscription)
+
+    def subscribe(self, topics) -> Subscription:
+        """A subscription to topics, read from the running event loop"""
+        subscription = Subscription(
+            self, topics, settings.EVENTS_QUEUE_SIZE, settings.EVENTS_DROP_POLICY, asyncio.get_running_loop()
+        )
+        with self._lock:
+            if not self._started:
+                self.broker.start(self._deliver)
+                self._started = True
+            for topic in subscription.topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+
+    def close(self):
+        with self._lock:
+            # Also when nothing subscribed here: the broker may still be sending this process's publishes
+            self.broker.close()
+            self._started = False
+
+    def stats(self):
+        with self._lock:
+            subscriptions = {s for subscribers in self._topics.values() for s in subscribers}
+            return {
+                "broker": type(self.broker).__name__,
+                "subscriptions": len(subscriptions),
+                "topics": len(self._topics),
+                "events": dict(self.counters),
+            }
+
+def build_broker(name: str):
+    if name == "memory":
+        return MemoryBroker()
+    if name == "redis":
+        return RedisBroker(settings.EVENTS_REDIS_URL, channel=settings.CACHE_KEY_PREFIX + "events")
+    raise ValueError(f"Unknown EVENTS_BROKER {name!r}")
+
+if settings.EVENTS_DROP_POLICY not in ("oldest", "disconnect"):
+    raise ValueError(f"Unknown EVENTS_DROP_POLICY {settings.EVENTS_DROP_POLICY!r}")
+
+hub = EventHub(build_broker(settings.EVENTS_BROKER))
+
+# Topics
+
+def question_topic(question_id: int):
+    return f"question:{question_id}"
+
+def user_topic(user_id: int):
+    return f"user:{user_id}"
+
+# Publishing, called by models/ after their writes commit
+
+def answer_posted(question_id: int, answer_id: int, author_id: int, question_author_id: int = None):
+    event = {"type": "answer", "question_id": question_id, "answer_id": answer_id, "author_id": author_id}
+    hub.publish(question_topic(question_id), event)
+    if question_author_id is not None and question_author_id != author_id:
+        hub.publish(user_topic(question_author_id), event)
+
+def answer_changed(question_id: int, answer_id: int, change: str):
+    hub.publish(question_topic(question_id), {"type": f"answer.{change}", "question_id": question_id, "answer_id": answer_id})
+
+def answer_accepted(question_id: int, answer_id: int, answer_author_id: int = None):
+    event = {"type": "accepted", "question_id": question_id, "answer_id": answer_id}
+    hub.publish(question_topic(question_id), event)
+    if answer_author_id is not None:
+        hub.publish(user_topic(answer_author_id), event)
+
+def score_changed(question_id: int, answer_id: int = None, author_id: int = None, **counters):
+    """New counters of a question (answer_id None) or answer; bursts coalesce to the latest per target"""
+    target = ("answer", answer_id) if answer_id is not None else ("question", question_id)
+    event = {"type": "score", "question_id": question_id, "answer_id": answer_id, **counters}
+    hub.publish(question_topic(question_id), event, coalesce=target)
+    if author_id is not None:
+        hub.publish(user_topic(author_id), event, coalesce=target)
+
+def notifications_changed(user_id: int, unread_count: int):
+    hub.publish(
+        user_topic(user_id), {"type": "notifications", "unread_count": unread_count}, coalesce=("notifications", user_id)
+    )
@@ -0,0 +1,269 @@
+import cProfile
+import logging
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import NullPool
+from starlette.datastructures import MutableHeaders
+from .config import settings
+
+class QueryCounter:
+    """Records every statement executed on an engine while active"""
+
+    def __init__(self, engine):
+        # Async engines emit cursor events on their underlying sync engine
+        self.engine = getattr(engine, "sync_engine", engine)
+        self.statements = []
+        self.parameters = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+        self.parameters.append(None if executemany else parameters)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+def full_scans(connection, statement: str, parameters=None):
+    """Plan lines of a statement that read a whole table instead of seeking an index.
+
+    Uses EXPLAIN QUERY PLAN on SQLite and EXPLAIN on PostgreSQL. An in-order
+    index scan (SCAN ... USING INDEX), as a LIMITed list query does, is not a
+    full scan.
+    """
+    if connection.dialect.name == "sqlite":
+        plan = [row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters or ())]
+        return [
+            line for line in plan
+            if line.startswith("SCAN ") and " USING " not in line and "VIRTUAL TABLE" not in line
+            and line != "SCAN CONSTANT ROW"
+        ]
+    if connection.dialect.name == "postgresql":
+        plan = [row[0] for row in connection.exec_driver_sql("EXPLAIN " + statement, parameters or ())]
+        return [line.strip() for line in plan if "Seq Scan" in line]
+    raise NotImplementedError(f"No plan check for {connection.dialect.name}")
+
+def _explain_engine(engine):
+    """A sync engine on the same database; an async engine's connections can't be used outside its event loop"""
+    if not hasattr(engine, "sync_engine"):
+        return engine
+    # aiosqlite and sqlite3 share a paramstyle, so captured statements replay as they are
+    return create_engine(engine.url.set(drivername=engine.url.get_backend_name()), poolclass=NullPool)
+
+@contextmanager
+def assert_no_full_scans(engine):
+    """Fail if any statement issued in the enclosed block plans a full table scan"""
+    with QueryCounter(engine) as counter:
+        yield counter
+    failures = []
+    explain_engine = _explain_engine(engine)
+    try:
+        with explain_engine.connect() as connection:
+            for statement, parameters in zip(counter.statements, counter.parameters):
+                if statement.lstrip().upper().startswith(("INSERT", "PRAGMA")) or parameters is None:
+                    continue
+                scans = full_scans(connection, statement, parameters)
+                if scans:
+                    failures.append(f"  {statement}\n    " + "\n    ".join(scans))
+    finally:
+        if explain_engine is not engine:
+            explain_engine.dispose()
+    if failures:
+        raise AssertionError("Full table scans:\n" + "\n".join(failures))
+
+@contextmanager
+def assert_max_queries(engine, expected: int):
+    """Fail if the enclosed block issues more than `expected` statements, e.g. an N+1 regression"""
+    with QueryCounter(engine) as counter:
+        yield counter
+    if counter.count > expected:
+        listing = "\n".join(f"  {i}. {statement}" for i, statement in enumerate(counter.statements, 1))
+        raise AssertionError(f"Expected at most {expected} queries, got {counter.count}:\n{listing}")
+
+# Request metrics
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger("stackit.sql")
+
+class RequestStats:
+    """SQL work attributed to one request by the engine hooks"""
+
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+# Threadpool and run_sync hops copy the context, so hooks mutate the same RequestStats object
+_current_request = ContextVar("stackit_request_stats", default=None)
+
+class Metrics:
+    """In-process counters and latency histograms, rendered in the Prometheus text format"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._requests = defaultdict(int)  # (method, route, status) -> count
+        self._latency = defaultdict(lambda: [0] * (len(buckets) + 1))  # (method, route) -> bucket counts, last is +Inf
+        self._latency_sum = defaultdict(float)
+        self._queries = defaultdict(int)  # (method, route) -> statements
+        self._db_seconds = defaultdict(float)
+        self.slow_queries = 0
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route)
+        with self._lock:
+            self._requests[(method, route, status)] += 1
+            self._latency[key][bisect_left(self.buckets, seconds)] += 1
+            self._latency_sum[key] += seconds
+            self._queries[key] += stats.queries
+            self._db_seconds[key] += stats.db_seconds
+
+    def count_slow_query(self):
+        with self._lock:
+            self.slow_queries += 1
+
+    def render(self, extra=()) -> str:
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            family("stackit_http_requests_total", "counter", "HTTP requests by route template and status")
+            for (method, route, status), count in sorted(self._requests.items()):
+                lines.append(f'stackit_http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+
+            family("stackit_http_request_duration_seconds", "histogram", "Time from request start to the end of the response body")
+            for (method, route), counts in sorted(self._latency.items()):
+                labels = f'method="{method}",route="{route}"'
+                cumulative = 0
+                for bound, count in zip((*self.buckets, "+Inf"), counts):
+                    cumulative += count
+                    lines.append(f'stackit_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"stackit_http_request_duration_seconds_sum{{{labels}}} {self._latency_sum[(method, route)]}")
+                lines.append(f"stackit_http_request_duration_seconds_count{{{labels}}} {cumulative}")
+
+            family("stackit_db_queries_total", "counter", "SQL statements executed while serving each route")
+            for (method, route), count in sorted(self._queries.items()):
+                lines.append(f'stackit_db_queries_total{{method="{method}",route="{route}"}} {count}')
+
+            family("stackit_db_query_duration_seconds_total", "counter", "Time spent in SQL statements while serving each route")
+            for (method, route), seconds in sorted(self._db_seconds.items()):
+                lines.append(f'stackit_db_query_duration_seconds_total{{method="{method}",route="{route}"}} {seconds}')
+
+            family("stackit_db_slow_queries_total", "counter", "SQL statements slower than SLOW_QUERY_MS")
+            lines.append(f"stackit_db_slow_queries_total {self.slow_queries}")
+
+        for name, kind, help_text, samples in extra:
+            family(name, kind, help_text)
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+# The start time lives on the statement's execution context rather than the connection,
+# so a statement that raises (and never reaches after_cursor_execute) leaves nothing behind
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._stackit_query_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._stackit_query_start
+    stats = _current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    if 0 < settings.SLOW_QUERY_MS <= elapsed * 1000:
+        metrics.count_slow_query()
+        logger.warning("Slow query (%.1f ms): %s; parameters: %.500r", elapsed * 1000, statement, parameters)
+
+def instrument_engine(engine):
+    """Attribute every statement's count and time to the current request, and log slow ones"""
+    engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+class _Profiler:
+    """cProfile of a sampled request, dumped to PROFILE_DIR; one at a time, since profiles of concurrent requests would mix"""
+
+    _lock = threading.Lock()
+
+    @classmethod
+    def start(cls):
+        if settings.PROFILE_SAMPLE_RATE <= 0 or random.random() >= settings.PROFILE_SAMPLE_RATE:
+            return None
+        if not cls._lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    @classmethod
+    def stop(cls, profile, method: str, route: str, seconds: float):
+        profile.disable()
+        cls._lock.release()
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{method}{route}").strip("_")
+        profile.dump_stats(os.path.join(settings.PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{seconds * 1000:.0f}ms.prof"))
+
+class InstrumentationMiddleware:
+    """Times every request, counts its SQL statements, adds a Server-Timing header and records the metrics.
+
+    Plain ASGI rather than BaseHTTPMiddleware, so streamed responses pass
+    through untouched and the context variable reaches the endpoint.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        start = time.perf_counter()
+        status = 500
+        profile = _Profiler.start()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.SERVER_TIMING:
+                    elapsed = (time.perf_counter() - start) * 1000
+                    MutableHeaders(scope=message).append(
+                        "Server-Timing",
+                        f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries", app;dur={elapsed:.1f}'
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            seconds = time.perf_counter() - start
+            _current_request.reset(token)
+            route = scope.get("route")
+            # Route templates keep the label set bounded; anything unrouted shares one label
+            template = getattr(route, "path", None) or "unmatched"
+            metrics.observe(scope["method"], template, status, seconds, stats)
+            if profile is not None:
+                _Profiler.stop(profile, scope["method"], template, seconds)
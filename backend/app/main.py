@@ -1,15 +1,48 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .api import questions, answers, users, votes, tags
-from .database import engine, Base
+from fastapi.responses import JSONResponse, PlainTextResponse
+from .api import questions, answers, users, votes, tags, search, export, events
+from .database import engine, async_engine, replicas
+from .migrations import upgrade_database
+from .models.search import init_search_index
+from .models.tag import load_tag_index
+from .pagination import InvalidCursor
+from .models.user import UnknownUser
+from .security import check_secret_key, shutdown_executor
+from .cache import cache
+from .events import hub
+from .outbox import worker as outbox_worker
+from .counter_buffer import counter_buffer
+from .config import settings
+from .instrumentation import InstrumentationMiddleware, instrument_engine, metrics
+from .replicas import ReaderMiddleware
+from .serialization import DefaultResponse
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Tokens signed with the placeholder key could be forged by anyone
+check_secret_key()
+
+# Create or migrate database tables
+upgrade_database(engine)
+
+# Create full-text search index
+init_search_index(engine)
+
+# Load tag names and usage counts for suggestions
+with engine.connect() as connection:
+    load_tag_index(connection)
+
+# Count and time SQL per request, and log slow statements
+instrument_engine(engine)
+if async_engine is not None:
+    instrument_engine(async_engine)
+for replica in replicas.replicas:
+    instrument_engine(replica.engine)
 
 app = FastAPI(
     title="StackIt API",
     description="A Stack Overflow-like Q&A platform API",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=DefaultResponse
 )
 
 # Configure CORS
@@ -20,6 +53,43 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(InstrumentationMiddleware)
+app.add_middleware(ReaderMiddleware)
+
+@app.exception_handler(InvalidCursor)
+def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.exception_handler(UnknownUser)
+def unknown_user_handler(request: Request, exc: UnknownUser):
+    return JSONResponse(
+        status_code=401, content={"detail": "User no longer exists"}, headers={"WWW-Authenticate": "Bearer"}
+    )
+
+@app.on_event("startup")
+async def start_outbox_worker():
+    if settings.NOTIFICATIONS_WORKER:
+        outbox_worker.start()
+
+@app.on_event("startup")
+async def start_counter_buffer():
+    await counter_buffer.start()
+
+@app.on_event("startup")
+async def start_replica_checks():
+    replicas.start()
+
+@app.on_event("shutdown")
+async def close_connection_pools():
+    await outbox_worker.stop()
+    # Flushes what is still buffered, so it goes before the pools close
+    await counter_buffer.stop()
+    await replicas.stop()
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
+    shutdown_executor()
+    hub.close()
 
 # Include routers
 app.include_router(questions.router, prefix="/api/v1")
@@ -27,11 +97,69 @@ app.include_router(answers.router, prefix="/api/v1")
 app.include_router(users.router, prefix="/api/v1")
 app.include_router(votes.router, prefix="/api/v1")
 app.include_router(tags.router, prefix="/api/v1")
+app.include_router(search.router, prefix="/api/v1")
+app.include_router(export.router, prefix="/api/v1")
+app.include_router(events.router, prefix="/api/v1")
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Welcome to StackIt API"}
 
 @app.get("/health")
-def health_check():
-    return {"status": "healthy"} 
\ No newline at end of file
+async def health_check():
+    return {"status": "healthy"}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return cache.stats()
+
+def _runtime_metrics():
+    namespaces = cache.stats()["namespaces"]
+    yield (
+        "stackit_cache_events_total", "counter", "Response cache lookups and invalidations by key namespace",
+        [
+            ({"namespace": namespace, "event": event}, values[event])
+            for namespace, values in sorted(namespaces.items())
+            for event in ("hits", "misses", "invalidations", "errors")
+        ]
+    )
+    events = hub.stats()
+    yield (
+        "stackit_event_subscriptions", "gauge", "Open event streams in this process",
+        [({}, events["subscriptions"])]
+    )
+    yield (
+        "stackit_events_total", "counter", "Events published and delivered by this process, and dropped from full queues",
+        [({"event": event}, events["events"].get(event, 0)) for event in ("published", "delivered", "dropped", "errors")]
+    )
+    counters = counter_buffer.stats()
+    if counters["enabled"]:
+        yield (
+            "stackit_counter_pending", "gauge", "Posts with vote or view deltas buffered in this process",
+            [({}, counters["pending"])]
+        )
+        yield (
+            "stackit_counter_flushes_total", "counter", "Write-behind counter flushes by outcome",
+            [({"outcome": "ok"}, counters["flushes"]), ({"outcome": "error"}, counters["failures"])]
+        )
+    routing = replicas.stats()
+    if routing["replicas"]:
+        yield (
+            "stackit_db_replica_up", "gauge", "Whether each read replica passed its last health check",
+            [({"replica": name}, int(healthy)) for name, healthy in routing["replicas"].items()]
+        )
+        yield (
+            "stackit_db_reads_total", "counter", "Read-only model calls by where they ran: replica, primary (read-your-writes) or fallback",
+            [({"target": target}, routing["reads"].get(target, 0)) for target in ("replica", "primary", "fallback")]
+        )
+    pool = engine.pool
+    if hasattr(pool, "checkedout"):
+        yield (
+            "stackit_db_pool_connections", "gauge", "Connections of the sync engine's pool by state",
+            [({"state": "checked_out"}, pool.checkedout()), ({"state": "idle"}, pool.checkedin())]
+        )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Request, SQL, cache and pool metrics in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(extra=_runtime_metrics()), media_type="text/plain; version=0.0.4") 
\ No newline at end of file
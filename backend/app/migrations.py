@@ -0,0 +1,43 @@
+import os
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Revision matching the schema create_all produced before migrations were introduced
+BASELINE_REVISION = "0001"
+
+def alembic_config() -> Config:
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "migrations"))
+    # Leave the application's logging configuration alone
+    config.attributes["configure_logger"] = False
+    return config
+
+def upgrade_database(engine):
+    """Migrate the database to the latest revision.
+
+    Databases created by create_all before migrations existed have tables but no
+    alembic_version; they are stamped at the baseline first so the later
+    revisions apply on top of them.
+    """
+    config = alembic_config()
+    with engine.connect() as connection:
+        sqlite = connection.dialect.name == "sqlite"
+        if sqlite:
+            # Rebuilding a table drops the old one, which with enforced foreign keys
+            # would cascade into its children; the pragma only applies outside a transaction
+            connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            connection.commit()
+        try:
+            with connection.begin():
+                config.attributes["connection"] = connection
+                tables = inspect(connection).get_table_names()
+                if "users" in tables and "alembic_version" not in tables:
+                    command.stamp(config, BASELINE_REVISION)
+                command.upgrade(config, "head")
+        finally:
+            if sqlite:
+                connection.exec_driver_sql("PRAGMA foreign_keys=ON")
+                connection.commit()
@@ -1,7 +1,16 @@
-from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey, Boolean, Index, delete, update, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import event
+from sqlalchemy.orm import relationship, joinedload
 from sqlalchemy.sql import func
 from ..database import Base
+from ..cache import invalidate_questions, invalidate_answer_lists
+from .. import events
+from ..counter_buffer import counter_buffer
+from ..pagination import paginate
+from .question import Question, hot_score_after
+from .notification import enqueue as enqueue_notification, forget_unread
+from .user import ensure_user
 from ..schemas import answer as answer_schema
 
 class Answer(Base):
@@ -9,64 +18,201 @@ class Answer(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text)
-    question_id = Column(Integer, ForeignKey("questions.id"))
-    author_id = Column(Integer, ForeignKey("users.id"))
+    question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"))
+    author_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
     is_accepted = Column(Boolean, default=False)
+    score = Column(Integer, default=0, server_default="0", nullable=False)
+    upvote_count = Column(Integer, default=0, server_default="0", nullable=False)
+    downvote_count = Column(Integer, default=0, server_default="0", nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
     question = relationship("Question", back_populates="answers")
     author = relationship("User", back_populates="answers")
-    votes = relationship("Vote", back_populates="answer", cascade="all, delete-orphan")
+    votes = relationship("Vote", back_populates="answer", cascade="all, delete-orphan", passive_deletes=True)
 
-def get_answers(db, skip: int = 0, limit: int = 100):
-    return db.query(Answer).offset(skip).limit(limit).all()
+    # Keyset pagination indexes
+    __table_args__ = (
+        Index("ix_answers_created_at_id", "created_at", "id"),
+        Index("ix_answers_question_id_created_at_id", "question_id", "created_at", "id"),
+        Index("ix_answers_author_id_created_at_id", "author_id", "created_at", "id"),
+    )
+
+KEYSET = (Answer.created_at, Answer.id)
+
+event.listen(Answer, "load", counter_buffer.merge_loaded)
+event.listen(Answer, "refresh", counter_buffer.merge_loaded)
+
+def load_options():
+    # Load everything the Answer schema serializes up front instead of lazily per row
+    return (joinedload(Answer.author),)
+
+def version(a):
+    """Fingerprint of everything the Answer schema serializes, for ETags"""
+    return (
+        a.id, a.created_at, a.updated_at, a.score, a.upvote_count, a.downvote_count, a.is_accepted,
+        a.author.updated_at if a.author else None
+    )
+
+def get_answer_version(db, answer_id: int):
+    from .user import User
+    row = db.execute(
+        select(
+            Answer.created_at, Answer.updated_at, Answer.score, Answer.upvote_count, Answer.downvote_count,
+            Answer.is_accepted, User.updated_at
+        )
+        .outerjoin(User, User.id == Answer.author_id)
+        .where(Answer.id == answer_id)
+    ).first()
+    return (*row, *counter_buffer.votes_version("answers", answer_id)) if row else None
+
+def get_answers_by_question_version(db, question_id: int):
+    """Fingerprint of a question's answers, one row per answer; any insert, delete, edit, vote or accept changes it.
+
+    Per-answer counters rather than sums over the question, so a vote moved
+    from one answer to another changes it too.
+    """
+    from .user import User
+    rows = db.execute(
+        select(
+            Answer.id, Answer.created_at, Answer.updated_at, Answer.upvote_count, Answer.downvote_count,
+            Answer.is_accepted, User.updated_at
+        )
+        .outerjoin(User, User.id == Answer.author_id)
+        .where(Answer.question_id == question_id)
+        .order_by(Answer.id)
+    ).all()
+    version = tuple(tuple(row) for row in rows)
+    # Buffered answer votes are not in the counters yet
+    return (*version, counter_buffer.answer_generation) if counter_buffer.enabled else version
+
+def _adjust_answer_count(db, question_id: int, delta: int):
+    """Move the question's answer count; returns (author_id,) of the question, or None if it does not exist"""
+    return db.execute(
+        update(Question)
+        .where(Question.id == question_id)
+        .values(
+            answer_count=Question.answer_count + delta,
+            hot_score=hot_score_after(answer_delta=delta),
+            last_activity_at=func.now(),
+            # Activity on the question, not an edit of it
+            updated_at=Question.updated_at
+        )
+        .returning(Question.author_id)
+    ).first()
+
+def get_answers(db, skip: int = 0, limit: int = 100, cursor: str = None):
+    return paginate(db.query(Answer).options(*load_options()), KEYSET, cursor, skip, limit)
 
 def get_answer(db, answer_id: int):
-    return db.query(Answer).filter(Answer.id == answer_id).first()
+    return db.query(Answer).options(*load_options()).filter(Answer.id == answer_id).first()
 
 def create_answer(db, answer: answer_schema.AnswerCreate):
+    """Insert an answer, count it on its question and queue its notifications; None if the question does not exist"""
     db_answer = Answer(
         content=answer.content,
         question_id=answer.question_id,
         author_id=answer.author_id
     )
     db.add(db_answer)
+    question = _adjust_answer_count(db, answer.question_id, 1)
+    try:
+        db.flush()
+    except IntegrityError:
+        # Either the question or the author is gone
+        db.rollback()
+        ensure_user(db, answer.author_id)
+        return None
+    answer_id = db_answer.id
+    enqueue_notification(
+        db, "answer", answer.question_id, answer_id, actor_id=answer.author_id,
+        recipient_id=question.author_id, text=answer.content
+    )
     db.commit()
-    db.refresh(db_answer)
-    return db_answer
+    invalidate_questions(answer.question_id)
+    invalidate_answer_lists(answer.question_id)
+    events.answer_posted(answer.question_id, answer_id, answer.author_id, question.author_id if question else None)
+    # Reload with the relationships the schema serializes
+    return get_answer(db, answer_id)
 
-def update_answer(db, answer_id: int, answer: answer_schema.AnswerUpdate):
-    db_answer = get_answer(db, answer_id)
-    if db_answer:
-        update_data = answer.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_answer, field, value)
-        
-        db.commit()
-        db.refresh(db_answer)
-    return db_answer
+def get_answer_owner(db, answer_id: int):
+    """(author_id,) of an answer, or None if it does not exist; tells 404 from 403 after a write matched nothing"""
+    return db.execute(select(Answer.author_id).where(Answer.id == answer_id)).first()
 
-def delete_answer(db, answer_id: int):
-    db_answer = get_answer(db, answer_id)
-    if db_answer:
-        db.delete(db_answer)
-        db.commit()
-    return db_answer
+def _owned(answer_id: int, author_id: int = None):
+    condition = Answer.id == answer_id
+    return condition if author_id is None else condition & (Answer.author_id == author_id)
+
+def update_answer(db, answer_id: int, answer: answer_schema.AnswerUpdate, author_id: int = None):
+    """Apply the changes in one UPDATE ... RETURNING; None if no answer matched, or it is not author_id's"""
+    # An empty edit still has to match the row, without touching updated_at
+    values = answer.dict(exclude_unset=True) or {"updated_at": Answer.updated_at}
+    updated = db.execute(
+        update(Answer)
+        .where(_owned(answer_id, author_id))
+        .values(**values)
+        .returning(Answer.question_id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if updated is None:
+        db.rollback()
+        return None
+    db.execute(
+        update(Question)
+        .where(Question.id == updated.question_id)
+        .values(last_activity_at=func.now(), updated_at=Question.updated_at)
+    )
+    db.commit()
+    invalidate_questions(updated.question_id)
+    invalidate_answer_lists(updated.question_id)
+    events.answer_changed(updated.question_id, answer_id, "updated")
+    # Reload with the relationships the schema serializes
+    return get_answer(db, answer_id)
+
+def delete_answer(db, answer_id: int, author_id: int = None):
+    """One DELETE ... RETURNING; the foreign keys cascade to the answer's votes and notifications. None if nothing matched"""
+    # Rolled back with the rest when nothing is deleted
+    unread = forget_unread(db, answer_id=answer_id)
+    deleted = db.execute(
+        delete(Answer)
+        .where(_owned(answer_id, author_id))
+        .returning(Answer.question_id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if deleted is None:
+        db.rollback()
+        return None
+    _adjust_answer_count(db, deleted.question_id, -1)
+    db.commit()
+    invalidate_questions(deleted.question_id)
+    invalidate_answer_lists(deleted.question_id)
+    events.answer_changed(deleted.question_id, answer_id, "deleted")
+    for user_id, count in unread:
+        events.notifications_changed(user_id, count)
+    return deleted
 
-def get_answers_by_question(db, question_id: int, skip: int = 0, limit: int = 100):
-    return db.query(Answer).filter(Answer.question_id == question_id).offset(skip).limit(limit).all()
+def get_answers_by_question(db, question_id: int, skip: int = 0, limit: int = 100, cursor: str = None):
+    return paginate(db.query(Answer).options(*load_options()).filter(Answer.question_id == question_id), KEYSET, cursor, skip, limit)
 
-def get_answers_by_author(db, author_id: int, skip: int = 0, limit: int = 100):
-    return db.query(Answer).filter(Answer.author_id == author_id).offset(skip).limit(limit).all()
+def get_answers_by_author(db, author_id: int, skip: int = 0, limit: int = 100, cursor: str = None):
+    return paginate(db.query(Answer).options(*load_options()).filter(Answer.author_id == author_id), KEYSET, cursor, skip, limit)
 
 def accept_answer(db, answer_id: int):
     db_answer = get_answer(db, answer_id)
-    if db_answer:
+    # Accepting again is a no-op: no second notification or event
+    if db_answer and not db_answer.is_accepted:
         db_answer.is_accepted = True
         # Mark the question as answered
         db_answer.question.is_answered = True
+        db_answer.question.last_activity_at = func.now()
+        enqueue_notification(
+            db, "accepted", db_answer.question_id, answer_id, actor_id=db_answer.question.author_id,
+            recipient_id=db_answer.author_id
+        )
         db.commit()
-        db.refresh(db_answer)
+        invalidate_questions(db_answer.question_id)
+        invalidate_answer_lists(db_answer.question_id)
+        events.answer_accepted(db_answer.question_id, answer_id, db_answer.author_id)
+        db_answer = get_answer(db, answer_id)
     return db_answer 
\ No newline at end of file
@@ -0,0 +1,189 @@
+import re
+from collections import Counter
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, JSON, delete, false, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import func
+from ..database import Base, upsert_insert
+from ..pagination import paginate
+from .. import events
+
+# @username in answer text; a trailing dot ends the sentence, not the name
+MENTION = re.compile(r"(?<![\w@])@([\w.-]*\w)")
+
+class Notification(Base):
+    __tablename__ = "notifications"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String, nullable=False)  # answer, accepted or mention
+    question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), nullable=False)
+    answer_id = Column(Integer, ForeignKey("answers.id", ondelete="CASCADE"))
+    actor_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
+    is_read = Column(Boolean, default=False, server_default=false(), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Keyset pagination index, which also serves marking a user's notifications read
+    __table_args__ = (
+        Index("ix_notifications_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_notifications_question_id", "question_id"),
+        Index("ix_notifications_answer_id", "answer_id"),
+    )
+
+KEYSET = (Notification.created_at, Notification.id)
+
+class NotificationOutbox(Base):
+    """Notification events written in the same transaction as the answer or accept that caused them.
+
+    deliver_notifications() turns them into notifications in batches and deletes
+    them; deleting the question, answer or recipient first cascades them away.
+    """
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), nullable=False)
+    answer_id = Column(Integer, ForeignKey("answers.id", ondelete="CASCADE"))
+    actor_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
+    recipient_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    mentions = Column(JSON)  # Usernames mentioned in the text, resolved at delivery
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class NotificationCounter(Base):
+    """Unread notifications per user, kept by delivery and mark-read so the count is one primary key lookup"""
+    __tablename__ = "notification_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    unread_count = Column(Integer, default=0, server_default="0", nullable=False)
+
+def enqueue(db, kind: str, question_id: int, answer_id: int = None, actor_id: int = None, recipient_id: int = None, text: str = None):
+    """Add an event to the outbox in the caller's transaction; a no-op when nobody besides the actor would hear of it"""
+    mentions = sorted(set(MENTION.findall(text))) if text else []
+    if recipient_id == actor_id:
+        recipient_id = None
+    if recipient_id is None and not mentions:
+        return
+    db.execute(insert(NotificationOutbox).values(
+        kind=kind, question_id=question_id, answer_id=answer_id, actor_id=actor_id,
+        recipient_id=recipient_id, mentions=mentions or None
+    ))
+
+def deliver_notifications(db, limit: int = 500) -> int:
+    """Fan the oldest outbox events out to notifications and unread counters in one transaction.
+
+    The batch is claimed with a DELETE ... RETURNING, so workers running side by
+    side never deliver an event twice. Returns how many events were taken.
+    """
+    oldest = select(NotificationOutbox.id).order_by(NotificationOutbox.id).limit(limit)
+    claimed = db.execute(
+        delete(NotificationOutbox)
+        .where(NotificationOutbox.id.in_(oldest))
+        .returning(*NotificationOutbox.__table__.columns)
+        .execution_options(synchronize_session=False)
+    ).mappings().all()
+    if not claimed:
+        db.rollback()
+        return 0
+
+    from .user import User
+    names = {name for event in claimed for name in event["mentions"] or ()}
+    user_ids = dict(db.execute(select(User.username, User.id).where(User.username.in_(names))).all()) if names else {}
+    rows = []
+    for event in sorted(claimed, key=lambda event: event["id"]):
+        recipients = [(event["recipient_id"], event["kind"])]
+        recipients += [(user_ids.get(name), "mention") for name in event["mentions"] or ()]
+        notified = {None, event["actor_id"]}
+        for user_id, kind in recipients:
+            if user_id not in notified:
+                notified.add(user_id)
+                rows.append({
+                    "user_id": user_id, "kind": kind, "question_id": event["question_id"],
+                    "answer_id": event["answer_id"], "actor_id": event["actor_id"]
+                })
+
+    unread = Counter(row["user_id"] for row in rows)
+    try:
+        if rows:
+            db.execute(insert(Notification), rows)
+            counters = upsert_insert(db, NotificationCounter)
+            db.execute(
+                counters.on_conflict_do_update(
+                    index_elements=[NotificationCounter.user_id],
+                    set_={"unread_count": NotificationCounter.unread_count + counters.excluded.unread_count}
+                ),
+                [{"user_id": user_id, "unread_count": count} for user_id, count in unread.items()]
+            )
+        db.commit()
+    except IntegrityError:
+        # A post or user was deleted after the claim; the rollback returns the batch to the outbox, minus them
+        db.rollback()
+        raise
+    if unread:
+        for user_id, count in db.execute(
+            select(NotificationCounter.user_id, NotificationCounter.unread_count)
+            .where(NotificationCounter.user_id.in_(unread))
+        ).tuples():
+            events.notifications_changed(user_id, count)
+    return len(claimed)
+
+def get_notifications(db, user_id: int, skip: int = 0, limit: int = 100, cursor: str = None, unread: bool = False):
+    query = db.query(Notification).filter(Notification.user_id == user_id)
+    if unread:
+        query = query.filter(Notification.is_read == false())
+    return paginate(query, KEYSET, cursor, skip, limit)
+
+def get_unread_count(db, user_id: int) -> int:
+    return db.scalar(select(NotificationCounter.unread_count).where(NotificationCounter.user_id == user_id)) or 0
+
+def forget_unread(db, question_id: int = None, answer_id: int = None):
+    """Take the unread notifications about a question or answer off their recipients' counters.
+
+    Call in the transaction that deletes the post, before the foreign keys cascade
+    the notifications away. Returns (user_id, unread_count) for each counter changed.
+    """
+    about = Notification.answer_id == answer_id if answer_id is not None else Notification.question_id == question_id
+    unread = about & (Notification.is_read == false())
+    forgotten = (
+        select(func.count()).select_from(Notification)
+        .where(unread, Notification.user_id == NotificationCounter.user_id)
+        .scalar_subquery()
+    )
+    return db.execute(
+        update(NotificationCounter)
+        .where(NotificationCounter.user_id.in_(select(Notification.user_id).where(unread)))
+        .values(unread_count=NotificationCounter.unread_count - forgotten)
+        .returning(NotificationCounter.user_id, NotificationCounter.unread_count)
+        .execution_options(synchronize_session=False)
+    ).tuples().all()
+
+def mark_notifications_read(db, user_id: int, up_to_id: int = None) -> int:
+    """Mark the user's unread notifications read, all or those up to up_to_id, and take them off the counter; returns the new unread count"""
+    unread_of_user = (Notification.user_id == user_id) & (Notification.is_read == false())
+    condition = unread_of_user
+    if up_to_id is not None:
+        condition &= Notification.id <= up_to_id
+    marked = db.execute(
+        update(Notification).where(condition).values(is_read=True).execution_options(synchronize_session=False)
+    ).rowcount
+    if not marked:
+        # Nothing was marked; recount in case the counter drifted from the table
+        unread = db.execute(
+            update(NotificationCounter)
+            .where(NotificationCounter.user_id == user_id, NotificationCounter.unread_count != 0)
+            .values(unread_count=select(func.count()).select_from(Notification).where(unread_of_user).scalar_subquery())
+            .returning(NotificationCounter.unread_count)
+        ).scalar()
+        if unread is None:
+            db.rollback()
+            return get_unread_count(db, user_id)
+        db.commit()
+        events.notifications_changed(user_id, unread)
+        return unread
+    unread = db.execute(
+        update(NotificationCounter)
+        .where(NotificationCounter.user_id == user_id)
+        .values(unread_count=NotificationCounter.unread_count - marked)
+        .returning(NotificationCounter.unread_count)
+    ).scalar()
+    db.commit()
+    events.notifications_changed(user_id, unread or 0)
+    return unread or 0
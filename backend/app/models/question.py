@@ -1,8 +1,19 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
-from sqlalchemy.orm import relationship
+import math
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, Float, String, Text, DateTime, ForeignKey, Boolean, Index, bindparam, case, delete, select, update, or_
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import relationship, joinedload, selectinload
 from sqlalchemy.sql import func
+from ..config import settings
 from ..database import Base
+from ..cache import invalidate_questions, invalidate_answer_lists, invalidate_tags
+from .. import events
+from ..counter_buffer import counter_buffer
+from ..pagination import paginate
 from ..schemas import question as question_schema
+from ..schemas import tag as tag_schema
+from ..tag_index import tag_index
 
 class Question(Base):
     __tablename__ = "questions"
@@ -10,56 +21,267 @@ class Question(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     content = Column(Text)
-    author_id = Column(Integer, ForeignKey("users.id"))
+    author_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
     is_answered = Column(Boolean, default=False)
+    score = Column(Integer, default=0, server_default="0", nullable=False)
+    upvote_count = Column(Integer, default=0, server_default="0", nullable=False)
+    downvote_count = Column(Integer, default=0, server_default="0", nullable=False)
+    answer_count = Column(Integer, default=0, server_default="0", nullable=False)
+    view_count = Column(Integer, default=0, server_default="0", nullable=False)
+    # Feed rankings, maintained by the write paths so each feed is an index range read
+    hot_score = Column(Float, default=0.0, server_default="0", nullable=False)
+    last_activity_at = Column(DateTime(timezone=True), default=func.now())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
-    # Relationships
+    # Relationships; the foreign keys' ON DELETE CASCADE removes the children, so the ORM never loads them to delete
     author = relationship("User", back_populates="questions")
-    answers = relationship("Answer", back_populates="question", cascade="all, delete-orphan")
-    votes = relationship("Vote", back_populates="question", cascade="all, delete-orphan")
-    question_tags = relationship("QuestionTag", back_populates="question", cascade="all, delete-orphan")
+    answers = relationship("Answer", back_populates="question", cascade="all, delete-orphan", passive_deletes=True)
+    votes = relationship("Vote", back_populates="question", cascade="all, delete-orphan", passive_deletes=True)
+    question_tags = relationship("QuestionTag", back_populates="question", cascade="all, delete-orphan", passive_deletes=True)
+    tags = relationship("Tag", secondary="question_tags", viewonly=True)
 
-def get_questions(db, skip: int = 0, limit: int = 100):
-    return db.query(Question).offset(skip).limit(limit).all()
+    # Keyset pagination indexes
+    __table_args__ = (
+        Index("ix_questions_created_at_id", "created_at", "id"),
+        Index("ix_questions_author_id_created_at_id", "author_id", "created_at", "id"),
+        Index("ix_questions_hot_score_id", "hot_score", "id"),
+        Index("ix_questions_last_activity_at_id", "last_activity_at", "id"),
+        Index("ix_questions_is_answered_created_at_id", "is_answered", "created_at", "id"),
+    )
+
+KEYSET = (Question.created_at, Question.id)
+
+# Loaded questions include this process's buffered counter deltas
+event.listen(Question, "load", counter_buffer.merge_loaded)
+event.listen(Question, "refresh", counter_buffer.merge_loaded)
+
+# Feed name -> (keyset columns, filter)
+FEEDS = {
+    "newest": (KEYSET, None),
+    "active": ((Question.last_activity_at, Question.id), None),
+    "hot": ((Question.hot_score, Question.id), None),
+    "unanswered": (KEYSET, Question.is_answered.is_(False)),
+}
+
+def feed_keys(sort: str):
+    """Attribute names the cursor of a feed is built from"""
+    return tuple(column.key for column in FEEDS[sort][0])
+
+# Hot score: sign(s) * log10(|s|) + created_at / HOT_SCORE_DECAY_SECONDS, where s is the
+# score plus weighted answers. The time term is fixed at creation, so votes and answers
+# only shift the log term and the column can be updated in place, relative to itself.
+
+def _hot_signal(score, answer_count):
+    return score + settings.HOT_SCORE_ANSWER_WEIGHT * answer_count
+
+def hot_score(score: int, answer_count: int, created_at: datetime) -> float:
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    signal = _hot_signal(score, answer_count)
+    order = math.log10(abs(signal)) if abs(signal) > 1 else 0.0
+    return math.copysign(order, signal) + created_at.timestamp() / settings.HOT_SCORE_DECAY_SECONDS
+
+def _hot_order(signal):
+    return case((signal > 1, func.log10(signal)), (signal < -1, -func.log10(-signal)), else_=0.0)
+
+def hot_score_after(score_delta=0, answer_delta=0):
+    """SET expression for hot_score in an UPDATE that shifts score and answer_count by these deltas.
+
+    Column references in a SET clause read the row before the update, so this
+    subtracts the old log term and adds the new one in the same statement.
+    """
+    old = _hot_signal(Question.score, Question.answer_count)
+    new = _hot_signal(Question.score + score_delta, Question.answer_count + answer_delta)
+    return Question.hot_score - _hot_order(old) + _hot_order(new)
+
+def refresh_hot_scores(db):
+    """Recompute every hot score from scratch, e.g. after HOT_SCORE_* settings change"""
+    rows = db.execute(select(Question.id, Question.score, Question.answer_count, Question.created_at)).all()
+    if rows:
+        table = Question.__table__
+        db.execute(
+            update(table)
+            .where(table.c.id == bindparam("question_id"))
+            .values(hot_score=bindparam("hot"), updated_at=table.c.updated_at),
+            [{"question_id": r.id, "hot": hot_score(r.score, r.answer_count, r.created_at)} for r in rows]
+        )
+
+def load_options():
+    # Load everything the Question schema serializes up front instead of lazily per row
+    return (joinedload(Question.author), selectinload(Question.tags))
+
+def version(q):
+    """Fingerprint of everything the Question schema serializes, for ETags; views alone do not change it"""
+    return (
+        q.id, q.created_at, q.updated_at, q.last_activity_at, q.score, q.upvote_count, q.downvote_count,
+        q.answer_count, q.is_answered, q.author.updated_at if q.author else None,
+        tuple((t.id, t.updated_at) for t in q.tags)
+    )
+
+def get_question_version(db, question_id: int):
+    """Fingerprint of the same data as version() from one narrow query, without loading the question"""
+    from .tag import Tag, QuestionTag
+    from .user import User
+    tagged = QuestionTag.question_id == question_id
+    row = db.execute(
+        select(
+            Question.created_at, Question.updated_at, Question.last_activity_at, Question.score, Question.upvote_count,
+            Question.downvote_count, Question.answer_count, Question.is_answered, User.updated_at,
+            # Tag links added, removed or renamed
+            select(func.count(QuestionTag.id)).where(tagged).scalar_subquery(),
+            select(func.max(QuestionTag.id)).where(tagged).scalar_subquery(),
+            select(func.max(Tag.updated_at)).join(QuestionTag).where(tagged).scalar_subquery()
+        )
+        .outerjoin(User, User.id == Question.author_id)
+        .where(Question.id == question_id)
+    ).first()
+    return (*row, *counter_buffer.votes_version("questions", question_id)) if row else None
+
+def get_question_detail(db, question_id: int, viewer_id: int = None):
+    """Everything the question page shows, in three queries (four with a viewer).
+
+    Answers come accepted first, then by score; vote totals are the denormalized
+    counters, and the viewer's own votes are fetched in one query.
+    """
+    from .answer import Answer, load_options as answer_load_options
+    from .vote import Vote
+    db_question = get_question(db, question_id)
+    if db_question is None:
+        return None
+    answers = (
+        db.query(Answer)
+        .options(*answer_load_options())
+        .filter(Answer.question_id == question_id)
+        .order_by(Answer.is_accepted.desc(), Answer.score.desc(), Answer.created_at, Answer.id)
+        .all()
+    )
+    detail = {"question": db_question, "answers": answers, "viewer_votes": None}
+    if viewer_id is not None:
+        answer_ids = [a.id for a in answers]
+        votes = db.execute(
+            select(Vote.question_id, Vote.answer_id, Vote.is_upvote)
+            .where(Vote.user_id == viewer_id, or_(Vote.question_id == question_id, Vote.answer_id.in_(answer_ids)))
+        ).all()
+        detail["viewer_votes"] = {
+            "question": next((v.is_upvote for v in votes if v.question_id == question_id), None),
+            "answers": {v.answer_id: v.is_upvote for v in votes if v.answer_id is not None}
+        }
+    return detail
+
+def detail_version(detail):
+    """Fingerprint of a get_question_detail result, computed from the loaded rows"""
+    from .answer import version as answer_version
+    viewer_votes = detail["viewer_votes"]
+    return (
+        version(detail["question"]),
+        tuple(answer_version(a) for a in detail["answers"]),
+        (viewer_votes["question"], tuple(sorted(viewer_votes["answers"].items()))) if viewer_votes else None
+    )
+
+def get_questions(db, skip: int = 0, limit: int = 100, cursor: str = None, sort: str = "newest"):
+    columns, condition = FEEDS[sort]
+    query = db.query(Question).options(*load_options())
+    if condition is not None:
+        query = query.filter(condition)
+    return paginate(query, columns, cursor, skip, limit)
 
 def get_question(db, question_id: int):
-    return db.query(Question).filter(Question.id == question_id).first()
+    return db.query(Question).options(*load_options()).filter(Question.id == question_id).first()
+
+def get_questions_by_ids(db, ids):
+    """Multi-get in one query, in the order requested; unknown ids are left out"""
+    questions = {q.id: q for q in db.query(Question).options(*load_options()).filter(Question.id.in_(ids))}
+    return [questions[i] for i in ids if i in questions]
 
 def create_question(db, question: question_schema.QuestionCreate):
+    from .tag import ensure_tags, add_tags_to_question
+    from .user import ensure_user
     db_question = Question(
         title=question.title,
         content=question.content,
-        author_id=question.author_id
+        author_id=question.author_id,
+        hot_score=hot_score(0, 0, datetime.now(timezone.utc))
     )
     db.add(db_question)
+    try:
+        db.flush()
+    except IntegrityError:
+        # The only foreign key is the author
+        db.rollback()
+        ensure_user(db, question.author_id)
+        raise
+    question_id = db_question.id
+    # Tags are resolved and linked with a fixed number of statements, however many there are
+    db_tags, created_tags = ensure_tags(db, [tag_schema.TagCreate(name=name) for name in question.tags])
+    add_tags_to_question(db, question_id, [tag.id for tag in db_tags])
+    linked = [(tag.id, tag.name) for tag in db_tags]
     db.commit()
-    db.refresh(db_question)
-    return db_question
+    if created_tags:
+        invalidate_tags(*question.tags)
+    for tag_id, name in linked:
+        tag_index.add(tag_id, name)
+    tag_index.count([tag_id for tag_id, _ in linked])
+    # Reload with the relationships the schema serializes
+    return get_question(db, question_id)
 
-def update_question(db, question_id: int, question: question_schema.QuestionUpdate):
-    db_question = get_question(db, question_id)
-    if db_question:
-        update_data = question.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_question, field, value)
-        
-        db.commit()
-        db.refresh(db_question)
-    return db_question
-
-def delete_question(db, question_id: int):
-    db_question = get_question(db, question_id)
-    if db_question:
-        db.delete(db_question)
-        db.commit()
-    return db_question
+def get_question_owner(db, question_id: int):
+    """(author_id,) of a question, or None if it does not exist; tells 404 from 403 after a write matched nothing"""
+    return db.execute(select(Question.author_id).where(Question.id == question_id)).first()
+
+def _owned(question_id: int, author_id: int = None):
+    condition = Question.id == question_id
+    return condition if author_id is None else condition & (Question.author_id == author_id)
+
+def update_question(db, question_id: int, question: question_schema.QuestionUpdate, author_id: int = None):
+    """Apply the changes in one UPDATE ... RETURNING; None if no question matched, or it is not author_id's"""
+    updated = db.execute(
+        update(Question)
+        .where(_owned(question_id, author_id))
+        .values(**question.dict(exclude_unset=True), last_activity_at=func.now())
+        .returning(Question.id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if updated is None:
+        db.rollback()
+        return None
+    db.commit()
+    invalidate_questions(question_id)
+    # Reload with the relationships the schema serializes
+    return get_question(db, question_id)
+
+def delete_question(db, question_id: int, author_id: int = None):
+    """One DELETE ... RETURNING; the foreign keys cascade to answers, votes, notifications and tag links. None if nothing matched"""
+    from .notification import forget_unread
+    from .tag import QuestionTag
+    # Read before the cascade removes them, to keep the tag suggestion counts
+    tag_ids = db.scalars(select(QuestionTag.tag_id).where(QuestionTag.question_id == question_id)).all()
+    unread = forget_unread(db, question_id=question_id)
+    deleted = db.execute(
+        delete(Question)
+        .where(_owned(question_id, author_id))
+        .returning(Question.id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if deleted is None:
+        db.rollback()
+        return None
+    db.commit()
+    invalidate_questions(question_id)
+    invalidate_answer_lists(question_id)
+    tag_index.count(tag_ids, -1)
+    for user_id, count in unread:
+        events.notifications_changed(user_id, count)
+    return deleted
 
-def get_questions_by_author(db, author_id: int, skip: int = 0, limit: int = 100):
-    return db.query(Question).filter(Question.author_id == author_id).offset(skip).limit(limit).all()
+def get_questions_by_author(db, author_id: int, skip: int = 0, limit: int = 100, cursor: str = None):
+    return paginate(db.query(Question).options(*load_options()).filter(Question.author_id == author_id), KEYSET, cursor, skip, limit)
 
 def search_questions(db, search_term: str, skip: int = 0, limit: int = 100):
-    return db.query(Question).filter(
-        Question.title.contains(search_term) | Question.content.contains(search_term)
-    ).offset(skip).limit(limit).all() 
\ No newline at end of file
+    from .search import search
+    hits = search(db, search_term, scope="questions", skip=skip, limit=limit)
+    ids = [hit["id"] for hit in hits]
+    if not ids:
+        return []
+    # Preserve the relevance order of the search index
+    return get_questions_by_ids(db, ids) 
\ No newline at end of file
@@ -0,0 +1,216 @@
+import html
+import re
+from sqlalchemy import text
+
+HIGHLIGHT_OPEN = "<mark>"
+HIGHLIGHT_CLOSE = "</mark>"
+
+# The database marks matches with these private-use characters; search() escapes
+# the user's text and only then turns them into HIGHLIGHT_OPEN and HIGHLIGHT_CLOSE
+MATCH_OPEN = "\ue000"
+MATCH_CLOSE = "\ue001"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(search_term: str):
+    return _TOKEN_RE.findall(search_term.lower())
+
+class SQLiteSearchBackend:
+    """FTS5 external-content tables kept in sync by triggers, ranked with BM25"""
+    name = "sqlite"
+
+    ddl = {
+        "questions_fts": [
+            """CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+                title, content, content='questions', content_rowid='id', tokenize='porter unicode61'
+            )""",
+            """CREATE TRIGGER IF NOT EXISTS questions_fts_ai AFTER INSERT ON questions BEGIN
+                INSERT INTO questions_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS questions_fts_ad AFTER DELETE ON questions BEGIN
+                INSERT INTO questions_fts(questions_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS questions_fts_au AFTER UPDATE OF title, content ON questions BEGIN
+                INSERT INTO questions_fts(questions_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+                INSERT INTO questions_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+            END""",
+        ],
+        "answers_fts": [
+            """CREATE VIRTUAL TABLE IF NOT EXISTS answers_fts USING fts5(
+                content, content='answers', content_rowid='id', tokenize='porter unicode61'
+            )""",
+            """CREATE TRIGGER IF NOT EXISTS answers_fts_ai AFTER INSERT ON answers BEGIN
+                INSERT INTO answers_fts(rowid, content) VALUES (new.id, new.content);
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS answers_fts_ad AFTER DELETE ON answers BEGIN
+                INSERT INTO answers_fts(answers_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS answers_fts_au AFTER UPDATE OF content ON answers BEGIN
+                INSERT INTO answers_fts(answers_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                INSERT INTO answers_fts(rowid, content) VALUES (new.id, new.content);
+            END""",
+        ],
+    }
+
+    question_sql = """
+        SELECT 'question' AS type, questions_fts.rowid AS id, questions_fts.rowid AS question_id,
+               highlight(questions_fts, 0, :open, :close) AS title,
+               snippet(questions_fts, 1, :open, :close, '...', 24) AS snippet,
+               -bm25(questions_fts, 10.0, 1.0) AS score
+        FROM questions_fts
+        WHERE questions_fts MATCH :query
+    """
+
+    answer_sql = """
+        SELECT 'answer' AS type, answers.id AS id, answers.question_id AS question_id,
+               questions.title AS title,
+               snippet(answers_fts, 0, :open, :close, '...', 24) AS snippet,
+               -bm25(answers_fts) AS score
+        FROM answers_fts
+        JOIN answers ON answers.id = answers_fts.rowid
+        JOIN questions ON questions.id = answers.question_id
+        WHERE answers_fts MATCH :query
+    """
+
+    def install(self, connection):
+        for table, statements in self.ddl.items():
+            exists = connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).first()
+            for statement in statements:
+                connection.exec_driver_sql(statement)
+            if not exists:
+                # Index rows that were written before the search tables existed
+                connection.exec_driver_sql(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+    def build_query(self, tokens):
+        # Every term must match; each term also matches as a prefix
+        return " ".join(f'"{token}"*' for token in tokens)
+
+    def params(self):
+        return {}
+
+class PostgresSearchBackend:
+    """GIN expression indexes over tsvectors, ranked with ts_rank_cd"""
+    name = "postgresql"
+
+    question_vector = (
+        "setweight(to_tsvector('english', coalesce(questions.title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(questions.content, '')), 'B')"
+    )
+    answer_vector = "to_tsvector('english', coalesce(answers.content, ''))"
+
+    question_sql = f"""
+        SELECT 'question' AS type, questions.id AS id, questions.id AS question_id,
+               ts_headline('english', questions.title, to_tsquery('english', :query), :title_options) AS title,
+               ts_headline('english', coalesce(questions.content, ''), to_tsquery('english', :query), :snippet_options) AS snippet,
+               ts_rank_cd({question_vector}, to_tsquery('english', :query)) AS score
+        FROM questions
+        WHERE {question_vector} @@ to_tsquery('english', :query)
+    """
+
+    answer_sql = f"""
+        SELECT 'answer' AS type, answers.id AS id, answers.question_id AS question_id,
+               questions.title AS title,
+               ts_headline('english', coalesce(answers.content, ''), to_tsquery('english', :query), :snippet_options) AS snippet,
+               ts_rank_cd({answer_vector}, to_tsquery('english', :query)) AS score
+        FROM answers
+        JOIN questions ON questions.id = answers.question_id
+        WHERE {answer_vector} @@ to_tsquery('english', :query)
+    """
+
+    def install(self, connection):
+        # Expression indexes are maintained by PostgreSQL on every write, so no triggers are needed
+        connection.exec_driver_sql(
+            f"CREATE INDEX IF NOT EXISTS ix_questions_search ON questions USING GIN (({self.question_vector}))"
+        )
+        connection.exec_driver_sql(
+            f"CREATE INDEX IF NOT EXISTS ix_answers_search ON answers USING GIN (({self.answer_vector}))"
+        )
+
+    def build_query(self, tokens):
+        return " & ".join(f"{token}:*" for token in tokens)
+
+    def params(self):
+        return {
+            "title_options": f'StartSel="{MATCH_OPEN}", StopSel="{MATCH_CLOSE}", HighlightAll=true',
+            "snippet_options": f'StartSel="{MATCH_OPEN}", StopSel="{MATCH_CLOSE}", MaxWords=24, MinWords=12',
+        }
+
+class LikeSearchBackend:
+    """Substring matching for databases without a full-text backend here; unindexed, so it scans both tables.
+
+    Results carry no highlights and are ordered by the posts' vote scores.
+    """
+    name = "like"
+
+    question_sql = """
+        SELECT 'question' AS type, questions.id AS id, questions.id AS question_id,
+               questions.title AS title, substr(questions.content, 1, 200) AS snippet, questions.score AS score
+        FROM questions
+        WHERE questions.title LIKE :query ESCAPE '!' OR questions.content LIKE :query ESCAPE '!'
+    """
+
+    answer_sql = """
+        SELECT 'answer' AS type, answers.id AS id, answers.question_id AS question_id,
+               questions.title AS title, substr(answers.content, 1, 200) AS snippet, answers.score AS score
+        FROM answers
+        JOIN questions ON questions.id = answers.question_id
+        WHERE answers.content LIKE :query ESCAPE '!'
+    """
+
+    def install(self, connection):
+        pass
+
+    def build_query(self, tokens):
+        # Tokens are word characters, so _ is the only LIKE wildcard they can hold
+        return "%" + " ".join(tokens).replace("_", "!_") + "%"
+
+    def params(self):
+        return {}
+
+BACKENDS = {
+    SQLiteSearchBackend.name: SQLiteSearchBackend(),
+    PostgresSearchBackend.name: PostgresSearchBackend(),
+}
+
+FALLBACK_BACKEND = LikeSearchBackend()
+
+def get_backend(bind):
+    return BACKENDS.get(bind.dialect.name, FALLBACK_BACKEND)
+
+def init_search_index(engine):
+    with engine.begin() as connection:
+        get_backend(engine).install(connection)
+
+def mark_matches(value):
+    """HTML-escape highlighted text from the database, then wrap its matches in <mark>"""
+    if value is None:
+        return None
+    return html.escape(value).replace(MATCH_OPEN, HIGHLIGHT_OPEN).replace(MATCH_CLOSE, HIGHLIGHT_CLOSE)
+
+def search(db, search_term: str, scope: str = "all", skip: int = 0, limit: int = 20):
+    tokens = tokenize(search_term)
+    if not tokens:
+        return []
+
+    backend = get_backend(db.get_bind())
+    parts = []
+    if scope in ("all", "questions"):
+        parts.append(backend.question_sql)
+    if scope in ("all", "answers"):
+        parts.append(backend.answer_sql)
+
+    sql = " UNION ALL ".join(parts) + " ORDER BY score DESC LIMIT :limit OFFSET :skip"
+    params = {
+        "query": backend.build_query(tokens),
+        "open": MATCH_OPEN,
+        "close": MATCH_CLOSE,
+        "limit": limit,
+        "skip": skip,
+    }
+    params.update(backend.params())
+    return [
+        {**row._mapping, "title": mark_matches(row.title), "snippet": mark_matches(row.snippet)}
+        for row in db.execute(text(sql), params)
+    ]
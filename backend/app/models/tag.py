@@ -1,7 +1,10 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, delete, select, update
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from ..database import Base
+from ..database import Base, upsert_insert
+from ..cache import invalidate_questions, invalidate_tags
+from ..pagination import paginate
+from ..tag_index import tag_index
 from ..schemas import tag as tag_schema
 
 class Tag(Base):
@@ -11,23 +14,70 @@ class Tag(Base):
     name = Column(String, unique=True, index=True)
     description = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
-    question_tags = relationship("QuestionTag", back_populates="tag")
+    question_tags = relationship("QuestionTag", back_populates="tag", passive_deletes=True)
+
+    # Keyset pagination index; updated_at serves the tag list version query
+    __table_args__ = (
+        Index("ix_tags_created_at_id", "created_at", "id"),
+        Index("ix_tags_updated_at", "updated_at"),
+    )
+
+KEYSET = (Tag.created_at, Tag.id)
 
 class QuestionTag(Base):
     __tablename__ = "question_tags"
 
     id = Column(Integer, primary_key=True, index=True)
-    question_id = Column(Integer, ForeignKey("questions.id"))
-    tag_id = Column(Integer, ForeignKey("tags.id"))
+    question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"))
+    tag_id = Column(Integer, ForeignKey("tags.id", ondelete="CASCADE"))
 
     # Relationships
     question = relationship("Question", back_populates="question_tags")
     tag = relationship("Tag", back_populates="question_tags")
 
-def get_tags(db, skip: int = 0, limit: int = 100):
-    return db.query(Tag).offset(skip).limit(limit).all()
+    __table_args__ = (
+        Index("uq_question_tags_question_id_tag_id", "question_id", "tag_id", unique=True),
+        Index("ix_question_tags_tag_id_question_id", "tag_id", "question_id"),
+    )
+
+def _tagged_question_ids(db, tag_id: int):
+    # Questions embed their tags, so renaming or deleting a tag touches every tagged question
+    return [row.question_id for row in db.query(QuestionTag.question_id).filter(QuestionTag.tag_id == tag_id)]
+
+def version(t):
+    """Fingerprint of everything the Tag schema serializes, for ETags"""
+    return (t.id, t.created_at, t.updated_at)
+
+def get_tag_version(db, tag_id: int = None, name: str = None):
+    condition = Tag.id == tag_id if name is None else Tag.name == name
+    row = db.execute(select(Tag.id, Tag.created_at, Tag.updated_at).where(condition)).first()
+    return tuple(row) if row else None
+
+def get_tags_version(db):
+    # Separate subqueries so each aggregate is answered from an index rather than one shared table scan
+    return tuple(db.execute(
+        select(
+            select(func.count(Tag.id)).scalar_subquery(),
+            select(func.max(Tag.id)).scalar_subquery(),
+            select(func.max(Tag.created_at)).scalar_subquery(),
+            select(func.max(Tag.updated_at)).scalar_subquery()
+        )
+    ).first())
+
+def load_tag_index(db):
+    """Fill the suggestion index with every tag and its question count, in one query"""
+    tag_index.load(db.execute(
+        select(Tag.id, Tag.name, func.count(QuestionTag.id)).outerjoin(QuestionTag).group_by(Tag.id, Tag.name)
+    ))
+
+def suggest_tags(prefix: str, limit: int = 10):
+    return tag_index.suggest(prefix, limit)
+
+def get_tags(db, skip: int = 0, limit: int = 100, cursor: str = None):
+    return paginate(db.query(Tag), KEYSET, cursor, skip, limit)
 
 def get_tag(db, tag_id: int):
     return db.query(Tag).filter(Tag.id == tag_id).first()
@@ -42,26 +92,74 @@ def create_tag(db, tag: tag_schema.TagCreate):
     )
     db.add(db_tag)
     db.commit()
+    invalidate_tags(tag.name)
     db.refresh(db_tag)
+    tag_index.add(db_tag.id, db_tag.name)
     return db_tag
 
+def ensure_tags(db, tags):
+    """Insert the tags that do not exist yet and return all of them in the order given, without committing.
+
+    Two statements regardless of how many tags: one INSERT ... ON CONFLICT DO
+    NOTHING and one IN query. Existing tags keep their description. Returns
+    (tags, number created).
+    """
+    tags = list({tag.name: tag for tag in tags}.values())
+    if not tags:
+        return [], 0
+    created = db.execute(
+        upsert_insert(db, Tag)
+        .values([{"name": tag.name, "description": tag.description} for tag in tags])
+        .on_conflict_do_nothing(index_elements=[Tag.name])
+    ).rowcount
+    by_name = {t.name: t for t in db.query(Tag).filter(Tag.name.in_([tag.name for tag in tags]))}
+    return [by_name[tag.name] for tag in tags], created
+
+def create_tags(db, tags):
+    db_tags, created = ensure_tags(db, tags)
+    names = {tag.id: tag.name for tag in db_tags}
+    db.commit()
+    if created:
+        invalidate_tags(*names.values())
+        for tag_id, name in names.items():
+            tag_index.add(tag_id, name)
+    return db_tags
+
 def update_tag(db, tag_id: int, tag: tag_schema.TagUpdate):
-    db_tag = get_tag(db, tag_id)
-    if db_tag:
-        update_data = tag.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_tag, field, value)
-        
-        db.commit()
-        db.refresh(db_tag)
-    return db_tag
+    """Apply the changes in one UPDATE ... RETURNING; returns the tag's row as a dict, or None if it does not exist"""
+    values = tag.dict(exclude_unset=True)
+    # RETURNING only sees the new row, and the old name's cache entry has to go too
+    old_name = db.scalar(select(Tag.name).where(Tag.id == tag_id)) if "name" in values else None
+    updated = db.execute(
+        update(Tag)
+        .where(Tag.id == tag_id)
+        .values(**(values or {"updated_at": Tag.updated_at}))
+        .returning(*Tag.__table__.columns)
+        .execution_options(synchronize_session=False)
+    ).mappings().first()
+    if updated is None:
+        db.rollback()
+        return None
+    db.commit()
+    invalidate_tags(*{old_name, updated["name"]} - {None})
+    invalidate_questions(*_tagged_question_ids(db, tag_id))
+    tag_index.rename(tag_id, updated["name"])
+    return dict(updated)
 
 def delete_tag(db, tag_id: int):
-    db_tag = get_tag(db, tag_id)
-    if db_tag:
-        db.delete(db_tag)
-        db.commit()
-    return db_tag
+    """One DELETE ... RETURNING; the foreign key cascades to the tag's question links. None if it does not exist"""
+    question_ids = _tagged_question_ids(db, tag_id)
+    deleted = db.execute(
+        delete(Tag).where(Tag.id == tag_id).returning(Tag.name).execution_options(synchronize_session=False)
+    ).first()
+    if deleted is None:
+        db.rollback()
+        return None
+    db.commit()
+    invalidate_tags(deleted.name)
+    invalidate_questions(*question_ids)
+    tag_index.remove(tag_id)
+    return deleted
 
 def add_tag_to_question(db, question_id: int, tag_id: int):
     question_tag = QuestionTag(
@@ -70,9 +168,20 @@ def add_tag_to_question(db, question_id: int, tag_id: int):
     )
     db.add(question_tag)
     db.commit()
+    invalidate_questions(question_id)
+    tag_index.count([tag_id])
     db.refresh(question_tag)
     return question_tag
 
+def add_tags_to_question(db, question_id: int, tag_ids):
+    """Link several tags in one INSERT, skipping links that already exist; does not commit"""
+    if tag_ids:
+        db.execute(
+            upsert_insert(db, QuestionTag)
+            .values([{"question_id": question_id, "tag_id": tag_id} for tag_id in tag_ids])
+            .on_conflict_do_nothing(index_elements=[QuestionTag.question_id, QuestionTag.tag_id])
+        )
+
 def remove_tag_from_question(db, question_id: int, tag_id: int):
     question_tag = db.query(QuestionTag).filter(
         QuestionTag.question_id == question_id,
@@ -81,11 +190,18 @@ def remove_tag_from_question(db, question_id: int, tag_id: int):
     if question_tag:
         db.delete(question_tag)
         db.commit()
+        invalidate_questions(question_id)
+        tag_index.count([tag_id], -1)
     return question_tag
 
 def get_tags_by_question(db, question_id: int):
     return db.query(Tag).join(QuestionTag).filter(QuestionTag.question_id == question_id).all()
 
-def get_questions_by_tag(db, tag_id: int, skip: int = 0, limit: int = 100):
-    from .question import Question
-    return db.query(Question).join(QuestionTag).filter(QuestionTag.tag_id == tag_id).offset(skip).limit(limit).all() 
\ No newline at end of file
+def get_questions_by_tag(db, tag_id: int, skip: int = 0, limit: int = 100, cursor: str = None, sort: str = "newest"):
+    from .question import Question, FEEDS, load_options
+    columns, condition = FEEDS[sort]
+    # Ranked within the tag's own rows, which the (tag_id, question_id) index finds
+    query = db.query(Question).options(*load_options()).join(QuestionTag).filter(QuestionTag.tag_id == tag_id)
+    if condition is not None:
+        query = query.filter(condition)
+    return paginate(query, columns, cursor, skip, limit) 
\ No newline at end of file
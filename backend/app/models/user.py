@@ -1,11 +1,11 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index, delete, select, update
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from passlib.context import CryptContext
 from ..database import Base
+from ..pagination import paginate
 from ..schemas import user as user_schema
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from ..security import pwd_context
+from ..cache import invalidate_questions, invalidate_answer_lists
 
 class User(Base):
     __tablename__ = "users"
@@ -19,10 +19,25 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
-    # Relationships
-    questions = relationship("Question", back_populates="author")
-    answers = relationship("Answer", back_populates="author")
-    votes = relationship("Vote", back_populates="user")
+    # Relationships; deleting a user keeps their posts and votes, which ON DELETE SET NULL detaches
+    questions = relationship("Question", back_populates="author", passive_deletes=True)
+    answers = relationship("Answer", back_populates="author", passive_deletes=True)
+    votes = relationship("Vote", back_populates="user", passive_deletes=True)
+
+    # Keyset pagination index
+    __table_args__ = (
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
+
+KEYSET = (User.created_at, User.id)
+
+class UnknownUser(Exception):
+    """A write was made as a user who no longer exists; their access token outlives the account"""
+
+def ensure_user(db, user_id: int):
+    """Raise UnknownUser if user_id is gone; write paths call it after a foreign key failure to tell a stale token from a missing target"""
+    if user_id is not None and db.scalar(select(User.id).where(User.id == user_id)) is None:
+        raise UnknownUser(user_id)
 
 def get_password_hash(password: str):
     return pwd_context.hash(password)
@@ -30,8 +45,24 @@ def get_password_hash(password: str):
 def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
 
-def get_users(db, skip: int = 0, limit: int = 100):
-    return db.query(User).offset(skip).limit(limit).all()
+def version(u):
+    """Fingerprint of everything the User schema serializes, for ETags"""
+    return (u.id, u.created_at, u.updated_at)
+
+def get_user_version(db, user_id: int):
+    row = db.execute(select(User.id, User.created_at, User.updated_at).where(User.id == user_id)).first()
+    return tuple(row) if row else None
+
+def _authored_question_ids(db, user_id: int):
+    # Questions and answers embed their author, so profile changes touch their cached responses
+    from .question import Question
+    from .answer import Answer
+    asked = [row.id for row in db.query(Question.id).filter(Question.author_id == user_id)]
+    answered = [row.question_id for row in db.query(Answer.question_id).filter(Answer.author_id == user_id).distinct()]
+    return asked, answered
+
+def get_users(db, skip: int = 0, limit: int = 100, cursor: str = None):
+    return paginate(db.query(User), KEYSET, cursor, skip, limit)
 
 def get_user(db, user_id: int):
     return db.query(User).filter(User.id == user_id).first()
@@ -42,8 +73,9 @@ def get_user_by_email(db, email: str):
 def get_user_by_username(db, username: str):
     return db.query(User).filter(User.username == username).first()
 
-def create_user(db, user: user_schema.UserCreate):
-    hashed_password = get_password_hash(user.password)
+def create_user(db, user: user_schema.UserCreate, hashed_password: str = None):
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = User(
         email=user.email,
         username=user.username,
@@ -55,26 +87,46 @@ def create_user(db, user: user_schema.UserCreate):
     db.refresh(db_user)
     return db_user
 
-def update_user(db, user_id: int, user: user_schema.UserUpdate):
-    db_user = get_user(db, user_id)
-    if db_user:
-        update_data = user.dict(exclude_unset=True)
-        if "password" in update_data:
-            update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
-        
-        for field, value in update_data.items():
-            setattr(db_user, field, value)
-        
-        db.commit()
-        db.refresh(db_user)
-    return db_user
+def update_user(db, user_id: int, user: user_schema.UserUpdate, hashed_password: str = None):
+    """Apply the changes in one UPDATE ... RETURNING; returns the user's row as a dict, or None if they do not exist"""
+    update_data = user.dict(exclude_unset=True)
+    if "password" in update_data:
+        password = update_data.pop("password")
+        update_data["hashed_password"] = hashed_password or get_password_hash(password)
+    updated = db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(**(update_data or {"updated_at": User.updated_at}))
+        .returning(*User.__table__.columns)
+        .execution_options(synchronize_session=False)
+    ).mappings().first()
+    if updated is None:
+        db.rollback()
+        return None
+    db.commit()
+    if update_data.keys() - {"hashed_password"}:
+        asked, answered = _authored_question_ids(db, user_id)
+        invalidate_questions(*asked)
+        invalidate_answer_lists(*answered)
+    return dict(updated)
 
 def delete_user(db, user_id: int):
-    db_user = get_user(db, user_id)
-    if db_user:
-        db.delete(db_user)
-        db.commit()
-    return db_user
+    """One DELETE ... RETURNING; the foreign keys keep the user's posts and votes, detached. None if they do not exist"""
+    asked, answered = _authored_question_ids(db, user_id)
+    deleted = db.execute(
+        delete(User).where(User.id == user_id).returning(User.id).execution_options(synchronize_session=False)
+    ).first()
+    if deleted is None:
+        db.rollback()
+        return None
+    db.commit()
+    invalidate_questions(*asked)
+    invalidate_answer_lists(*answered)
+    return deleted
+
+def set_password_hash(db, user_id: int, hashed_password: str):
+    db.query(User).filter(User.id == user_id).update({User.hashed_password: hashed_password})
+    db.commit()
 
 def authenticate_user(db, email: str, password: str):
     user = get_user_by_email(db, email)
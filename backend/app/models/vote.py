@@ -1,16 +1,24 @@
-from sqlalchemy import Column, Integer, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Index, delete, select, update, bindparam, null, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from ..database import Base
+from ..database import Base, upsert_insert
+from ..cache import cache, invalidate_questions, invalidate_answer_lists
+from .. import events
+from ..counter_buffer import counter_buffer
+from ..pagination import paginate
+from .question import Question, hot_score_after, refresh_hot_scores
+from .answer import Answer
+from .user import ensure_user
 from ..schemas import vote as vote_schema
 
 class Vote(Base):
     __tablename__ = "votes"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    question_id = Column(Integer, ForeignKey("questions.id"), nullable=True)
-    answer_id = Column(Integer, ForeignKey("answers.id"), nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
+    question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), nullable=True)
+    answer_id = Column(Integer, ForeignKey("answers.id", ondelete="CASCADE"), nullable=True)
     is_upvote = Column(Boolean)  # True for upvote, False for downvote
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -19,13 +27,298 @@ class Vote(Base):
     question = relationship("Question", back_populates="votes")
     answer = relationship("Answer", back_populates="votes")
 
-def get_votes(db, skip: int = 0, limit: int = 100):
-    return db.query(Vote).offset(skip).limit(limit).all()
+    # Keyset pagination indexes
+    __table_args__ = (
+        Index("ix_votes_created_at_id", "created_at", "id"),
+        Index("ix_votes_question_id_created_at_id", "question_id", "created_at", "id"),
+        Index("ix_votes_answer_id_created_at_id", "answer_id", "created_at", "id"),
+        Index("ix_votes_user_id_created_at_id", "user_id", "created_at", "id"),
+        # One vote per user per target; NULL targets (the other kind of vote) never collide
+        Index("uq_votes_user_id_question_id", "user_id", "question_id", unique=True),
+        Index("uq_votes_user_id_answer_id", "user_id", "answer_id", unique=True),
+    )
+
+KEYSET = (Vote.created_at, Vote.id)
+
+class CounterLogState(Base):
+    """Last crash-log record of each write-behind process that reached the database (see counter_buffer)"""
+    __tablename__ = "counter_log_state"
+
+    log_id = Column(String, primary_key=True)
+    applied_seq = Column(Integer, nullable=False)
+
+COUNTER_TARGETS = {"questions": Question, "answers": Answer}
+
+def _vote_deltas(is_upvote: bool, sign: int = 1):
+    if is_upvote:
+        return {"score": sign, "upvotes": sign, "downvotes": 0}
+    return {"score": -sign, "upvotes": 0, "downvotes": sign}
+
+def _score_columns(target):
+    """What a score event carries about a question or answer, for RETURNING or a select"""
+    if target is Question:
+        ids = (Question.id.label("question_id"), null().label("answer_id"))
+    else:
+        ids = (Answer.question_id, Answer.id.label("answer_id"))
+    return (*ids, target.author_id, target.score, target.upvote_count, target.downvote_count)
+
+def publish_scores(changed):
+    """Publish score events for adjust_counters' rows; call after commit"""
+    for row in changed:
+        events.score_changed(
+            row["question_id"], row["answer_id"], row["author_id"],
+            score=row["score"], upvote_count=row["upvote_count"], downvote_count=row["downvote_count"]
+        )
+
+def adjust_counters(db, question_id: int = None, answer_id: int = None, score: int = 0, upvotes: int = 0, downvotes: int = 0):
+    """Move the counters of each target; returns their new counters for publish_scores.
+
+    With COUNTER_WRITE_BEHIND the deltas are staged on the session instead,
+    reach the buffer when it commits, and are published by the flush; returns [].
+    """
+    if counter_buffer.enabled:
+        staged = db.info.setdefault("counter_deltas", [])
+        if question_id is not None:
+            staged.append((("questions", question_id), [score, upvotes, downvotes, 0]))
+        if answer_id is not None:
+            staged.append((("answers", answer_id), [score, upvotes, downvotes, 0]))
+        return []
+    # Single UPDATE ... SET col = col + n per target, so concurrent votes never lose increments
+    changed = []
+    for target, target_id in ((Question, question_id), (Answer, answer_id)):
+        if target_id is not None:
+            # A vote is not an edit, so updated_at keeps its value
+            values = dict(
+                score=target.score + score,
+                upvote_count=target.upvote_count + upvotes,
+                downvote_count=target.downvote_count + downvotes,
+                updated_at=target.updated_at
+            )
+            if target is Question:
+                values["hot_score"] = hot_score_after(score_delta=score)
+            changed.extend(db.execute(
+                update(target).where(target.id == target_id).values(**values).returning(*_score_columns(target))
+            ).mappings())
+    return changed
+
+def version(v):
+    """Fingerprint of everything the Vote schema serializes, for ETags"""
+    return (v.id, v.created_at, v.is_upvote)
+
+def _invalidate_cached_targets(db, question_ids=(), answer_ids=()):
+    invalidate_questions(*question_ids)
+    answer_ids = [i for i in answer_ids if i is not None]
+    if answer_ids:
+        invalidate_answer_lists(*db.scalars(select(Answer.question_id).where(Answer.id.in_(answer_ids)).distinct()))
+
+def cast_vote(db, user_id: int, is_upvote: bool, question_id: int = None, answer_id: int = None):
+    """Record a user's vote on a question or answer, idempotently, and apply the counter delta.
+
+    Inserts with ON CONFLICT DO NOTHING, and only if that hit an existing vote,
+    flips it with a conditional UPDATE. Each statement reports what it changed,
+    so the delta is known without reading the old vote first, and concurrent
+    casts by the same user serialize on the unique index. Returns the target's
+    new counters, or None if the target does not exist.
+    """
+    target, target_id, target_column = (
+        (Question, question_id, Vote.question_id) if question_id is not None else (Answer, answer_id, Vote.answer_id)
+    )
+    insert = upsert_insert(db, Vote).values(
+        user_id=user_id, question_id=question_id, answer_id=answer_id, is_upvote=is_upvote
+    )
+    try:
+        inserted = db.execute(insert.on_conflict_do_nothing(index_elements=[Vote.user_id, target_column])).rowcount
+    except IntegrityError:
+        # A foreign key rejected a missing target, or a voter whose account is gone
+        db.rollback()
+        ensure_user(db, user_id)
+        return None
+    if inserted:
+        deltas = _vote_deltas(is_upvote)
+    else:
+        flipped = db.execute(
+            update(Vote)
+            .where(Vote.user_id == user_id, target_column == target_id, Vote.is_upvote != is_upvote)
+            .values(is_upvote=is_upvote)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        old, new = _vote_deltas(not is_upvote, -1), _vote_deltas(is_upvote)
+        deltas = {key: (old[key] + new[key]) * flipped for key in old}
+
+    moved = any(deltas.values())
+    changed = adjust_counters(db, question_id, answer_id, **deltas) if moved else []
+    counters = db.execute(
+        select(target.score, target.upvote_count, target.downvote_count).where(target.id == target_id)
+    ).first()
+    if counters is None:
+        db.rollback()
+        return None
+    db.commit()
+    if moved:
+        _invalidate_cached_targets(db, [question_id], [answer_id])
+        publish_scores(changed)
+    # Buffered deltas, this one included, are not in the row yet
+    return {"is_upvote": is_upvote, **counter_buffer.merge(target.__tablename__, target_id, counters._asdict())}
+
+def import_votes(db, user_id: int, votes):
+    """Cast many of a user's votes at once, with cast_vote's semantics and a constant number of statements.
+
+    Each vote must name exactly one existing question or answer; others are
+    skipped. A target listed twice takes its last vote.
+    """
+    wanted, skipped = {}, 0
+    for vote in votes:
+        if (vote.question_id is None) == (vote.answer_id is None):
+            skipped += 1
+            continue
+        wanted[(vote.question_id, vote.answer_id)] = vote.is_upvote
+
+    # A vote on a missing target would fail the whole insert on its foreign key, so drop those up front
+    question_ids = {q for q, a in wanted if q is not None}
+    answer_ids = {a for q, a in wanted if a is not None}
+    known_questions = set(db.scalars(select(Question.id).where(Question.id.in_(question_ids)))) if question_ids else set()
+    known_answers = set(db.scalars(select(Answer.id).where(Answer.id.in_(answer_ids)))) if answer_ids else set()
+    for target in [t for t in wanted if t[0] not in known_questions and t[1] not in known_answers]:
+        del wanted[target]
+        skipped += 1
+    if not wanted:
+        return {"created": 0, "changed": 0, "unchanged": 0, "skipped": skipped}
+
+    # Without a conflict target, DO NOTHING skips rows hitting either unique index
+    try:
+        inserted = set(db.execute(
+            upsert_insert(db, Vote)
+            .values([
+                {"user_id": user_id, "question_id": q, "answer_id": a, "is_upvote": is_upvote}
+                for (q, a), is_upvote in wanted.items()
+            ])
+            .on_conflict_do_nothing()
+            .returning(Vote.question_id, Vote.answer_id)
+        ).tuples())
+    except IntegrityError:
+        # The targets were checked above, so the voter is gone, or a target was deleted since
+        db.rollback()
+        ensure_user(db, user_id)
+        raise
+    deltas = {target: _vote_deltas(wanted[target]) for target in inserted}
+
+    for is_upvote in (True, False):
+        targets = [t for t, up in wanted.items() if up == is_upvote and t not in inserted]
+        if not targets:
+            continue
+        flipped = db.execute(
+            update(Vote)
+            .where(
+                Vote.user_id == user_id,
+                Vote.is_upvote != is_upvote,
+                or_(
+                    Vote.question_id.in_([q for q, a in targets if q is not None]),
+                    Vote.answer_id.in_([a for q, a in targets if a is not None])
+                )
+            )
+            .values(is_upvote=is_upvote)
+            .returning(Vote.question_id, Vote.answer_id)
+            .execution_options(synchronize_session=False)
+        ).tuples()
+        old, new = _vote_deltas(not is_upvote, -1), _vote_deltas(is_upvote)
+        for target in flipped:
+            deltas[target] = {key: old[key] + new[key] for key in old}
+
+    counter_deltas = {}
+    for (q, a), d in deltas.items():
+        counter_deltas[("questions", q) if q is not None else ("answers", a)] = [d["score"], d["upvotes"], d["downvotes"], 0]
+    if counter_buffer.enabled:
+        db.info.setdefault("counter_deltas", []).extend(counter_deltas.items())
+    else:
+        _write_counter_deltas(db, counter_deltas)
+    db.commit()
+    _invalidate_cached_targets(db, [q for q, a in deltas if q is not None], [a for q, a in deltas if a is not None])
+    if counter_buffer.enabled:
+        # The flush publishes
+        deltas = {}
+    # executemany has no RETURNING, so read the new counters back once per table
+    for target, position in ((Question, 0), (Answer, 1)):
+        target_ids = [key[position] for key in deltas if key[position] is not None]
+        if target_ids:
+            publish_scores(db.execute(select(*_score_columns(target)).where(target.id.in_(target_ids))).mappings())
+    return {
+        "created": len(inserted),
+        "changed": len(counter_deltas) - len(inserted),
+        "unchanged": len(wanted) - len(counter_deltas),
+        "skipped": skipped
+    }
+
+def _write_counter_deltas(db, deltas: dict):
+    """Apply {("questions" or "answers", id): deltas in counter_buffer.FIELDS order} with one executemany per table and counter kind"""
+    for name, target in COUNTER_TARGETS.items():
+        rows = [(target_id, values) for (table_name, target_id), values in deltas.items() if table_name == name]
+        table = target.__table__
+        votes = [
+            {"target_id": target_id, "d_score": values[0], "d_up": values[1], "d_down": values[2]}
+            for target_id, values in rows if any(values[:3])
+        ]
+        if votes:
+            values = dict(
+                score=table.c.score + bindparam("d_score"),
+                upvote_count=table.c.upvote_count + bindparam("d_up"),
+                downvote_count=table.c.downvote_count + bindparam("d_down"),
+                updated_at=table.c.updated_at
+            )
+            if target is Question:
+                values["hot_score"] = hot_score_after(score_delta=bindparam("d_score"))
+            db.execute(update(table).where(table.c.id == bindparam("target_id")).values(**values), votes)
+        views = [{"target_id": target_id, "d_views": values[3]} for target_id, values in rows if values[3]]
+        if views:
+            # A view is not an edit, so updated_at keeps its value
+            db.execute(
+                update(table)
+                .where(table.c.id == bindparam("target_id"))
+                .values(view_count=table.c.view_count + bindparam("d_views"), updated_at=table.c.updated_at),
+                views
+            )
+
+def flush_counters(db, deltas: dict, log_id: str = None, seq: int = 0):
+    """Write a batch of buffered counter deltas, and how far log_id's crash log got, in one transaction"""
+    _write_counter_deltas(db, deltas)
+    if log_id is not None:
+        state = upsert_insert(db, CounterLogState).values(log_id=log_id, applied_seq=seq)
+        db.execute(state.on_conflict_do_update(index_elements=[CounterLogState.log_id], set_={"applied_seq": seq}))
+    db.commit()
+
+def get_counter_log_seq(db, log_id: str) -> int:
+    return db.scalar(select(CounterLogState.applied_seq).where(CounterLogState.log_id == log_id)) or 0
+
+def forget_counter_log(db, log_id: str):
+    db.execute(delete(CounterLogState).where(CounterLogState.log_id == log_id))
+    db.commit()
+
+def publish_flushed(db, deltas: dict):
+    """Publish score events for the posts a flush moved votes on, with what is still buffered added"""
+    for name, target in COUNTER_TARGETS.items():
+        target_ids = [target_id for (table_name, target_id), values in deltas.items() if table_name == name and any(values[:3])]
+        if target_ids:
+            rows = db.execute(select(*_score_columns(target)).where(target.id.in_(target_ids))).mappings()
+            publish_scores(
+                counter_buffer.merge(name, row["answer_id"] if target is Answer else row["question_id"], row)
+                for row in rows
+            )
+
+def get_votes(db, skip: int = 0, limit: int = 100, cursor: str = None):
+    return paginate(db.query(Vote), KEYSET, cursor, skip, limit)
 
 def get_vote(db, vote_id: int):
     return db.query(Vote).filter(Vote.id == vote_id).first()
 
+def get_vote_owner(db, vote_id: int):
+    """(user_id,) of a vote, or None if it does not exist; tells 404 from 403 after a write matched nothing"""
+    return db.execute(select(Vote.user_id).where(Vote.id == vote_id)).first()
+
+def _owned(vote_id: int, user_id: int = None):
+    condition = Vote.id == vote_id
+    return condition if user_id is None else condition & (Vote.user_id == user_id)
+
 def create_vote(db, vote: vote_schema.VoteCreate):
+    """Insert a vote and count it on its target; None if the target does not exist"""
     db_vote = Vote(
         user_id=vote.user_id,
         question_id=vote.question_id,
@@ -33,36 +326,67 @@ def create_vote(db, vote: vote_schema.VoteCreate):
         is_upvote=vote.is_upvote
     )
     db.add(db_vote)
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        ensure_user(db, vote.user_id)
+        return None
+    changed = adjust_counters(db, vote.question_id, vote.answer_id, **_vote_deltas(vote.is_upvote))
     db.commit()
+    _invalidate_cached_targets(db, [vote.question_id], [vote.answer_id])
+    publish_scores(changed)
     db.refresh(db_vote)
     return db_vote
 
-def update_vote(db, vote_id: int, vote: vote_schema.VoteUpdate):
-    db_vote = get_vote(db, vote_id)
-    if db_vote:
-        update_data = vote.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_vote, field, value)
-        
-        db.commit()
-        db.refresh(db_vote)
-    return db_vote
+def update_vote(db, vote_id: int, vote: vote_schema.VoteUpdate, user_id: int = None):
+    """Flip a vote with one UPDATE ... RETURNING and move its target's counters; None if no vote matched, or it is not user_id's"""
+    is_upvote = vote.dict(exclude_unset=True).get("is_upvote")
+    if is_upvote is not None:
+        # Only a vote that actually changes matches, so the returned row is the delta
+        flipped = db.execute(
+            update(Vote)
+            .where(_owned(vote_id, user_id), Vote.is_upvote != is_upvote)
+            .values(is_upvote=is_upvote)
+            .returning(*Vote.__table__.columns)
+            .execution_options(synchronize_session=False)
+        ).mappings().first()
+        if flipped is not None:
+            old, new = _vote_deltas(not is_upvote, -1), _vote_deltas(is_upvote)
+            changed = adjust_counters(db, flipped["question_id"], flipped["answer_id"], **{key: old[key] + new[key] for key in old})
+            db.commit()
+            _invalidate_cached_targets(db, [flipped["question_id"]], [flipped["answer_id"]])
+            publish_scores(changed)
+            return dict(flipped)
+    # Nothing to change; the vote as it stands
+    unchanged = db.execute(select(*Vote.__table__.columns).where(_owned(vote_id, user_id))).mappings().first()
+    return dict(unchanged) if unchanged is not None else None
 
-def delete_vote(db, vote_id: int):
-    db_vote = get_vote(db, vote_id)
-    if db_vote:
-        db.delete(db_vote)
-        db.commit()
-    return db_vote
+def delete_vote(db, vote_id: int, user_id: int = None):
+    """One DELETE ... RETURNING, then the counter delta on its target; None if no vote matched, or it is not user_id's"""
+    deleted = db.execute(
+        delete(Vote)
+        .where(_owned(vote_id, user_id))
+        .returning(Vote.question_id, Vote.answer_id, Vote.is_upvote)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if deleted is None:
+        db.rollback()
+        return None
+    changed = adjust_counters(db, deleted.question_id, deleted.answer_id, **_vote_deltas(deleted.is_upvote, -1))
+    db.commit()
+    _invalidate_cached_targets(db, [deleted.question_id], [deleted.answer_id])
+    publish_scores(changed)
+    return deleted
 
-def get_votes_by_question(db, question_id: int, skip: int = 0, limit: int = 100):
-    return db.query(Vote).filter(Vote.question_id == question_id).offset(skip).limit(limit).all()
+def get_votes_by_question(db, question_id: int, skip: int = 0, limit: int = 100, cursor: str = None):
+    return paginate(db.query(Vote).filter(Vote.question_id == question_id), KEYSET, cursor, skip, limit)
 
-def get_votes_by_answer(db, answer_id: int, skip: int = 0, limit: int = 100):
-    return db.query(Vote).filter(Vote.answer_id == answer_id).offset(skip).limit(limit).all()
+def get_votes_by_answer(db, answer_id: int, skip: int = 0, limit: int = 100, cursor: str = None):
+    return paginate(db.query(Vote).filter(Vote.answer_id == answer_id), KEYSET, cursor, skip, limit)
 
-def get_votes_by_user(db, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(Vote).filter(Vote.user_id == user_id).offset(skip).limit(limit).all()
+def get_votes_by_user(db, user_id: int, skip: int = 0, limit: int = 100, cursor: str = None):
+    return paginate(db.query(Vote).filter(Vote.user_id == user_id), KEYSET, cursor, skip, limit)
 
 def get_vote_by_user_and_question(db, user_id: int, question_id: int):
     return db.query(Vote).filter(
@@ -74,4 +398,41 @@ def get_vote_by_user_and_answer(db, user_id: int, answer_id: int):
     return db.query(Vote).filter(
         Vote.user_id == user_id,
         Vote.answer_id == answer_id
-    ).first() 
\ No newline at end of file
+    ).first()
+
+def reconcile_counters(db):
+    """Recompute every denormalized vote and answer counter, and the hot scores, from the source tables in bulk"""
+    def vote_count(target_column, target, is_upvote):
+        return (
+            select(func.count(Vote.id))
+            .where(target_column == target.id, Vote.is_upvote == is_upvote)
+            .scalar_subquery()
+        )
+
+    for target, target_column in ((Question, Vote.question_id), (Answer, Vote.answer_id)):
+        db.execute(
+            update(target)
+            .values(
+                upvote_count=vote_count(target_column, target, True),
+                downvote_count=vote_count(target_column, target, False),
+                updated_at=target.updated_at
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(
+            update(target)
+            .values(score=target.upvote_count - target.downvote_count, updated_at=target.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+
+    db.execute(
+        update(Question)
+        .values(
+            answer_count=select(func.count(Answer.id)).where(Answer.question_id == Question.id).scalar_subquery(),
+            updated_at=Question.updated_at
+        )
+        .execution_options(synchronize_session=False)
+    )
+    refresh_hot_scores(db)
+    db.commit()
+    cache.clear()
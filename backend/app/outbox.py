@@ -0,0 +1,58 @@
+import asyncio
+import logging
+from starlette.concurrency import run_in_threadpool
+from .config import settings
+from .database import SessionLocal
+from .models.notification import deliver_notifications
+
+logger = logging.getLogger("stackit.notifications")
+
+def deliver_batch() -> int:
+    db = SessionLocal()
+    try:
+        return deliver_notifications(db, settings.NOTIFICATIONS_BATCH_SIZE)
+    finally:
+        db.close()
+
+def drain() -> int:
+    """Deliver batches until the outbox is empty; returns how many events were delivered"""
+    total = 0
+    while True:
+        delivered = deliver_batch()
+        total += delivered
+        if delivered < settings.NOTIFICATIONS_BATCH_SIZE:
+            return total
+
+class OutboxWorker:
+    """Background task that drains the notification outbox every NOTIFICATIONS_INTERVAL_SECONDS.
+
+    Delivery runs on the sync engine in the threadpool, in either database mode.
+    Several processes may run one each; batches are claimed, never shared.
+    """
+
+    def __init__(self):
+        self._task = None
+        self._stop = None
+
+    def start(self):
+        self._stop = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while not self._stop.is_set():
+            try:
+                await run_in_threadpool(drain)
+            except Exception:
+                logger.exception("Notification delivery failed; retrying in %s s", settings.NOTIFICATIONS_INTERVAL_SECONDS)
+            try:
+                await asyncio.wait_for(self._stop.wait(), settings.NOTIFICATIONS_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        if self._task is not None:
+            self._stop.set()
+            await self._task
+            self._task = None
+
+worker = OutboxWorker()
@@ -0,0 +1,66 @@
+import base64
+import json
+import math
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import DateTime, Float, Integer, literal, tuple_
+from sqlalchemy.dialects import sqlite
+
+# Server-side CURRENTTIMESTAMP values are stored by SQLite without microseconds,
+# so cursor timestamps must be bound in the same text format to compare correctly
+TIMESTAMP = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite"
+)
+
+# Page sizes the list routes accept; a negative LIMIT would make SQLite return every row
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(values) -> str:
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, columns):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(payload, list) or len(payload) != len(columns):
+        raise InvalidCursor("Malformed cursor")
+
+    values = []
+    for column, value in zip(columns, payload):
+        if isinstance(column.type, DateTime):
+            try:
+                value = literal(datetime.fromisoformat(value), TIMESTAMP)
+            except (TypeError, ValueError):
+                raise InvalidCursor("Malformed cursor")
+        elif isinstance(column.type, (Integer, Float)):
+            # Scores of the hot feed are floats, ids are integers; JSON also allows NaN and Infinity
+            numeric = int if isinstance(column.type, Integer) else (int, float)
+            if isinstance(value, bool) or not isinstance(value, numeric) or not math.isfinite(value):
+                raise InvalidCursor("Malformed cursor")
+        values.append(value)
+    return values
+
+def paginate(query, columns, cursor: Optional[str] = None, skip: int = 0, limit: int = 100):
+    """Order newest-first by `columns`, seeking past `cursor` or falling back to offset paging"""
+    query = query.order_by(*(column.desc() for column in columns))
+    if cursor:
+        query = query.filter(tuple_(*columns) < tuple_(*decode_cursor(cursor, columns)))
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
+def next_cursor(items, limit: int, keys=("created_at", "id")) -> Optional[str]:
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor([getattr(last, key) for key in keys])
+
+def page(items, limit: int, keys=("created_at", "id")):
+    return {"items": items, "next_cursor": next_cursor(items, limit, keys)}
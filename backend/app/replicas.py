@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import itertools
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from .config import settings
+
+logger = logging.getLogger("stackit.replicas")
+
+# Readers remembered for read-your-writes; the oldest are forgotten first
+STICKY_MAX_ENTRIES = 100000
+
+# Who is asking, as a hash of the request's Authorization header; None for anonymous requests.
+# Threadpool and run_sync hops copy the context, so session events in model functions see it too.
+_reader = ContextVar("stackit_reader", default=None)
+# Set while loading a value the response cache will keep (see primary_reads)
+_primary_only = ContextVar("stackit_primary_reads", default=False)
+
+@contextmanager
+def primary_reads():
+    """Keep reads in this block on the primary.
+
+    Results the response cache stores must be current. A write invalidates the
+    entry, and a lagging replica would refill it with the row from before the write.
+    """
+    token = _primary_only.set(True)
+    try:
+        yield
+    finally:
+        _primary_only.reset(token)
+
+class Replica:
+    """One read replica's engine and health"""
+
+    def __init__(self, name: str, engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = True  # Until the first check says otherwise
+
+    @property
+    def bind(self):
+        # What Session.get_bind returns; an AsyncSession's sync session needs the sync side of an async engine
+        return getattr(self.engine, "sync_engine", self.engine)
+
+    async def check(self):
+        try:
+            if hasattr(self.engine, "sync_engine"):
+                async with self.engine.connect() as connection:
+                    await connection.execute(text("SELECT 1"))
+            else:
+                await run_in_threadpool(self._ping)
+            healthy = True
+        except Exception:
+            healthy = False
+        if healthy != self.healthy:
+            logger.warning("Read replica %s is %s", self.name, "back up" if healthy else "down")
+        self.healthy = healthy
+
+    def _ping(self):
+        with self.engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+class ReplicaSet:
+    """Picks the engine for each read-only model function call made through database.run.
+
+    Reads go round-robin to the healthy replicas, except for a reader who
+    committed a write in the last DB_READ_YOUR_WRITES_SECONDS, for the rest
+    of a session that has written, and for loads that fill the response cache;
+    those read from the primary. A background
+    task pings every replica each DB_REPLICA_CHECK_SECONDS, and a read that
+    fails on a replica marks it down and is retried on the primary.
+    """
+
+    def __init__(self, replicas):
+        self.replicas = list(replicas)
+        self._turn = itertools.count()
+        self._sticky = OrderedDict()  # reader -> monotonic time their reads may leave the primary
+        self._lock = threading.Lock()
+        self._task = None
+        self.counters = Counter()
+
+    def choose(self, db, fn):
+        """The replica for a call of fn on session db, or None for the primary"""
+        if not self.replicas or not reads_only(fn):
+            return None
+        if db.info.get("wrote") or _primary_only.get() or self.is_sticky(_reader.get()):
+            self.count("primary")
+            return None
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            self.count("fallback")
+            return None
+        self.count("replica")
+        return healthy[next(self._turn) % len(healthy)]
+
+    def failed(self, replica: Replica):
+        """A read on replica raised a connection error; stop using it until a check succeeds"""
+        if replica.healthy:
+            logger.warning("Read replica %s failed a read; falling back to the primary", replica.name, exc_info=True)
+        replica.healthy = False
+        self.count("fallback")
+
+    def count(self, route: str):
+        with self._lock:
+            self.counters[route] += 1
+
+    # Read-your-writes
+
+    def remember_writer(self, session):
+        """after_commit hook: once a session that wrote commits, its reader's next reads go to the primary too"""
+        if session.info.get("wrote"):
+            self.wrote(_reader.get())
+
+    def wrote(self, reader):
+        if reader is None or not self.replicas:
+            return
+        with self._lock:
+            self._sticky[reader] = time.monotonic() + settings.DB_READ_YOUR_WRITES_SECONDS
+            self._sticky.move_to_end(reader)
+            while len(self._sticky) > STICKY_MAX_ENTRIES:
+                self._sticky.popitem(last=False)
+
+    def is_sticky(self, reader) -> bool:
+        if reader is None:
+            return False
+        with self._lock:
+            until = self._sticky.get(reader)
+            if until is None:
+                return False
+            if until < time.monotonic():
+                del self._sticky[reader]
+                return False
+            return True
+
+    # Health checks
+
+    async def check(self):
+        await asyncio.gather(*(replica.check() for replica in self.replicas))
+
+    def start(self):
+        """Check the replicas now and then every DB_REPLICA_CHECK_SECONDS; a no-op without replicas"""
+        if self.replicas:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(settings.DB_REPLICA_CHECK_SECONDS)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            if hasattr(replica.engine, "sync_engine"):
+                await replica.engine.dispose()
+            else:
+                replica.engine.dispose()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "replicas": {replica.name: replica.healthy for replica in self.replicas},
+                "reads": dict(self.counters),
+            }
+
+# Model functions that only read and may see data a moment old. Lookups by email or
+# username back signup's uniqueness check and login, so they stay on the primary.
+REPLICA_READS = {"search", "search_questions"}
+PRIMARY_READS = {"get_user_by_email", "get_user_by_username"}
+
+def reads_only(fn) -> bool:
+    name = fn.__name__
+    return (name.startswith("get_") or name in REPLICA_READS) and name not in PRIMARY_READS
+
+# Session events, registered on database.RoutingSession
+
+def mark_writes(orm_execute_state):
+    """An INSERT, UPDATE or DELETE keeps the rest of the session on the primary"""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+def mark_flush(session, flush_context):
+    session.info["wrote"] = True
+
+class ReaderMiddleware:
+    """Identifies the reader of each request for read-your-writes, without decoding the token.
+
+    Plain ASGI like InstrumentationMiddleware, so the context variable reaches
+    the endpoint and the model functions it runs.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        authorization = dict(scope["headers"]).get(b"authorization")
+        token = _reader.set(hashlib.sha256(authorization).hexdigest() if authorization else None)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _reader.reset(token)
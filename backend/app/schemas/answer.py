@@ -8,7 +8,7 @@ class AnswerBase(BaseModel):
 
 class AnswerCreate(AnswerBase):
     question_id: int
-    author_id: int
+    author_id: Optional[int] = None  # Ignored; the author is taken from the access token
 
 class AnswerUpdate(BaseModel):
     content: Optional[str] = None
@@ -16,8 +16,11 @@ class AnswerUpdate(BaseModel):
 class Answer(AnswerBase):
     id: int
     question_id: int
-    author_id: int
+    author_id: Optional[int] = None  # None once the author deletes their account
     is_accepted: bool
+    score: int = 0
+    upvote_count: int = 0
+    downvote_count: int = 0
     created_at: datetime
     updated_at: Optional[datetime] = None
     author: Optional[User] = None
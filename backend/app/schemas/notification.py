@@ -0,0 +1,21 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+class Notification(BaseModel):
+    id: int
+    kind: str  # answer, accepted or mention
+    question_id: int
+    answer_id: Optional[int] = None
+    actor_id: Optional[int] = None
+    is_read: bool
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class NotificationsRead(BaseModel):
+    up_to_id: Optional[int] = None  # Mark only notifications up to this id; all when unset
+
+class UnreadCount(BaseModel):
+    unread_count: int
@@ -1,15 +1,17 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 from .user import User
 from .tag import Tag
+from .answer import Answer
 
 class QuestionBase(BaseModel):
     title: str
     content: str
 
 class QuestionCreate(QuestionBase):
-    author_id: int
+    author_id: Optional[int] = None  # Ignored; the author is taken from the access token
+    tags: List[str] = []  # Tag names; missing tags are created
 
 class QuestionUpdate(BaseModel):
     title: Optional[str] = None
@@ -17,12 +19,27 @@ class QuestionUpdate(BaseModel):
 
 class Question(QuestionBase):
     id: int
-    author_id: int
+    author_id: Optional[int] = None  # None once the author deletes their account
     is_answered: bool
+    score: int = 0
+    upvote_count: int = 0
+    downvote_count: int = 0
+    answer_count: int = 0
+    view_count: int = 0
+    last_activity_at: Optional[datetime] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     author: Optional[User] = None
     tags: Optional[List[Tag]] = None
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class ViewerVotes(BaseModel):
+    question: Optional[bool] = None  # True for upvote, False for downvote, None if not voted
+    answers: Dict[int, bool] = {}
+
+class QuestionDetail(BaseModel):
+    question: Question
+    answers: List[Answer]
+    viewer_votes: Optional[ViewerVotes] = None
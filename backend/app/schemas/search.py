@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import Optional
+
+class SearchResult(BaseModel):
+    type: str  # "question" or "answer"
+    id: int
+    question_id: int
+    title: str
+    snippet: Optional[str] = None
+    score: float
+
+    class Config:
+        from_attributes = True
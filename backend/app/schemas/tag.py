@@ -13,6 +13,11 @@ class TagUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
 
+class TagSuggestion(BaseModel):
+    id: int
+    name: str
+    question_count: int
+
 class Tag(TagBase):
     id: int
     created_at: datetime
@@ -6,16 +6,30 @@ class VoteBase(BaseModel):
     is_upvote: bool
 
 class VoteCreate(VoteBase):
-    user_id: int
+    user_id: Optional[int] = None  # Ignored; the voter is taken from the access token
     question_id: Optional[int] = None
     answer_id: Optional[int] = None
 
 class VoteUpdate(BaseModel):
     is_upvote: Optional[bool] = None
 
+class VoteCast(VoteBase):
+    pass
+
+class VoteResult(VoteBase):
+    score: int
+    upvote_count: int
+    downvote_count: int
+
+class VoteImportResult(BaseModel):
+    created: int
+    changed: int
+    unchanged: int
+    skipped: int
+
 class Vote(VoteBase):
     id: int
-    user_id: int
+    user_id: Optional[int] = None  # None once the voter deletes their account
     question_id: Optional[int] = None
     answer_id: Optional[int] = None
     created_at: datetime
@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import multiprocessing
+import secrets
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Optional
+from fastapi import Depends, HTTPException
+from fastapi.requests import HTTPConnection
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+from passlib.context import CryptContext
+from .config import DEFAULT_SECRET_KEY, settings
+from .schemas.user import TokenUser
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+# Password hashing
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Dedicated process pool for bcrypt, so hashing never holds a request worker or the event loop"""
+    global _executor
+    if settings.PASSWORD_HASH_WORKERS <= 0:
+        # Fall back to the default thread executor; bcrypt releases the GIL while hashing
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+    return _executor
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), _hash, password)
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True when the hash was made with a different cost factor than BCRYPT_ROUNDS"""
+    return pwd_context.needs_update(hashed_password)
+
+# Verification cache
+
+class VerificationCache:
+    """Remembers recent successful verifications per account for a short window.
+
+    Entries store an HMAC of (hashed password, plain password) under a key that
+    only lives in this process, so the cache never holds a usable secret, and a
+    password change invalidates the entry because the stored hash changes.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._key = secrets.token_bytes(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, password: str, hashed_password: str) -> bytes:
+        message = hashed_password.encode() + b"\0" + password.encode()
+        return hmac.new(self._key, message, hashlib.sha256).digest()
+
+    def check(self, account, password: str, hashed_password: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(account)
+            if entry is None:
+                return False
+            digest, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[account]
+                return False
+        return hmac.compare_digest(digest, self._digest(password, hashed_password))
+
+    def add(self, account, password: str, hashed_password: str):
+        if self.ttl <= 0:
+            return
+        digest = self._digest(password, hashed_password)
+        with self._lock:
+            self._entries[account] = (digest, time.monotonic() + self.ttl)
+            self._entries.move_to_end(account)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, account):
+        with self._lock:
+            self._entries.pop(account, None)
+
+verification_cache = VerificationCache(settings.PASSWORD_CACHE_TTL_SECONDS, settings.PASSWORD_CACHE_SIZE)
+
+async def verify_password(password: str, hashed_password: str, account=None) -> bool:
+    if account is not None and verification_cache.check(account, password, hashed_password):
+        return True
+    verified = await asyncio.get_running_loop().run_in_executor(get_executor(), _verify, password, hashed_password)
+    if verified and account is not None:
+        verification_cache.add(account, password, hashed_password)
+    return verified
+
+# Access tokens
+# The auth dependencies are async so they run inline on the event loop instead of taking a threadpool hop
+
+logger = logging.getLogger("stackit.security")
+
+def check_secret_key():
+    """Refuse to serve with the default or an empty SECRET_KEY, which would accept forged tokens; DEBUG only warns"""
+    if settings.SECRET_KEY not in (DEFAULT_SECRET_KEY, ""):
+        return
+    if not settings.DEBUG:
+        raise RuntimeError(
+            "SECRET_KEY is empty or the default from app/config.py, so anyone could sign access tokens. "
+            "Set SECRET_KEY, or DEBUG=true for local development."
+        )
+    logger.warning("SECRET_KEY is empty or the default; access tokens can be forged. Never deploy with DEBUG=true.")
+
+def create_access_token(user) -> str:
+    now = datetime.now(timezone.utc)
+    claims = {
+        "sub": str(user.id),
+        "username": user.username,
+        "jti": uuid.uuid4().hex,
+        "iat": now,
+        "exp": now + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+    }
+    return jwt.encode(claims, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+@lru_cache(maxsize=settings.TOKEN_CACHE_SIZE)
+def _decode_token(token: str) -> dict:
+    # Signature checks are the expensive part; expiry is re-checked on every use
+    return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+
+_revoked_tokens = {}
+_revoked_lock = threading.Lock()
+
+def revoke_token(claims: dict):
+    """Reject a token until it would have expired anyway.
+
+    The revoked set lives in this process only: other workers keep accepting the
+    token until it expires, and a restart forgets it.
+    """
+    now = time.time()
+    with _revoked_lock:
+        for jti in [jti for jti, exp in _revoked_tokens.items() if exp < now]:
+            del _revoked_tokens[jti]
+        _revoked_tokens[claims["jti"]] = claims["exp"]
+
+def decode_access_token(token: str) -> dict:
+    try:
+        claims = _decode_token(token)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token", headers={"WWW-Authenticate": "Bearer"})
+    if claims["exp"] < time.time() or claims.get("jti") in _revoked_tokens:
+        raise HTTPException(status_code=401, detail="Token expired or revoked", headers={"WWW-Authenticate": "Bearer"})
+    return claims
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+async def get_token_claims(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> dict:
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return decode_access_token(credentials.credentials)
+
+async def get_current_user(claims: dict = Depends(get_token_claims)) -> TokenUser:
+    """Identity carried in the token claims; no database lookup per request"""
+    return TokenUser(id=int(claims["sub"]), username=claims["username"])
+
+async def get_optional_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> Optional[TokenUser]:
+    """Like get_current_user for endpoints that also serve anonymous readers; a bad token is still a 401"""
+    if credentials is None:
+        return None
+    claims = decode_access_token(credentials.credentials)
+    return TokenUser(id=int(claims["sub"]), username=claims["username"])
+
+async def get_stream_user(connection: HTTPConnection, access_token: Optional[str] = None) -> Optional[TokenUser]:
+    """get_optional_user for event streams; EventSource and browser WebSockets cannot set headers, so ?access_token= works too"""
+    scheme, _, token = connection.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        token = access_token
+    if not token:
+        return None
+    claims = decode_access_token(token)
+    return TokenUser(id=int(claims["sub"]), username=claims["username"])
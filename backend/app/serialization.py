@@ -0,0 +1,117 @@
+import asyncio
+import functools
+import types
+import typing
+from fastapi import Response
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, TypeAdapter
+from .config import settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if settings.FAST_JSON and orjson is None:
+    raise RuntimeError("FAST_JSON=true requires the orjson package")
+
+if settings.FAST_JSON:
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+else:
+    DefaultResponse = JSONResponse
+
+_MISSING = object()
+
+def _identity(value):
+    return value
+
+@functools.lru_cache(maxsize=None)
+def _converter(annotation):
+    """A function turning trusted values shaped like `annotation` into plain JSON-ready data.
+
+    Models become dicts of their fields read by attribute (or key, for dicts),
+    without running validators; scalars such as datetimes pass through for orjson.
+    """
+    origin, args = typing.get_origin(annotation), typing.get_args(annotation)
+    if origin in (typing.Union, types.UnionType):
+        members = [arg for arg in args if arg is not type(None)]
+        if len(members) != 1:
+            return _identity
+        inner = _converter(members[0])
+        return inner if inner is _identity else (lambda value: None if value is None else inner(value))
+    if origin in (list, tuple, set, frozenset):
+        inner = _converter(args[0]) if args else _identity
+        return list if inner is _identity else (lambda value: [inner(item) for item in value])
+    if origin is dict:
+        inner = _converter(args[1]) if len(args) == 2 else _identity
+        return dict if inner is _identity else (lambda value: {key: inner(item) for key, item in value.items()})
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        fields = [
+            (name, _converter(field.annotation), _MISSING if field.is_required() else field.get_default(call_default_factory=True))
+            for name, field in annotation.model_fields.items()
+        ]
+
+        def convert(value):
+            get = value.get if isinstance(value, dict) else functools.partial(getattr, value)
+            data = {}
+            for name, convert_field, default in fields:
+                item = get(name, default)
+                if item is _MISSING:
+                    raise KeyError(name)
+                data[name] = convert_field(item)
+            return data
+        return convert
+    return _identity
+
+@functools.lru_cache(maxsize=None)
+def _adapter(annotation):
+    return TypeAdapter(annotation)
+
+def dumps(annotation, value) -> bytes:
+    """Serialize value as `annotation`: straight from the rows with orjson under FAST_JSON, else validated by Pydantic"""
+    if settings.FAST_JSON:
+        return orjson.dumps(_converter(annotation)(value), option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+    adapter = _adapter(annotation)
+    return adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+
+def _rendered(endpoint, response_model, status_code):
+    @functools.wraps(endpoint)
+    async def render(**kwargs):
+        content = await endpoint(**kwargs)
+        if content is None or isinstance(content, Response):
+            return content
+        try:
+            body = dumps(response_model, content)
+        except (AttributeError, KeyError, TypeError):
+            # Not shaped like the model after all; FastAPI validates it as usual
+            return content
+        response = Response(body, status_code=status_code or 200, media_type="application/json")
+        # Headers and status set on an injected Response parameter, as FastAPI would apply them
+        for value in kwargs.values():
+            if isinstance(value, Response):
+                if value.status_code:
+                    response.status_code = value.status_code
+                response.headers.raw.extend(value.headers.raw)
+        return response
+    return render
+
+class FastJSONRoute(APIRoute):
+    """Route class that, under FAST_JSON, writes the endpoint's result with orjson instead of validating it against response_model.
+
+    Endpoint results come from our own database rows, so the validation pass only
+    costs time; the response_model still shapes the output and the OpenAPI schema.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        response_model = kwargs.get("response_model")
+        if (
+            settings.FAST_JSON
+            and response_model is not None
+            and not isinstance(response_model, DefaultPlaceholder)
+            and asyncio.iscoroutinefunction(endpoint)
+        ):
+            status_code = kwargs.get("status_code")
+            endpoint = _rendered(endpoint, response_model, None if isinstance(status_code, DefaultPlaceholder) else status_code)
+        super().__init__(path, endpoint, **kwargs)
@@ -0,0 +1,107 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from .config import settings
+
+def normalize(name: str) -> str:
+    return name.strip().casefold()
+
+MEMO_MIN_SLICE = 256
+
+class TagIndex:
+    """Per-process prefix index of tag names, ranked by how many questions use each tag.
+
+    Names are kept in a sorted list, so the tags starting with a prefix are one
+    contiguous slice found by bisection; rankings of wide slices, as for one
+    letter prefixes, are memoized until the next change. Filled from the
+    database by load() and then kept current by the tag and question model
+    functions; a reload every TAG_INDEX_REFRESH_SECONDS picks up writes made by
+    other processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []  # sorted (normalized name, tag id)
+        self._tags = {}  # tag id -> [name, question count]
+        self._ranked = {}  # (prefix, limit) -> suggestions, for slices wider than MEMO_MIN_SLICE
+        self.loaded_at = None
+
+    def load(self, rows):
+        """Replace the contents with (id, name, question count) rows"""
+        tags = {tag_id: [name, count] for tag_id, name, count in rows}
+        keys = sorted((normalize(name), tag_id) for tag_id, (name, _) in tags.items())
+        with self._lock:
+            self._tags, self._keys, self._ranked = tags, keys, {}
+            self.loaded_at = time.monotonic()
+
+    def expire(self):
+        """Make the next suggestion reload, after writes that bypassed the model functions"""
+        with self._lock:
+            self.loaded_at = None
+
+    def is_stale(self) -> bool:
+        if self.loaded_at is None:
+            return True
+        refresh = settings.TAG_INDEX_REFRESH_SECONDS
+        return refresh > 0 and time.monotonic() - self.loaded_at > refresh
+
+    def add(self, tag_id: int, name: str, count: int = 0):
+        # Updates before the first load are dropped; load() reads them from the database
+        with self._lock:
+            if self.loaded_at is None or tag_id in self._tags:
+                return
+            self._tags[tag_id] = [name, count]
+            self._ranked.clear()
+            insort(self._keys, (normalize(name), tag_id))
+
+    def _unlink(self, tag_id: int):
+        key = (normalize(self._tags[tag_id][0]), tag_id)
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            del self._keys[index]
+
+    def rename(self, tag_id: int, name: str):
+        with self._lock:
+            if tag_id not in self._tags:
+                return
+            self._unlink(tag_id)
+            self._ranked.clear()
+            self._tags[tag_id][0] = name
+            insort(self._keys, (normalize(name), tag_id))
+
+    def remove(self, tag_id: int):
+        with self._lock:
+            if tag_id in self._tags:
+                self._unlink(tag_id)
+                self._ranked.clear()
+                del self._tags[tag_id]
+
+    def count(self, tag_ids, delta: int = 1):
+        """Add delta to the question count of each tag"""
+        with self._lock:
+            self._ranked.clear()
+            for tag_id in tag_ids:
+                tag = self._tags.get(tag_id)
+                if tag is not None:
+                    tag[1] = max(tag[1] + delta, 0)
+
+    def suggest(self, prefix: str, limit: int = 10):
+        """The most used tags whose name starts with prefix, case-insensitively; ties go alphabetically"""
+        prefix = normalize(prefix)
+        with self._lock:
+            start = bisect_left(self._keys, (prefix,))
+            end = bisect_left(self._keys, (prefix + "\U0010ffff",)) if prefix else len(self._keys)
+            memo = end - start > MEMO_MIN_SLICE
+            if memo and (prefix, limit) in self._ranked:
+                return self._ranked[prefix, limit]
+            tags = self._tags
+            best = heapq.nsmallest(
+                limit, self._keys[start:end], key=lambda key: (-tags[key[1]][1], key[0], key[1])
+            )
+            suggestions = [{"id": tag_id, "name": tags[tag_id][0], "question_count": tags[tag_id][1]} for _, tag_id in best]
+            if memo:
+                self._ranked[prefix, limit] = suggestions
+            return suggestions
+
+tag_index = TagIndex()
@@ -0,0 +1,101 @@
+"""Compare requests/sec of the sync (threadpool) and async database modes.
+
+Seeds a throwaway SQLite database with benchmarks.datagen, then starts uvicorn
+once per mode and drives it with concurrent GET requests over HTTP.
+
+    cd backend
+    python -m benchmarks.async_vs_sync --requests 5000 --concurrency 100
+"""
+import argparse
+import asyncio
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from .datagen import seed_database
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def wait_until_up(client: httpx.AsyncClient, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("Server did not start")
+
+async def drive(base_url: str, paths, requests: int, concurrency: int):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await wait_until_up(client)
+        queue = iter(random.choice(paths) for _ in range(requests))
+        errors = 0
+
+        async def worker():
+            nonlocal errors
+            for path in queue:
+                try:
+                    if (await client.get(path)).status_code != 200:
+                        errors += 1
+                except httpx.TransportError:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - start), errors
+
+def run_mode(mode: str, database_url: str, args):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, DATABASE_ASYNC=str(mode == "async").lower())
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env
+    )
+    paths = ["/api/v1/questions/?limit=20"] + [
+        f"/api/v1/questions/{random.randint(1, args.questions)}" for _ in range(50)
+    ] + [
+        f"/api/v1/answers/question/{random.randint(1, args.questions)}" for _ in range(50)
+    ]
+    try:
+        return asyncio.run(drive(f"http://127.0.0.1:{port}", paths, args.requests, args.concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    # The app refuses to start with the default key, and these runs only need one that works
+    os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(32))
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--questions", type=int, default=1000)
+    parser.add_argument("--answers-per-question", type=int, default=3)
+    args = parser.parse_args()
+
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    seed_database(
+        database_url, log=None, users=args.users, tags=max(args.questions // 20, 1), questions=args.questions,
+        answers_per_question=args.answers_per_question
+    )
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}")
+    for mode in ("sync", "async"):
+        rps, errors = run_mode(mode, database_url, args)
+        print(f"{mode:>6}: {rps:8.1f} req/s  ({errors} errors)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Fill a database with synthetic users, tags, questions, answers and votes.
+
+Rows are generated a batch of questions at a time and inserted with executemany,
+with every denormalized counter and hot score computed as the rows are made, so
+even the largest scales run in constant memory and need no reconcile pass.
+
+    cd backend
+    python -m benchmarks.datagen --database-url sqlite:///./bench.db --scale 100k
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select, func
+
+# Approximate total rows -> generator arguments
+SCALES = {
+    "10k": dict(users=120, tags=50, questions=600),
+    "100k": dict(users=1_200, tags=200, questions=6_000),
+    "1m": dict(users=12_000, tags=1_000, questions=60_000),
+    "10m": dict(users=120_000, tags=5_000, questions=600_000),
+}
+
+PASSWORD = "password"
+
+WORDS = (
+    "python sql index query cache async thread vote answer tag search join cursor "
+    "latency memory profile deploy docker schema migration request response token"
+).split()
+
+def _text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+def generate(
+    engine,
+    users: int,
+    tags: int,
+    questions: int,
+    answers_per_question: float = 3,
+    votes_per_question: float = 4,
+    votes_per_answer: float = 2,
+    tags_per_question: int = 3,
+    days: int = 365,
+    seed: int = 0,
+    batch_size: int = 5_000,
+    log=print
+):
+    """Append synthetic rows to the already migrated database behind engine; returns row counts per table.
+
+    Counts per question are drawn uniformly around the given means. Every user
+    shares the password "password", hashed once.
+    """
+    from app.dump import storage_table
+    from app.models.question import hot_score
+    from app.models.user import get_password_hash
+
+    rng = random.Random(seed)
+    tables = {name: storage_table(name) for name in ("users", "tags", "questions", "question_tags", "answers", "votes")}
+    with engine.connect() as connection:
+        first = {
+            name: (connection.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+            for name, table in tables.items()
+        }
+    counts = dict.fromkeys(tables, 0)
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=days)
+    step = timedelta(days=days) / max(questions, 1)
+    started = time.perf_counter()
+
+    def write(connection, name, rows):
+        if rows:
+            connection.execute(insert(tables[name]), rows)
+            counts[name] += len(rows)
+
+    hashed = get_password_hash(PASSWORD)
+    user_ids = range(first["users"], first["users"] + users)
+    tag_ids = range(first["tags"], first["tags"] + tags)
+    with engine.begin() as connection:
+        for offset in range(0, users, batch_size):
+            write(connection, "users", [
+                {"id": first["users"] + i, "email": f"user{first['users'] + i}@example.com",
+                 "username": f"user{first['users'] + i}", "hashed_password": hashed, "is_active": True,
+                 "created_at": start}
+                for i in range(offset, min(offset + batch_size, users))
+            ])
+        write(connection, "tags", [
+            {"id": tag_id, "name": f"tag{tag_id}", "description": _text(rng, 6), "created_at": start}
+            for tag_id in tag_ids
+        ])
+
+    def voters(mean):
+        return rng.sample(user_ids, min(rng.randint(0, int(2 * mean)), users))
+
+    next_answer, next_vote = first["answers"], first["votes"]
+    for offset in range(0, questions, batch_size):
+        rows = {name: [] for name in ("questions", "question_tags", "answers", "votes")}
+        for i in range(offset, min(offset + batch_size, questions)):
+            question_id = first["questions"] + i
+            created_at = (start + step * i).replace(microsecond=0)
+            last_activity_at = created_at
+            accepted = rng.random() < 0.3
+            answer_count = rng.randint(0, int(2 * answers_per_question))
+            for n in range(answer_count):
+                answer_at = min(created_at + timedelta(minutes=rng.randint(1, 60 * 24 * 7)), now)
+                last_activity_at = max(last_activity_at, answer_at)
+                up = down = 0
+                for user_id in voters(votes_per_answer):
+                    is_upvote = rng.random() < 0.8
+                    up, down = up + is_upvote, down + (not is_upvote)
+                    rows["votes"].append({"id": next_vote, "user_id": user_id, "question_id": None, "answer_id": next_answer,
+                                          "is_upvote": is_upvote, "created_at": answer_at})
+                    next_vote += 1
+                rows["answers"].append({
+                    "id": next_answer, "content": _text(rng, 40), "question_id": question_id,
+                    "author_id": rng.choice(user_ids), "is_accepted": accepted and n == 0,
+                    "score": up - down, "upvote_count": up, "downvote_count": down, "created_at": answer_at
+                })
+                next_answer += 1
+            up = down = 0
+            for user_id in voters(votes_per_question):
+                is_upvote = rng.random() < 0.75
+                up, down = up + is_upvote, down + (not is_upvote)
+                rows["votes"].append({"id": next_vote, "user_id": user_id, "question_id": question_id,
+                                      "answer_id": None, "is_upvote": is_upvote, "created_at": created_at})
+                next_vote += 1
+            for tag_id in rng.sample(tag_ids, min(tags_per_question, tags)):
+                rows["question_tags"].append({"question_id": question_id, "tag_id": tag_id})
+            rows["questions"].append({
+                "id": question_id, "title": _text(rng, 8), "content": _text(rng, 60),
+                "author_id": rng.choice(user_ids), "is_answered": accepted and answer_count > 0,
+                "score": up - down, "upvote_count": up, "downvote_count": down, "answer_count": answer_count,
+                "hot_score": hot_score(up - down, answer_count, created_at),
+                "last_activity_at": last_activity_at, "created_at": created_at
+            })
+        with engine.begin() as connection:
+            for name in ("questions", "question_tags", "answers", "votes"):
+                write(connection, name, rows[name])
+        if log:
+            done = min(offset + batch_size, questions)
+            log(f"{done}/{questions} questions, {sum(counts.values())} rows, {time.perf_counter() - started:.1f}s")
+    return counts
+
+def seed_database(database_url: str, log=print, **sizes):
+    """Point the app at database_url, migrate it and fill it; for benchmarks that start from a throwaway database"""
+    os.environ["DATABASE_URL"] = database_url
+    from app.database import engine
+    from app.migrations import upgrade_database
+    from app.models.search import init_search_index
+
+    upgrade_database(engine)
+    init_search_index(engine)
+    return generate(engine, log=log, **sizes)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--scale", choices=SCALES, default="10k", help="Preset for --users, --tags and --questions")
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--tags", type=int)
+    parser.add_argument("--questions", type=int)
+    parser.add_argument("--answers-per-question", type=float, default=3)
+    parser.add_argument("--votes-per-question", type=float, default=4)
+    parser.add_argument("--votes-per-answer", type=float, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sizes = {key: getattr(args, key) or value for key, value in SCALES[args.scale].items()}
+    counts = seed_database(
+        args.database_url, **sizes, answers_per_question=args.answers_per_question, votes_per_question=args.votes_per_question,
+        votes_per_answer=args.votes_per_answer, seed=args.seed
+    )
+    print(", ".join(f"{count} {name}" for name, count in counts.items()))
+
+if __name__ == "__main__":
+    main()
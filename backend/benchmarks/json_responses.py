@@ -0,0 +1,79 @@
+"""Compare list endpoint latency with and without the FAST_JSON serialization path.
+
+Seeds a throwaway SQLite database, then serves each endpoint in-process (no
+network) once per mode, in a fresh interpreter since settings are read at import.
+
+    cd backend
+    python -m benchmarks.json_responses --requests 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from .datagen import seed_database
+
+PATHS = [
+    "/api/v1/questions/?limit=100",
+    "/api/v1/questions/?sort=hot&limit=100",
+    "/api/v1/answers/?limit=100",
+    "/api/v1/users/?limit=100",
+    "/api/v1/votes/?limit=100",
+]
+
+async def measure(requests: int):
+    from app.main import app
+    timings = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in PATHS:
+            assert (await client.get(path)).status_code == 200
+            start = time.perf_counter()
+            for _ in range(requests):
+                await client.get(path)
+            timings[path] = (time.perf_counter() - start) / requests * 1000
+    return timings
+
+def run_mode(fast: bool, database_url: str, requests: int):
+    env = dict(os.environ, DATABASE_URL=database_url, FAST_JSON=str(fast).lower())
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.json_responses", "--worker", "--requests", str(requests)],
+        env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+def main():
+    # The app refuses to start with the default key, and these runs only need one that works
+    os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(32))
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--questions", type=int, default=1000)
+    parser.add_argument("--answers-per-question", type=int, default=3)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(measure(args.requests))))
+        return
+
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    seed_database(
+        database_url, log=None, users=args.users, tags=max(args.questions // 20, 1), questions=args.questions,
+        answers_per_question=args.answers_per_question
+    )
+    default, fast = run_mode(False, database_url, args.requests), run_mode(True, database_url, args.requests)
+
+    print(f"{'endpoint':<42} {'default ms':>10} {'FAST_JSON ms':>12} {'speedup':>8}")
+    for path in PATHS:
+        print(f"{path.removeprefix('/api/v1'):<42} {default[path]:>10.2f} {fast[path]:>12.2f} {default[path] / fast[path]:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
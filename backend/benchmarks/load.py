@@ -0,0 +1,227 @@
+"""Load scenarios for each router, served in-process, with latency percentiles and SQL queries per request.
+
+Each scenario drives the ASGI app directly (no network, no server process) with
+a fixed number of requests from concurrent workers, and reports p50/p95/p99
+latency, throughput, errors and the average number of SQL statements per
+request. Results can be saved as a baseline and later runs compared against it.
+
+    cd backend
+    python -m benchmarks.load --scale 10k --requests 500 --concurrency 16 --save baseline.json
+    python -m benchmarks.load --scale 10k --requests 500 --concurrency 16 --compare baseline.json
+
+The database is a throwaway SQLite file filled by benchmarks.datagen unless
+--database-url points at an existing one. Votes are written to it.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import sys
+import tempfile
+import time
+
+import httpx
+
+from .datagen import PASSWORD, SCALES, WORDS, seed_database
+
+API = "/api/v1"
+
+class Context:
+    """Id ranges of the seeded data and access tokens for a pool of users"""
+
+    def __init__(self, rng, ranges, tokens):
+        self.rng = rng
+        self.ranges = ranges
+        self.tokens = tokens
+
+    def pick(self, name):
+        return self.rng.randint(*self.ranges[name])
+
+    def auth(self):
+        return {"Authorization": f"Bearer {self.rng.choice(self.tokens)}"}
+
+# Scenario name -> function of a Context returning (method, path, json body, headers)
+SCENARIOS = {
+    "questions.list": lambda ctx: ("GET", f"{API}/questions/?limit=20", None, None),
+    "questions.hot": lambda ctx: ("GET", f"{API}/questions/?sort=hot&limit=20", None, None),
+    "questions.detail": lambda ctx: ("GET", f"{API}/questions/{ctx.pick('questions')}", None, None),
+    "questions.full": lambda ctx: ("GET", f"{API}/questions/{ctx.pick('questions')}/full", None, None),
+    "answers.by_question": lambda ctx: ("GET", f"{API}/answers/question/{ctx.pick('questions')}?limit=20", None, None),
+    "tags.list": lambda ctx: ("GET", f"{API}/tags/?limit=50", None, None),
+    "tags.suggest": lambda ctx: ("GET", f"{API}/tags/suggest?prefix=tag{ctx.rng.randint(1, 9)}", None, None),
+    "tags.questions": lambda ctx: ("GET", f"{API}/tags/{ctx.pick('tags')}/questions?limit=20", None, None),
+    "users.detail": lambda ctx: ("GET", f"{API}/users/{ctx.pick('users')}", None, None),
+    "search": lambda ctx: ("GET", f"{API}/search/?q={ctx.rng.choice(WORDS)}+{ctx.rng.choice(WORDS)}", None, None),
+    "votes.cast": lambda ctx: (
+        "PUT", f"{API}/questions/{ctx.pick('questions')}/vote", {"is_upvote": ctx.rng.random() < 0.8}, ctx.auth()
+    ),
+    "users.login": lambda ctx: (
+        "POST", f"{API}/users/login", {"email": f"user{ctx.pick('login_users')}@example.com", "password": PASSWORD}, None
+    ),
+}
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+async def run_scenario(client, engine, make_request, ctx, requests: int, concurrency: int, warmup: int):
+    from app.instrumentation import QueryCounter
+
+    for _ in range(warmup):
+        method, path, body, headers = make_request(ctx)
+        await client.request(method, path, json=body, headers=headers)
+
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            method, path, body, headers = make_request(ctx)
+            start = time.perf_counter()
+            response = await client.request(method, path, json=body, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    # Statements from concurrent requests interleave, so only the per-request average is meaningful
+    with QueryCounter(engine) as counter:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": requests / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "queries": counter.count / requests,
+    }
+
+async def run(args, scenarios):
+    from sqlalchemy import func, select
+    from app.database import SessionLocal, async_engine, engine
+    from app.main import app
+    from app.models.question import Question
+    from app.models.tag import Tag
+    from app.models.user import User
+
+    with SessionLocal() as db:
+        ranges = {
+            name: (db.scalar(select(func.min(model.id))), db.scalar(select(func.max(model.id))))
+            for name, model in (("questions", Question), ("tags", Tag), ("users", User))
+        }
+    if None in ranges["questions"] or None in ranges["users"]:
+        sys.exit("The database has no questions or users; drop --database-url to generate some")
+    # Logins and votes come from a small pool of users, as from returning visitors
+    first_user = ranges["users"][0]
+    ranges["login_users"] = (first_user, min(first_user + args.users_pool - 1, ranges["users"][1]))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        tokens = []
+        for user_id in range(ranges["login_users"][0], ranges["login_users"][1] + 1):
+            response = await client.post(f"{API}/users/login", json={"email": f"user{user_id}@example.com", "password": PASSWORD})
+            if response.status_code == 200:
+                tokens.append(response.json()["access_token"])
+        if not tokens:
+            sys.exit(f"Could not log in as user{first_user}@example.com with the generated password")
+
+        ctx = Context(random.Random(args.seed), ranges, tokens)
+        results = {}
+        for name in scenarios:
+            results[name] = await run_scenario(
+                client, async_engine or engine, SCENARIOS[name], ctx, args.requests, args.concurrency, args.warmup
+            )
+            print(format_row(name, results[name]), flush=True)
+    # ASGITransport runs no lifespan events, so close the async pool's connection threads here
+    if async_engine is not None:
+        await async_engine.dispose()
+    return results
+
+HEADER = f"{'scenario':<22} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}"
+
+def format_row(name, result):
+    return (
+        f"{name:<22} {result['rps']:>8.1f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+        f"{result['p99_ms']:>8.2f} {result['queries']:>8.1f} {result['errors']:>7}"
+    )
+
+def compare(baseline, results, threshold: float):
+    """Print each metric's change against the baseline; returns the scenarios that regressed"""
+    regressions = []
+    print(f"\n{'scenario':<22} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>12}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<22} (not in baseline)")
+            continue
+
+        def change(key):
+            return (result[key] - before[key]) / before[key] if before[key] else 0.0
+
+        slower = change("p95_ms") > threshold or change("rps") < -threshold
+        more_queries = result["queries"] > before["queries"] + 0.05
+        print(
+            f"{name:<22} {change('rps'):>+9.0%} {change('p50_ms'):>+9.0%} {change('p95_ms'):>+9.0%} "
+            f"{change('p99_ms'):>+9.0%} {before['queries']:>5.1f}->{result['queries']:<5.1f}"
+            + ("  REGRESSION" if slower or more_queries else "")
+        )
+        if slower or more_queries:
+            regressions.append(name)
+    return regressions
+
+def main():
+    # The app refuses to start with the default key, and these runs only need one that works
+    os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(32))
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="Existing database to run against (default: generate a throwaway one)")
+    parser.add_argument("--scale", choices=SCALES, default="10k", help="Size of the generated database")
+    parser.add_argument("--scenarios", help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=300, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests before each scenario")
+    parser.add_argument("--users-pool", type=int, default=20, help="Users that log in and vote")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file written by --save")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative p95 or throughput change counted as a regression (default 0.2)")
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(unknown)}")
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+        print(f"Generating the {args.scale} dataset in {database_url}", flush=True)
+        seed_database(database_url, log=None, seed=args.seed, **SCALES[args.scale])
+
+    print(HEADER)
+    results = asyncio.run(run(args, scenarios))
+
+    if args.save:
+        meta = {key: getattr(args, key) for key in ("scale", "requests", "concurrency", "database_url")}
+        with open(args.save, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+    if baseline is not None:
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            sys.exit(f"\n{len(regressions)} scenario(s) regressed: {', '.join(regressions)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Count the SQL statements each update and delete route issues, and fail when one exceeds its budget.
+
+Builds its own fixtures through the API on a throwaway SQLite database (a
+question with tags, answers and votes per case), then runs every PUT and
+DELETE route once under a QueryCounter, including the 404 and 403 paths.
+
+    cd backend
+    python -m benchmarks.write_paths
+    python -m benchmarks.write_paths --verbose  # print the statements too
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import sys
+import tempfile
+
+import httpx
+
+API = "/api/v1"
+
+# Case -> most statements it may issue; reads of the response rows are included
+BUDGETS = {
+    "PUT /questions/{id}": 3,
+    "PUT /questions/{id} (403)": 2,
+    "PUT /questions/{id} (404)": 2,
+    "DELETE /questions/{id}": 3,
+    "PUT /answers/{id}": 3,
+    "DELETE /answers/{id}": 3,
+    "PUT /votes/{id}": 2,
+    "PUT /votes/{id} (unchanged)": 2,
+    "DELETE /votes/{id}": 2,
+    "PUT /tags/{id}": 3,
+    "DELETE /tags/{id}": 2,
+    "PUT /users/{id}": 3,
+    "DELETE /users/{id}": 3,
+}
+
+async def main_async(verbose: bool):
+    from app.database import async_engine, engine
+    from app.instrumentation import QueryCounter
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def user(name):
+            created = await client.post(f"{API}/users/", json={"email": f"{name}@example.com", "username": name, "password": "password"})
+            login = await client.post(f"{API}/users/login", json={"email": f"{name}@example.com", "password": "password"})
+            return {"Authorization": f"Bearer {login.json()['access_token']}"}, created.json()["id"]
+
+        author, author_id = await user("author")
+        other, other_id = await user("other")
+        counter = {}
+
+        async def thread(n):
+            """A question with three tags, two answers, and votes on both"""
+            question = (await client.post(
+                f"{API}/questions/", headers=author,
+                json={"title": f"Question {n}", "content": "content", "tags": [f"t{n}a", f"t{n}b", f"t{n}c"]}
+            )).json()
+            answers = [
+                (await client.post(f"{API}/answers/", headers=other, json={"content": "answer", "question_id": question["id"]})).json()
+                for _ in range(2)
+            ]
+            for headers in (author, other):
+                await client.put(f"{API}/questions/{question['id']}/vote", headers=headers, json={"is_upvote": True})
+                for answer in answers:
+                    await client.put(f"{API}/answers/{answer['id']}/vote", headers=headers, json={"is_upvote": True})
+            votes = (await client.get(f"{API}/votes/question/{question['id']}")).json()["items"]
+            return question, answers, [v for v in votes if v["user_id"] == other_id]
+
+        async def measure(name, method, path, headers, body=None, expect=200):
+            with QueryCounter(async_engine or engine) as queries:
+                response = await client.request(method, path, headers=headers, json=body)
+            if response.status_code != expect:
+                sys.exit(f"{name}: expected {expect}, got {response.status_code}: {response.text}")
+            counter[name] = queries.statements
+
+        question, answers, votes = await thread(1)
+        await measure("PUT /questions/{id}", "PUT", f"{API}/questions/{question['id']}", author, {"title": "Edited"})
+        await measure("PUT /questions/{id} (403)", "PUT", f"{API}/questions/{question['id']}", other, {"title": "x"}, 403)
+        await measure("PUT /questions/{id} (404)", "PUT", f"{API}/questions/0", author, {"title": "x"}, 404)
+        await measure("PUT /answers/{id}", "PUT", f"{API}/answers/{answers[0]['id']}", other, {"content": "edited"})
+        await measure("PUT /votes/{id}", "PUT", f"{API}/votes/{votes[0]['id']}", other, {"is_upvote": False})
+        await measure("PUT /votes/{id} (unchanged)", "PUT", f"{API}/votes/{votes[0]['id']}", other, {"is_upvote": False})
+        await measure("DELETE /votes/{id}", "DELETE", f"{API}/votes/{votes[0]['id']}", other)
+        await measure("DELETE /answers/{id}", "DELETE", f"{API}/answers/{answers[1]['id']}", other)
+        await measure("PUT /tags/{id}", "PUT", f"{API}/tags/{question['tags'][0]['id']}", author, {"name": "renamed"})
+        await measure("DELETE /tags/{id}", "DELETE", f"{API}/tags/{question['tags'][1]['id']}", author)
+        await measure("DELETE /questions/{id}", "DELETE", f"{API}/questions/{question['id']}", author)
+        await thread(2)
+        await measure("PUT /users/{id}", "PUT", f"{API}/users/{other_id}", other, {"full_name": "Other"})
+        await measure("DELETE /users/{id}", "DELETE", f"{API}/users/{other_id}", other)
+    # ASGITransport runs no lifespan events, so close the async pool's connection threads here
+    if async_engine is not None:
+        await async_engine.dispose()
+
+    over = []
+    print(f"{'write':<30} {'statements':>10} {'budget':>7}")
+    for name, statements in counter.items():
+        budget = BUDGETS[name]
+        print(f"{name:<30} {len(statements):>10} {budget:>7}" + ("  OVER BUDGET" if len(statements) > budget else ""))
+        if verbose:
+            for statement in statements:
+                print("    " + " ".join(statement.split())[:160])
+        if len(statements) > budget:
+            over.append(name)
+    return over
+
+def main():
+    # The app refuses to start with the default key, and these runs only need one that works
+    os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(32))
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--verbose", action="store_true", help="Print each statement")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'writes.db')}"
+    os.environ.setdefault("CACHE_BACKEND", "none")
+    over = asyncio.run(main_async(args.verbose))
+    if over:
+        sys.exit(f"\n{len(over)} write(s) over budget: {', '.join(over)}")
+
+if __name__ == "__main__":
+    main()
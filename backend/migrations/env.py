@@ -0,0 +1,51 @@
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine
+from app.config import settings
+from app.database import Base
+from app.models import question, answer, user, tag, vote, notification  # noqa: F401  (register tables on Base.metadata)
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+def include_object(object, name, type_, reflected, compare_to):
+    # The full-text search tables and triggers are managed by app.models.search
+    return "_fts" not in (name or "")
+
+def run_migrations_offline():
+    context.configure(
+        url=settings.DATABASE_URL,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        render_as_batch=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    # app.migrations passes its own connection; the alembic CLI opens one from DATABASE_URL
+    connection = config.attributes.get("connection")
+    if connection is None:
+        with create_engine(settings.DATABASE_URL).connect() as connection:
+            _run(connection)
+    else:
+        _run(connection)
+
+def _run(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        render_as_batch=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
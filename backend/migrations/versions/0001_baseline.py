@@ -0,0 +1,87 @@
+"""Baseline schema, as created by Base.metadata.create_all before migrations were introduced
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("email", sa.String()),
+        sa.Column("username", sa.String()),
+        sa.Column("hashed_password", sa.String()),
+        sa.Column("full_name", sa.String()),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+
+    op.create_table(
+        "questions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String()),
+        sa.Column("content", sa.Text()),
+        sa.Column("author_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("is_answered", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_questions_id", "questions", ["id"])
+    op.create_index("ix_questions_title", "questions", ["title"])
+
+    op.create_table(
+        "answers",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("content", sa.Text()),
+        sa.Column("question_id", sa.Integer(), sa.ForeignKey("questions.id")),
+        sa.Column("author_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("is_accepted", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_answers_id", "answers", ["id"])
+
+    op.create_table(
+        "tags",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String()),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_tags_id", "tags", ["id"])
+    op.create_index("ix_tags_name", "tags", ["name"], unique=True)
+
+    op.create_table(
+        "question_tags",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("question_id", sa.Integer(), sa.ForeignKey("questions.id")),
+        sa.Column("tag_id", sa.Integer(), sa.ForeignKey("tags.id")),
+    )
+    op.create_index("ix_question_tags_id", "question_tags", ["id"])
+
+    op.create_table(
+        "votes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("question_id", sa.Integer(), sa.ForeignKey("questions.id"), nullable=True),
+        sa.Column("answer_id", sa.Integer(), sa.ForeignKey("answers.id"), nullable=True),
+        sa.Column("is_upvote", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_votes_id", "votes", ["id"])
+
+def downgrade():
+    for table in ("votes", "question_tags", "tags", "answers", "questions", "users"):
+        op.drop_table(table)
@@ -0,0 +1,98 @@
+"""Keyset and foreign-key indexes, denormalized counters, tag updated_at, one vote per user per target
+
+Databases created with create_all after some of these were added are adopted
+at the baseline, so every step skips what already exists.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+COUNTERS = {
+    "questions": ("score", "upvote_count", "downvote_count", "answer_count"),
+    "answers": ("score", "upvote_count", "downvote_count"),
+}
+
+INDEXES = [
+    ("questions", "ix_questions_created_at_id", ["created_at", "id"], False),
+    ("questions", "ix_questions_author_id_created_at_id", ["author_id", "created_at", "id"], False),
+    ("answers", "ix_answers_created_at_id", ["created_at", "id"], False),
+    ("answers", "ix_answers_question_id_created_at_id", ["question_id", "created_at", "id"], False),
+    ("answers", "ix_answers_author_id_created_at_id", ["author_id", "created_at", "id"], False),
+    ("tags", "ix_tags_created_at_id", ["created_at", "id"], False),
+    ("tags", "ix_tags_updated_at", ["updated_at"], False),
+    ("users", "ix_users_created_at_id", ["created_at", "id"], False),
+    ("votes", "ix_votes_created_at_id", ["created_at", "id"], False),
+    ("votes", "ix_votes_question_id_created_at_id", ["question_id", "created_at", "id"], False),
+    ("votes", "ix_votes_answer_id_created_at_id", ["answer_id", "created_at", "id"], False),
+    ("votes", "ix_votes_user_id_created_at_id", ["user_id", "created_at", "id"], False),
+    ("votes", "uq_votes_user_id_question_id", ["user_id", "question_id"], True),
+    ("votes", "uq_votes_user_id_answer_id", ["user_id", "answer_id"], True),
+    ("question_tags", "uq_question_tags_question_id_tag_id", ["question_id", "tag_id"], True),
+    ("question_tags", "ix_question_tags_tag_id_question_id", ["tag_id", "question_id"], False),
+]
+
+questions = sa.table("questions", sa.column("id"), *(sa.column(name) for name in COUNTERS["questions"]))
+answers = sa.table("answers", sa.column("id"), sa.column("question_id"), *(sa.column(name) for name in COUNTERS["answers"]))
+votes = sa.table("votes", sa.column("id"), sa.column("user_id"), sa.column("question_id"), sa.column("answer_id"), sa.column("is_upvote", sa.Boolean))
+question_tags = sa.table("question_tags", sa.column("id"), sa.column("question_id"), sa.column("tag_id"))
+
+def _keep_latest(table, *group_by):
+    """Delete all but the newest row of each group, so a unique index can be built"""
+    latest = sa.select(sa.func.max(table.c.id)).where(*(column.isnot(None) for column in group_by)).group_by(*group_by)
+    op.execute(
+        table.delete().where(*(column.isnot(None) for column in group_by), table.c.id.notin_(latest))
+    )
+
+def _recompute_counters():
+    for target, target_column in ((questions, votes.c.question_id), (answers, votes.c.answer_id)):
+        def vote_count(is_upvote):
+            return (
+                sa.select(sa.func.count(votes.c.id))
+                .where(target_column == target.c.id, votes.c.is_upvote == is_upvote)
+                .scalar_subquery()
+            )
+        op.execute(target.update().values(upvote_count=vote_count(sa.true()), downvote_count=vote_count(sa.false())))
+        op.execute(target.update().values(score=target.c.upvote_count - target.c.downvote_count))
+    op.execute(questions.update().values(
+        answer_count=sa.select(sa.func.count(answers.c.id)).where(answers.c.question_id == questions.c.id).scalar_subquery()
+    ))
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    for table, columns in COUNTERS.items():
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        for name in columns:
+            if name not in existing:
+                op.add_column(table, sa.Column(name, sa.Integer(), server_default="0", nullable=False))
+    if "updated_at" not in {column["name"] for column in inspector.get_columns("tags")}:
+        op.add_column("tags", sa.Column("updated_at", sa.DateTime(timezone=True)))
+
+    _keep_latest(votes, votes.c.user_id, votes.c.question_id)
+    _keep_latest(votes, votes.c.user_id, votes.c.answer_id)
+    _keep_latest(question_tags, question_tags.c.question_id, question_tags.c.tag_id)
+
+    for table, name, columns, unique in INDEXES:
+        if name not in {index["name"] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns, unique=unique)
+
+    # Duplicate votes removed above, and counters added to populated tables, both need a recount
+    _recompute_counters()
+
+def downgrade():
+    for table, name, columns, unique in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    with op.batch_alter_table("tags") as batch:
+        batch.drop_column("updated_at")
+    for table, columns in COUNTERS.items():
+        with op.batch_alter_table(table) as batch:
+            for name in columns:
+                batch.drop_column(name)
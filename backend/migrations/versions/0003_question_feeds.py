@@ -0,0 +1,73 @@
+"""Hot score and last activity columns on questions, with indexes for the ranked feeds
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+import math
+from datetime import timezone
+from alembic import op
+import sqlalchemy as sa
+from app.config import settings
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("questions", "ix_questions_hot_score_id", ["hot_score", "id"]),
+    ("questions", "ix_questions_last_activity_at_id", ["last_activity_at", "id"]),
+    ("questions", "ix_questions_is_answered_created_at_id", ["is_answered", "created_at", "id"]),
+]
+
+questions = sa.table(
+    "questions", sa.column("id"), sa.column("score"), sa.column("answer_count"), sa.column("hot_score"),
+    sa.column("is_answered", sa.Boolean), sa.column("last_activity_at"),
+    sa.column("created_at", sa.DateTime(timezone=True)), sa.column("updated_at")
+)
+answers = sa.table("answers", sa.column("question_id"), sa.column("created_at"))
+
+def hot_score(score, answer_count, created_at):
+    # The formula as of this revision, copied so later changes to app.models.question leave the backfill as it was
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    signal = score + settings.HOT_SCORE_ANSWER_WEIGHT * answer_count
+    order = math.log10(abs(signal)) if abs(signal) > 1 else 0.0
+    return math.copysign(order, signal) + created_at.timestamp() / settings.HOT_SCORE_DECAY_SECONDS
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing = {column["name"] for column in inspector.get_columns("questions")}
+    if "hot_score" not in existing:
+        op.add_column("questions", sa.Column("hot_score", sa.Float(), server_default="0", nullable=False))
+    if "last_activity_at" not in existing:
+        op.add_column("questions", sa.Column("last_activity_at", sa.DateTime(timezone=True)))
+
+    # Unanswered means is_answered = false, which NULLs from the baseline schema would miss
+    op.execute(questions.update().where(questions.c.is_answered.is_(None)).values(is_answered=sa.false()))
+    op.execute(questions.update().where(questions.c.last_activity_at.is_(None)).values(
+        last_activity_at=sa.func.coalesce(
+            sa.select(sa.func.max(answers.c.created_at)).where(answers.c.question_id == questions.c.id).scalar_subquery(),
+            questions.c.updated_at,
+            questions.c.created_at
+        )
+    ))
+    rows = bind.execute(sa.select(questions.c.id, questions.c.score, questions.c.answer_count, questions.c.created_at)).all()
+    if rows:
+        bind.execute(
+            questions.update().where(questions.c.id == sa.bindparam("question_id")).values(hot_score=sa.bindparam("hot")),
+            [{"question_id": r.id, "hot": hot_score(r.score, r.answer_count, r.created_at)} for r in rows if r.created_at]
+        )
+
+    for table, name, columns in INDEXES:
+        if name not in {index["name"] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+def downgrade():
+    for table, name, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    with op.batch_alter_table("questions") as batch:
+        batch.drop_column("last_activity_at")
+        batch.drop_column("hot_score")
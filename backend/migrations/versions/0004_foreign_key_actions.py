@@ -0,0 +1,80 @@
+"""ON DELETE actions on every foreign key, so deletes cascade in the database instead of the ORM
+
+Deleting a question removes its answers, votes and tag links; deleting an
+answer removes its votes; deleting a tag removes its links. Deleting a user
+keeps their questions, answers and votes with the author or voter set to NULL,
+which is what the ORM did before. Rows left behind by earlier deletes are
+cleaned up first so the constraints hold.
+
+SQLite rebuilds each table to change its constraints; app.migrations turns
+foreign key enforcement off for the duration, and the search triggers dropped
+with the old tables are installed again.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+# table -> [(column, referred table, ON DELETE)]
+FOREIGN_KEYS = {
+    "questions": [("author_id", "users", "SET NULL")],
+    "answers": [("question_id", "questions", "CASCADE"), ("author_id", "users", "SET NULL")],
+    "question_tags": [("question_id", "questions", "CASCADE"), ("tag_id", "tags", "CASCADE")],
+    "votes": [
+        ("user_id", "users", "SET NULL"),
+        ("question_id", "questions", "CASCADE"),
+        ("answer_id", "answers", "CASCADE"),
+    ],
+}
+
+# Names for the baseline's unnamed SQLite constraints, so batch mode can drop them
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+def _name(table, column, referred):
+    return f"fk_{table}_{column}_{referred}"
+
+def _remove_orphans():
+    for table, keys in FOREIGN_KEYS.items():
+        for column, referred, ondelete in keys:
+            child, parent = sa.table(table, sa.column(column)), sa.table(referred, sa.column("id"))
+            orphaned = sa.and_(child.c[column].isnot(None), ~sa.exists().where(parent.c.id == child.c[column]))
+            if ondelete == "CASCADE":
+                op.execute(child.delete().where(orphaned))
+            else:
+                op.execute(child.update().where(orphaned).values({column: None}))
+    # Tag links the ORM nulled out when their tag was deleted
+    links = sa.table("question_tags", sa.column("tag_id"))
+    op.execute(links.delete().where(links.c.tag_id.is_(None)))
+
+def _replace_foreign_keys(ondelete_of):
+    inspector = sa.inspect(op.get_bind())
+    for table, keys in FOREIGN_KEYS.items():
+        existing = {fk["constrained_columns"][0]: fk["name"] for fk in inspector.get_foreign_keys(table)}
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch:
+            for column, referred, ondelete in keys:
+                name = _name(table, column, referred)
+                if column in existing:
+                    batch.drop_constraint(existing[column] or name, type_="foreignkey")
+                batch.create_foreign_key(name, referred, [column], ["id"], ondelete=ondelete_of(ondelete))
+
+def _reinstall_search_triggers():
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        from app.models.search import get_backend
+        get_backend(bind).install(bind)
+
+def upgrade():
+    _remove_orphans()
+    _replace_foreign_keys(lambda ondelete: ondelete)
+    _reinstall_search_triggers()
+
+def downgrade():
+    _replace_foreign_keys(lambda ondelete: None)
+    _reinstall_search_triggers()
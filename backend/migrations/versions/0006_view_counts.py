@@ -0,0 +1,26 @@
+"""Question view counts, and the crash-log progress of write-behind counter buffers
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("questions", sa.Column("view_count", sa.Integer(), server_default="0", nullable=False))
+    op.create_table(
+        "counter_log_state",
+        sa.Column("log_id", sa.String(), primary_key=True),
+        sa.Column("applied_seq", sa.Integer(), nullable=False),
+    )
+
+def downgrade():
+    op.drop_table("counter_log_state")
+    with op.batch_alter_table("questions") as batch:
+        batch.drop_column("view_count")
@@ -0,0 +1,20 @@
+"""Index notifications by question and answer, for the unread counters kept when posts are deleted
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index("ix_notifications_question_id", "notifications", ["question_id"])
+    op.create_index("ix_notifications_answer_id", "notifications", ["answer_id"])
+
+def downgrade():
+    op.drop_index("ix_notifications_answer_id", table_name="notifications")
+    op.drop_index("ix_notifications_question_id", table_name="notifications")
@@ -0,0 +1,75 @@
+import itertools
+import os
+import secrets
+import tempfile
+
+# Settings are read when the app is imported, so the test database and the
+# settings that keep statement counts deterministic come first
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ["CACHE_BACKEND"] = "none"
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+os.environ["NOTIFICATIONS_WORKER"] = "false"
+os.environ["SECRET_KEY"] = secrets.token_urlsafe(32)
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database import SessionLocal, async_engine, engine
+from app.main import app
+
+API = "/api/v1"
+
+_names = itertools.count(1)
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture(scope="session")
+def sql_engine():
+    """The engine the API's queries run on"""
+    return async_engine or engine
+
+@pytest.fixture
+def db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@pytest.fixture(scope="session")
+def make_user(client):
+    """Sign up a new user; returns their Authorization headers and id"""
+    def make_user():
+        name = f"user{next(_names)}"
+        created = client.post(f"{API}/users/", json={"email": f"{name}@example.com", "username": name, "password": "password"})
+        assert created.status_code == 200, created.text
+        login = client.post(f"{API}/users/login", json={"email": f"{name}@example.com", "password": "password"})
+        assert login.status_code == 200, login.text
+        return {"Authorization": f"Bearer {login.json()['access_token']}"}, created.json()["id"]
+    return make_user
+
+@pytest.fixture(scope="session")
+def make_thread(client, make_user):
+    """A question with three tags and `answers` answers by their own authors, every post upvoted by two voters"""
+    def make_thread(answers=2):
+        author, _ = make_user()
+        n = next(_names)
+        question = client.post(
+            f"{API}/questions/", headers=author,
+            json={"title": f"Question {n} about python", "content": "python content", "tags": [f"t{n}a", f"t{n}b", f"t{n}c"]}
+        ).json()
+        answer_authors = [make_user() for _ in range(answers)]
+        posted = [
+            client.post(f"{API}/answers/", headers=headers, json={"content": "python answer", "question_id": question["id"]}).json()
+            for headers, _ in answer_authors
+        ]
+        voter, voter_id = make_user()
+        for headers in (author, voter):
+            client.put(f"{API}/questions/{question['id']}/vote", headers=headers, json={"is_upvote": True})
+            for answer in posted:
+                client.put(f"{API}/answers/{answer['id']}/vote", headers=headers, json={"is_upvote": True})
+        return {"question": question, "answers": posted, "author": author, "answer_authors": answer_authors, "voter": voter, "voter_id": voter_id}
+    return make_thread
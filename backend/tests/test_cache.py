@@ -0,0 +1,34 @@
+"""Response cache invalidation never blocks the event loop on a remote backend"""
+import asyncio
+import threading
+
+from app.cache import ResponseCache
+
+class RecordingBackend:
+    blocking = True
+
+    def __init__(self):
+        self.deletes = []
+
+    def delete(self, keys=(), groups=()):
+        self.deletes.append((list(keys), list(groups), threading.get_ident()))
+
+def test_deferred_invalidations_run_in_the_threadpool_before_the_block_exits():
+    backend = RecordingBackend()
+    cache = ResponseCache(backend, ttl=60)
+
+    async def write():
+        async with cache.deferred_invalidations():
+            cache.invalidate(keys=["question:1"])
+            cache.invalidate(groups=["answers:question:1"])
+            assert backend.deletes == []
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(write())
+    assert [(keys, groups) for keys, groups, _ in backend.deletes] == [(["question:1"], ["answers:question:1"])]
+    assert backend.deletes[0][2] != loop_thread
+
+def test_invalidations_outside_a_deferred_block_run_at_once():
+    backend = RecordingBackend()
+    ResponseCache(backend, ttl=60).invalidate(keys=["question:1"])
+    assert len(backend.deletes) == 1
@@ -0,0 +1,20 @@
+"""Conditional GETs answer 304 only while the representation is unchanged"""
+API = "/api/v1"
+
+def test_answer_list_etag_changes_when_a_vote_moves(client, make_thread, make_user):
+    thread = make_thread(answers=2)
+    first, second = thread["answers"]
+    path = f"{API}/answers/question/{thread['question']['id']}"
+    voter, voter_id = make_user()
+    client.put(f"{API}/answers/{first['id']}/vote", headers=voter, json={"is_upvote": True})
+    etag = client.get(path).headers["etag"]
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+
+    votes = client.get(f"{API}/votes/answer/{first['id']}").json()["items"]
+    vote = next(vote for vote in votes if vote["user_id"] == voter_id)
+    assert client.delete(f"{API}/votes/{vote['id']}", headers=voter).status_code == 200
+    client.put(f"{API}/answers/{second['id']}/vote", headers=voter, json={"is_upvote": True})
+
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
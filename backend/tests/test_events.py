@@ -0,0 +1,59 @@
+"""The Redis events broker keeps delivering across dropped connections"""
+import threading
+
+import fakeredis
+import pytest
+
+from app.events import RedisBroker
+
+class FlakyRedis(fakeredis.FakeRedis):
+    """Its first pub/sub connection drops as soon as it starts listening"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pubsubs = 0
+
+    def pubsub(self, **kwargs):
+        pubsub = super().pubsub(**kwargs)
+        self.pubsubs += 1
+        if self.pubsubs == 1:
+            def listen():
+                raise ConnectionError("Connection closed by server")
+                yield
+            pubsub.listen = listen
+        return pubsub
+
+@pytest.fixture
+def broker(monkeypatch):
+    monkeypatch.setattr(RedisBroker, "RECONNECT_INITIAL_SECONDS", 0.01)
+    broker = RedisBroker(client=FlakyRedis(), channel="test:events")
+    yield broker
+    broker.close()
+
+def test_listener_resubscribes_after_a_dropped_connection(broker, caplog):
+    received = []
+    delivered = threading.Event()
+    broker.start(lambda message: (received.append(message), delivered.set()))
+
+    # Publish until the resubscribed listener hears one; pub/sub drops messages nobody is subscribed for
+    for _ in range(200):
+        broker.publish({"topic": "question:1", "event": {"type": "answer"}})
+        if delivered.wait(0.05):
+            break
+    assert received[0] == {"topic": "question:1", "event": {"type": "answer"}}
+    assert broker.client.pubsubs == 2
+    assert "lost its Redis subscription" in caplog.text
+
+def test_publish_does_not_wait_for_redis(broker, monkeypatch):
+    sent = threading.Event()
+    release = threading.Event()
+
+    def slow_publish(channel, data):
+        release.wait(5)
+        sent.set()
+    monkeypatch.setattr(broker.client, "publish", slow_publish)
+
+    broker.publish({"topic": "question:1", "event": {"type": "answer"}})
+    assert not sent.is_set()
+    release.set()
+    assert sent.wait(5)
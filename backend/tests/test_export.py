@@ -0,0 +1,17 @@
+"""Dumps stream only to the accounts in EXPORT_USER_IDS"""
+from app.config import settings
+
+API = "/api/v1"
+
+def test_export_is_refused_to_other_users(client, make_user):
+    headers, _ = make_user()
+    assert client.get(f"{API}/export/", headers=headers).status_code == 403
+    assert client.get(f"{API}/export/votes", headers=headers).status_code == 403
+    assert client.get(f"{API}/export/votes").status_code == 401
+
+def test_export_streams_to_allowed_users(client, make_user, monkeypatch):
+    headers, user_id = make_user()
+    monkeypatch.setattr(settings, "EXPORT_USER_IDS", [user_id])
+    response = client.get(f"{API}/export/users", headers=headers)
+    assert response.status_code == 200
+    assert all("hashed_password" not in line for line in response.text.splitlines())
@@ -0,0 +1,45 @@
+"""Unread counters agree with the notifications a user can list"""
+
+from app import outbox
+from app.models.notification import NotificationCounter
+
+API = "/api/v1"
+
+def unread(client, user):
+    headers, user_id = user
+    count = client.get(f"{API}/users/{user_id}/notifications/unread_count", headers=headers).json()["unread_count"]
+    listed = client.get(f"{API}/users/{user_id}/notifications?unread=true", headers=headers).json()["items"]
+    return count, len(listed)
+
+def test_deleting_an_answer_takes_its_notification_off_the_counter(client, make_user):
+    asker, answerer = make_user(), make_user()
+    question = client.post(f"{API}/questions/", headers=asker[0], json={"title": "Counted", "content": "body", "tags": []}).json()
+    answer = client.post(f"{API}/answers/", headers=answerer[0], json={"question_id": question["id"], "content": "reply"}).json()
+    outbox.drain()
+    assert unread(client, asker) == (1, 1)
+
+    assert client.delete(f"{API}/answers/{answer['id']}", headers=answerer[0]).status_code == 200
+    assert unread(client, asker) == (0, 0)
+
+def test_deleting_a_question_takes_its_notifications_off_the_counter(client, make_user):
+    asker, answerer, mentioned = make_user(), make_user(), make_user()
+    username = client.get(f"{API}/users/me", headers=mentioned[0]).json()["username"]
+    question = client.post(f"{API}/questions/", headers=asker[0], json={"title": "Counted", "content": "body", "tags": []}).json()
+    client.post(f"{API}/answers/", headers=answerer[0], json={"question_id": question["id"], "content": f"ask @{username}"})
+    outbox.drain()
+    assert unread(client, asker) == (1, 1)
+    assert unread(client, mentioned) == (1, 1)
+
+    assert client.delete(f"{API}/questions/{question['id']}", headers=asker[0]).status_code == 200
+    assert unread(client, asker) == (0, 0)
+    assert unread(client, mentioned) == (0, 0)
+
+def test_mark_read_recounts_a_drifted_counter(client, db, make_user):
+    headers, user_id = user = make_user()
+    db.execute(NotificationCounter.__table__.insert().values(user_id=user_id, unread_count=3))
+    db.commit()
+    assert unread(client, user) == (3, 0)
+
+    response = client.post(f"{API}/users/{user_id}/notifications/read", headers=headers, json={})
+    assert response.json()["unread_count"] == 0
+    assert unread(client, user) == (0, 0)
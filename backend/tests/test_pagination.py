@@ -0,0 +1,28 @@
+"""List routes accept page sizes from 1 to MAX_LIMIT only"""
+import pytest
+
+from app.pagination import MAX_LIMIT
+
+API = "/api/v1"
+
+LISTS = [
+    "/questions/", "/answers/", "/answers/question/1", "/tags/", "/tags/1/questions",
+    "/users/", "/votes/", "/votes/question/1", "/votes/answer/1", "/search/?q=python",
+]
+
+@pytest.mark.parametrize("path", LISTS)
+@pytest.mark.parametrize("limit", [-1, 0, MAX_LIMIT + 1])
+def test_out_of_range_limits_are_rejected(client, path, limit):
+    separator = "&" if "?" in path else "?"
+    assert client.get(f"{API}{path}{separator}limit={limit}").status_code == 422
+
+def test_negative_skip_is_rejected(client):
+    assert client.get(f"{API}/questions/?skip=-1").status_code == 422
+
+def test_limit_defaults_to_a_page(client, make_user):
+    headers, _ = make_user()
+    for n in range(21):
+        client.post(f"{API}/questions/", headers=headers, json={"title": f"Paged {n}", "content": "body", "tags": []})
+    body = client.get(f"{API}/questions/").json()
+    assert len(body["items"]) == 20
+    assert body["next_cursor"] is not None
@@ -0,0 +1,43 @@
+"""Statements per read page stay fixed however many rows a page holds, so an N+1 regression fails here"""
+import pytest
+
+from app.instrumentation import assert_max_queries
+
+API = "/api/v1"
+
+# Page -> most statements it may issue, with several questions, answers, authors and tags on the page
+BUDGETS = {
+    "/questions/?limit=20": 2,
+    "/questions/?sort=hot&limit=20": 2,
+    "/questions/?ids={question},{other_question}": 2,
+    "/questions/{question}": 3,
+    "/questions/{question}/full": 3,
+    "/answers/question/{question}?limit=20": 2,
+    "/answers/?limit=20": 1,
+    "/tags/?limit=20": 2,
+    "/tags/{tag}": 2,
+    "/tags/name/{tag_name}": 2,
+    "/tags/{tag}/questions?limit=20": 2,
+    "/users/?limit=20": 1,
+    "/votes/?limit=20": 1,
+}
+
+@pytest.fixture(scope="module")
+def threads(make_thread):
+    return [make_thread(answers=3) for _ in range(3)]
+
+@pytest.mark.parametrize("page", BUDGETS)
+def test_page_query_budget(client, sql_engine, threads, page):
+    question = threads[0]["question"]
+    path = page.format(
+        question=question["id"], other_question=threads[1]["question"]["id"],
+        tag=question["tags"][0]["id"], tag_name=question["tags"][0]["name"],
+    )
+    with assert_max_queries(sql_engine, BUDGETS[page]):
+        response = client.get(API + path)
+    assert response.status_code == 200, response.text
+
+def test_budget_overruns_are_caught(client, sql_engine):
+    with pytest.raises(AssertionError, match="Expected at most 1 queries, got 2"):
+        with assert_max_queries(sql_engine, 1):
+            client.get(f"{API}/questions/?limit=20")
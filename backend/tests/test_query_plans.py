@@ -0,0 +1,48 @@
+"""Every read the API serves is planned on an index, never a full table scan"""
+import pytest
+
+from app.cli import query_plan_checks
+from app.database import engine
+from app.instrumentation import assert_no_full_scans
+
+API = "/api/v1"
+
+CHECKS = query_plan_checks()
+
+# List, feed and search pages, as the routes issue them
+PAGES = [
+    "/questions/?limit=20",
+    "/questions/?sort=active&limit=20",
+    "/questions/?sort=hot&limit=20",
+    "/questions/?sort=unanswered&limit=20",
+    "/questions/?ids={question}",
+    "/questions/{question}/full",
+    "/answers/question/{question}?limit=20",
+    "/tags/{tag}/questions?limit=20",
+    "/tags/{tag}/questions?sort=hot&limit=20",
+    "/votes/question/{question}?limit=20",
+    "/users/?limit=20",
+    "/search/?q=python",
+    "/search/?q=python&scope=answers",
+]
+
+@pytest.fixture(scope="module")
+def thread(make_thread):
+    return make_thread()
+
+@pytest.mark.parametrize("name", CHECKS)
+def test_model_read_uses_an_index(thread, db, name):
+    with assert_no_full_scans(engine):
+        CHECKS[name](db)
+
+@pytest.mark.parametrize("page", PAGES)
+def test_page_uses_an_index(client, sql_engine, thread, page):
+    path = page.format(question=thread["question"]["id"], tag=thread["question"]["tags"][0]["id"])
+    with assert_no_full_scans(sql_engine):
+        response = client.get(API + path)
+    assert response.status_code == 200, response.text
+
+def test_full_scans_are_caught(db):
+    with pytest.raises(AssertionError, match="Full table scans"):
+        with assert_no_full_scans(engine):
+            db.connection().exec_driver_sql("SELECT * FROM questions WHERE content = 'x'").all()
@@ -0,0 +1,34 @@
+"""Search results, on the full-text backend and the LIKE fallback"""
+from types import SimpleNamespace
+
+import pytest
+
+from app.models import search
+
+API = "/api/v1"
+
+@pytest.fixture(scope="module")
+def question(client, make_user):
+    headers, _ = make_user()
+    return client.post(
+        f"{API}/questions/", headers=headers,
+        json={"title": "<b>zebra_crossing</b> rules", "content": "zebra <img src=x onerror=alert(1)> body", "tags": []}
+    ).json()
+
+def test_highlights_escape_user_html(client, question):
+    hits = client.get(f"{API}/search/?q=zebra&scope=questions").json()
+    hit = next(hit for hit in hits if hit["id"] == question["id"])
+    assert "<b>" not in hit["title"] and "<img" not in hit["snippet"]
+    assert "<mark>zebra</mark>" in hit["snippet"]
+
+def test_other_dialects_fall_back_to_like_search():
+    bind = SimpleNamespace(dialect=SimpleNamespace(name="mysql"))
+    assert isinstance(search.get_backend(bind), search.LikeSearchBackend)
+
+def test_like_search_matches_substrings(client, question, monkeypatch):
+    monkeypatch.setattr(search, "BACKENDS", {})
+    hits = client.get(f"{API}/search/?q=zebra_crossing").json()
+    assert [hit["id"] for hit in hits if hit["type"] == "question"] == [question["id"]]
+    assert "<b>" not in hits[0]["title"]
+    # _ is matched literally, not as a LIKE wildcard
+    assert client.get(f"{API}/search/?q=zebraXcrossing").json() == []
@@ -0,0 +1,18 @@
+"""Startup guard against the placeholder signing key"""
+import pytest
+
+from app.config import DEFAULT_SECRET_KEY, settings
+from app.security import check_secret_key
+
+@pytest.mark.parametrize("key", [DEFAULT_SECRET_KEY, ""])
+def test_default_secret_key_is_refused(monkeypatch, key):
+    monkeypatch.setattr(settings, "SECRET_KEY", key)
+    monkeypatch.setattr(settings, "DEBUG", False)
+    with pytest.raises(RuntimeError, match="SECRET_KEY"):
+        check_secret_key()
+
+def test_default_secret_key_only_warns_in_debug(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "SECRET_KEY", DEFAULT_SECRET_KEY)
+    monkeypatch.setattr(settings, "DEBUG", True)
+    check_secret_key()
+    assert "access tokens can be forged" in caplog.text
@@ -0,0 +1,55 @@
+"""Statements per update and delete route, against the budgets in benchmarks.write_paths"""
+import pytest
+
+from app.instrumentation import assert_max_queries
+from benchmarks.write_paths import BUDGETS
+
+API = "/api/v1"
+
+@pytest.fixture
+def thread(make_thread):
+    return make_thread()
+
+@pytest.fixture
+def write(client, sql_engine):
+    def write(name, method, path, headers, body=None, expect=200):
+        with assert_max_queries(sql_engine, BUDGETS[name]):
+            response = client.request(method, API + path, headers=headers, json=body)
+        assert response.status_code == expect, response.text
+        return response
+    return write
+
+def voter_vote(client, thread):
+    votes = client.get(f"{API}/votes/question/{thread['question']['id']}").json()["items"]
+    return next(vote for vote in votes if vote["user_id"] == thread["voter_id"])
+
+def test_update_question(write, thread, make_user):
+    path = f"/questions/{thread['question']['id']}"
+    write("PUT /questions/{id}", "PUT", path, thread["author"], {"title": "Edited"})
+    write("PUT /questions/{id} (403)", "PUT", path, make_user()[0], {"title": "x"}, 403)
+    write("PUT /questions/{id} (404)", "PUT", "/questions/0", thread["author"], {"title": "x"}, 404)
+
+def test_delete_question(write, thread):
+    write("DELETE /questions/{id}", "DELETE", f"/questions/{thread['question']['id']}", thread["author"])
+
+def test_update_and_delete_answer(write, make_thread):
+    thread = make_thread(answers=2)
+    (first, second), (first_author, second_author) = thread["answers"], thread["answer_authors"]
+    write("PUT /answers/{id}", "PUT", f"/answers/{first['id']}", first_author[0], {"content": "edited"})
+    write("DELETE /answers/{id}", "DELETE", f"/answers/{second['id']}", second_author[0])
+
+def test_update_and_delete_vote(client, write, thread):
+    path = f"/votes/{voter_vote(client, thread)['id']}"
+    write("PUT /votes/{id}", "PUT", path, thread["voter"], {"is_upvote": False})
+    write("PUT /votes/{id} (unchanged)", "PUT", path, thread["voter"], {"is_upvote": False})
+    write("DELETE /votes/{id}", "DELETE", path, thread["voter"])
+
+def test_update_and_delete_tag(write, thread):
+    first, second = thread["question"]["tags"][:2]
+    write("PUT /tags/{id}", "PUT", f"/tags/{first['id']}", thread["author"], {"name": f"renamed-{first['id']}"})
+    write("DELETE /tags/{id}", "DELETE", f"/tags/{second['id']}", thread["author"])
+
+def test_update_and_delete_user(write, thread):
+    headers, user_id = thread["answer_authors"][0]
+    write("PUT /users/{id}", "PUT", f"/users/{user_id}", headers, {"full_name": "Other"})
+    write("DELETE /users/{id}", "DELETE", f"/users/{user_id}", headers)